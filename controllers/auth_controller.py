@@ -1,21 +1,32 @@
 # Import standard library modules
-from datetime import timedelta
+from datetime import date, timedelta
 
 # Import third-party modules
 from flask import Blueprint, request
-from flask_jwt_extended import create_access_token, get_jwt_identity, jwt_required
+from flask_jwt_extended import create_access_token, get_jwt, get_jwt_identity, jwt_required
 from psycopg2 import errorcodes
+from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.exc import StaleDataError
 
 # Import local modules
 from init import bcrypt, db
+from models.car import Car
+from models.car_transaction import CarTransaction, CarTransactionSchema
+from models.listing import Listing, ListingSchema
 from models.user import User, UserSchema, user_schema
+from utils.admission import admission_class
+from utils.params import paginated_response
+from utils.preconditions import check_if_match, etag_header, precondition_failed
+from utils.revocation import token_denylist, token_expiry
 
 # Create a Blueprint for authentication and user management
 auth_bp = Blueprint('auth', __name__)
 
 # Route to register a new user
 @auth_bp.route("/register", methods=["POST"])
+@admission_class("auth")
 def register_user():
     try:
         # Load and validate data from the request body
@@ -55,6 +66,7 @@ def register_user():
 
 # Route to login a user
 @auth_bp.route("/login", methods=["POST"])
+@admission_class("auth")
 def login_user():
     try:
         # Get data from the request
@@ -81,8 +93,25 @@ def login_user():
         # Return a generic error message
         return {"error": "An internal server error occurred."}, 500
 
+# Route to logout by revoking the current token
+@auth_bp.route("/logout", methods=["POST"])
+@admission_class("auth")
+@jwt_required()
+def logout_user():
+    try:
+        # Revoke the token until it would have expired anyway
+        claims = get_jwt()
+        token_denylist.revoke(claims["jti"], token_expiry(claims["exp"]))
+
+        # Return a success message
+        return {"message": "Logged out successfully."}, 200
+    except Exception:
+        # Return a generic error message
+        return {"error": "An internal server error occurred."}, 500
+
 # Route to update user information (Admin or self)
 @auth_bp.route("/users/<int:id>", methods=["PUT", "PATCH"])
+@admission_class("auth")
 @jwt_required()
 def update_user(id):
     # Get the current user ID from the JWT
@@ -102,6 +131,11 @@ def update_user(id):
     if current_user_id != id and not current_user.is_admin:
         return {"error": "You do not have permission to update this user's information."}, 403
 
+    # Reject the write if the client edited an older version (If-Match)
+    failed = check_if_match(user)
+    if failed:
+        return failed
+
     try:
         # Load and validate data (partial updates allowed)
         body_data = UserSchema().load(request.get_json(), partial=True)
@@ -121,8 +155,12 @@ def update_user(id):
         # Commit changes to the database
         db.session.commit()
 
-        # Return the updated user data
-        return user_schema.dump(user), 200
+        # Return the updated user data, with its new version as the ETag
+        return user_schema.dump(user), 200, etag_header(user)
+    except StaleDataError:
+        # Another request updated the user between loading and committing
+        db.session.rollback()
+        return precondition_failed()
     except IntegrityError as err:
         if err.orig.pgcode == errorcodes.UNIQUE_VIOLATION:
             return {"error": "An account with this email already exists."}, 400
@@ -162,3 +200,68 @@ def delete_user(id):
     except Exception:
         # Return a generic error message
         return {"error": "An internal server error occurred."}, 500
+
+# Route to get the current user's own listings (paginated)
+@auth_bp.route("/users/me/listings", methods=["GET"])
+@jwt_required()
+def get_my_listings():
+    # Get the current user ID from the JWT
+    current_user_id = int(get_jwt_identity())
+
+    # Optional status filter
+    status = request.args.get("status")
+    if status is not None and status not in ("available", "sold"):
+        return {"error": "Invalid listing status provided."}, 400
+
+    try:
+        # Filter on the indexed user_id so cost scales with the user's own listings
+        statement = (
+            select(Listing)
+            .where(Listing.user_id == current_user_id)
+            .options(joinedload(Listing.car).joinedload(Car.make_model_year))
+            .order_by(Listing.date_posted.desc(), Listing.listing_id.desc())
+        )
+        if status:
+            statement = statement.where(Listing.listing_status == status)
+
+        # Return the requested page of listings
+        schema = ListingSchema(many=True, exclude=("user", "car.listings", "car.car_transactions"))
+        return paginated_response(statement, schema), 200
+    except Exception:
+        # Return a generic error message
+        return {"error": "An internal server error occurred."}, 500
+
+# Route to get the current user's own purchases (paginated)
+@auth_bp.route("/users/me/transactions", methods=["GET"])
+@jwt_required()
+def get_my_transactions():
+    # Get the current user ID from the JWT
+    current_user_id = int(get_jwt_identity())
+
+    # Optional inclusive transaction_date range (YYYY-MM-DD)
+    try:
+        start = request.args.get("from")
+        end = request.args.get("to")
+        start = date.fromisoformat(start) if start else None
+        end = date.fromisoformat(end) if end else None
+    except ValueError:
+        return {"error": "'from' and 'to' must be dates in YYYY-MM-DD format."}, 400
+
+    try:
+        # Filter on the indexed buyer_id so cost scales with the user's own purchases
+        statement = (
+            select(CarTransaction)
+            .where(CarTransaction.buyer_id == current_user_id)
+            .options(joinedload(CarTransaction.car).joinedload(Car.make_model_year))
+            .order_by(CarTransaction.transaction_date.desc(), CarTransaction.transaction_id.desc())
+        )
+        if start:
+            statement = statement.where(CarTransaction.transaction_date >= start)
+        if end:
+            statement = statement.where(CarTransaction.transaction_date <= end)
+
+        # Return the requested page of transactions
+        return paginated_response(statement, CarTransactionSchema(many=True, exclude=("user",))), 200
+    except Exception:
+        # Return a generic error message
+        return {"error": "An internal server error occurred."}, 500
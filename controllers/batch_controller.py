@@ -0,0 +1,231 @@
+# Import standard library modules
+import re
+from contextlib import contextmanager
+
+# Import third-party modules
+from flask import Blueprint, current_app, g, jsonify, request
+from flask_jwt_extended import get_jwt_identity, jwt_required
+from werkzeug.exceptions import HTTPException
+from werkzeug.test import EnvironBuilder
+
+# Import local modules
+from init import db
+from models.user import User
+from utils.admission import admission_class
+from utils.audit import audit_log
+from utils.events import listing_events
+from utils.replicas import STICKY_HEADER
+
+# Create a Blueprint for batch requests
+batch_bp = Blueprint('batch', __name__)
+
+# Maximum number of sub-requests in one batch
+MAX_BATCH_REQUESTS = 50
+# HTTP methods a sub-request may use
+BATCH_METHODS = {'GET', 'POST', 'PUT', 'PATCH', 'DELETE'}
+# Endpoints that cannot be called from inside a batch
+EXCLUDED_ENDPOINTS = {'batch.run_batch', 'listings.stream_listings'}
+# Admission classes that cannot be called from inside a batch (bcrypt-bound login and registration)
+EXCLUDED_ADMISSION_CLASSES = {'auth'}
+# Placeholder referring to a field of an earlier response, e.g. "$0.make_model_year_id"
+REFERENCE_PATTERN = re.compile(r"^\$(\d+)\.(\w+)$")
+PATH_REFERENCE_PATTERN = re.compile(r"\$(\d+)\.(\w+)")
+# Keys of the batch's g shared with its sub-requests: listing events deferred to the batch's commit,
+# and the revocation check of the token they all carry
+SHARED_G_KEYS = ('deferred_listing_events', 'revocation_checked')
+
+# Replace "$<index>.<field>" placeholders with values from earlier responses
+def resolve_references(value, results):
+    if isinstance(value, dict):
+        return {key: resolve_references(item, results) for key, item in value.items()}
+    if isinstance(value, list):
+        return [resolve_references(item, results) for item in value]
+    if isinstance(value, str):
+        match = REFERENCE_PATTERN.match(value)
+        if match:
+            return lookup_reference(int(match.group(1)), match.group(2), results)
+    return value
+
+# Return a field from the body of an earlier sub-request
+def lookup_reference(index, field, results):
+    if index >= len(results) or not isinstance(results[index]['body'], dict):
+        raise ValueError(f"Reference ${index}.{field} does not point to an earlier response.")
+    if field not in results[index]['body']:
+        raise ValueError(f"Response {index} has no field '{field}'.")
+    return results[index]['body'][field]
+
+# Run the views of a transactional batch in one database transaction. The session joins a transaction
+# held on its own connection, so each view's commit only releases a savepoint and its rollback only
+# undoes its own work; the batch commits or rolls back the whole transaction at the end
+@contextmanager
+def batch_transaction():
+    connection = db.engine.connect()
+    driver_connection = connection.connection.driver_connection
+    sqlite = connection.dialect.name == 'sqlite'
+    if sqlite:
+        # pysqlite starts transactions lazily and breaks SAVEPOINT, so run it in autocommit and BEGIN here
+        driver_connection.isolation_level = None
+    transaction = connection.begin()
+    if sqlite:
+        connection.exec_driver_sql("BEGIN")
+    session = db.session.session_factory(bind=connection, join_transaction_mode="create_savepoint")
+    # Audit entries wait for the outer transaction instead of each savepoint
+    session.info["outer_transaction"] = True
+    request_session = db.session.registry()
+    db.session.registry.set(session)
+    try:
+        yield session, transaction
+    finally:
+        db.session.registry.set(request_session)
+        session.close()
+        if transaction.is_active:
+            transaction.rollback()
+        if sqlite:
+            driver_connection.isolation_level = ""
+        connection.close()
+
+# Give a sub-request a g of its own. Sub-requests run in the batch's app context, which keeps the batch's
+# database session, so without this their hooks would overwrite the batch's admission class, replica
+# routing and decoded token
+@contextmanager
+def sub_request_globals():
+    namespace = vars(g._get_current_object())
+    batch_globals = dict(namespace)
+    namespace.clear()
+    namespace.update({key: batch_globals[key] for key in SHARED_G_KEYS if key in batch_globals})
+    try:
+        yield
+    finally:
+        shared = {key: namespace[key] for key in SHARED_G_KEYS if key in namespace}
+        namespace.clear()
+        namespace.update(batch_globals)
+        namespace.update(shared)
+
+# Run one sub-request in-process through the full request cycle, including before/after request hooks.
+# Returns its status, body and headers
+def dispatch_sub_request(method, path, body, headers):
+    builder = EnvironBuilder(
+        path=path,
+        base_url=request.host_url,
+        method=method,
+        json=body,
+        headers=headers
+    )
+    try:
+        with sub_request_globals(), current_app.request_context(builder.get_environ()) as ctx:
+            if ctx.request.routing_exception is not None:
+                raise ctx.request.routing_exception
+            view = current_app.view_functions[ctx.request.endpoint]
+            if (
+                ctx.request.endpoint in EXCLUDED_ENDPOINTS
+                or getattr(view, 'admission_class', None) in EXCLUDED_ADMISSION_CLASSES
+            ):
+                return 400, {'error': 'This endpoint cannot be used in a batch.'}, {}
+            # Admission control, replica routing and response hooks apply to every sub-request
+            response = current_app.full_dispatch_request()
+            body = response.get_json(silent=True)
+            return (
+                response.status_code,
+                body if body is not None else response.get_data(as_text=True),
+                response.headers
+            )
+    except HTTPException as err:
+        return err.code, {'error': err.description}, {}
+    finally:
+        builder.close()
+
+# Route to execute several API calls in one round-trip
+@batch_bp.route('/batch', methods=['POST'])
+@jwt_required()
+# Its own admission class, so a limit on writes cannot make a batch wait on its own sub-requests
+@admission_class("batch")
+def run_batch():
+    # Check the batch's own user; each sub-request is authorised separately with the same token
+    current_user_id = get_jwt_identity()
+    user = User.query.get(current_user_id)
+
+    # Check if the user exists
+    if not user:
+        return jsonify({'error': 'User not found.'}), 404
+
+    # Load and validate the batch
+    data = request.get_json(silent=True) or {}
+    sub_requests = data.get('requests')
+    transactional = bool(data.get('transaction', False))
+    if not isinstance(sub_requests, list) or not sub_requests:
+        return jsonify({'error': "'requests' must be a non-empty list."}), 400
+    if len(sub_requests) > MAX_BATCH_REQUESTS:
+        return jsonify({'error': f'A batch may contain at most {MAX_BATCH_REQUESTS} requests.'}), 400
+    for item in sub_requests:
+        if (
+            not isinstance(item, dict)
+            or str(item.get('method', '')).upper() not in BATCH_METHODS
+            or not str(item.get('path', '')).startswith('/api/')
+        ):
+            return jsonify({'error': "Each request needs a 'method' and a 'path' starting with '/api/'."}), 400
+
+    results = []
+    failed = False
+    # Every sub-request carries the batch's token. Each one decodes it again under its own @jwt_required
+    # (a signature check), while the revocation lookup is shared through g and runs once per batch
+    headers = {'Authorization': request.headers.get('Authorization', '')}
+
+    # Run the sub-requests in order, stopping at the first failure in a shared transaction
+    def run_sub_requests(session):
+        nonlocal failed
+        for item in sub_requests:
+            if failed and transactional:
+                results.append({'status': 424, 'body': {'error': 'Skipped because an earlier request failed.'}})
+                continue
+
+            try:
+                path = PATH_REFERENCE_PATTERN.sub(
+                    lambda match: str(lookup_reference(int(match.group(1)), match.group(2), results)),
+                    item['path']
+                )
+                body = resolve_references(item.get('body'), results)
+            except ValueError as err:
+                status, response_body = 400, {'error': str(err)}
+            else:
+                status, response_body, response_headers = dispatch_sub_request(
+                    item['method'].upper(), path, body, headers
+                )
+                # Like a client, pass a write's "read from the primary" window on to later sub-requests
+                if STICKY_HEADER in response_headers:
+                    headers[STICKY_HEADER] = response_headers[STICKY_HEADER]
+
+            results.append({'status': status, 'body': response_body})
+            if status >= 400:
+                failed = True
+                if not transactional:
+                    # Discard any half-applied changes so they cannot leak into later requests
+                    session.rollback()
+
+    try:
+        if not transactional:
+            run_sub_requests(db.session())
+        else:
+            # Listing events wait until the whole batch commits
+            g.deferred_listing_events = []
+            with batch_transaction() as (session, transaction):
+                run_sub_requests(session)
+                if failed:
+                    transaction.rollback()
+                    session.info.pop("audit_entries", None)
+                else:
+                    session.flush()
+                    transaction.commit()
+                    audit_log.commit_entries(session)
+                    for event, event_data in g.deferred_listing_events:
+                        listing_events.publish(event, event_data)
+    except Exception:
+        db.session.rollback()
+        return jsonify({'error': 'An internal server error occurred.'}), 500
+    finally:
+        g.pop('deferred_listing_events', None)
+
+    # Return the per-request statuses and bodies
+    return jsonify({
+        'responses': results,
+        'committed': not (transactional and failed)
+    }), 200
@@ -0,0 +1,401 @@
+# Import standard library modules
+import gzip
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+# Import third-party modules
+import click
+from flask import Blueprint, current_app
+from flask.cli import with_appcontext
+from sqlalchemy import func, select
+
+# Import local modules
+from init import db
+from models.car import Car
+from models.makemodelyear import MakeModelYear
+from controllers.car_controller import async_views, get_car, get_cars
+from controllers.cli_controllers import seed_scaled_dataset
+from utils.async_db import async_db
+from utils.formats import msgpack
+from utils.saved_searches import RANGE_CRITERIA, SavedSearchIndex
+from utils.similarity import similar_cars
+from utils.valuation import price_model
+from utils.warmup import DEFAULT_WARM_UP_PATHS
+
+# Create a blueprint for benchmark CLI commands
+benchmarks = Blueprint('benchmarks', __name__)
+
+# Seed `scale` cars into an empty database, or leave a populated one as it is
+def ensure_dataset(scale):
+    existing = db.session.scalar(select(func.count()).select_from(Car))
+    if existing:
+        click.echo(f"Using the existing {existing} cars.")
+        return
+    started = time.perf_counter()
+    seed_scaled_dataset(scale)
+    click.echo(f"Seeded {scale} cars in {time.perf_counter() - started:.1f}s.")
+
+# Print the throughput and latency percentiles of a list of operation timings in seconds
+def report(label, timings, elapsed, unit="req/s", precision=1):
+    timings = sorted(timings)
+    percentile = lambda p: timings[min(int(len(timings) * p), len(timings) - 1)] * 1000
+    click.echo(
+        f"{label:<10} {len(timings) / elapsed:8.1f} {unit}   p50 {percentile(0.5):7.{precision}f} ms   "
+        f"p95 {percentile(0.95):7.{precision}f} ms   p99 {percentile(0.99):7.{precision}f} ms"
+    )
+
+# Time a function over every input, returning each call's duration, the results and the total time
+def time_calls(func, inputs):
+    timings = []
+    results = []
+    started = time.perf_counter()
+    for value in inputs:
+        call_started = time.perf_counter()
+        results.append(func(value))
+        timings.append(time.perf_counter() - call_started)
+    return timings, results, time.perf_counter() - started
+
+# Send the given URLs from `threads` concurrent clients and return each request's duration
+def run_load(app, urls, threads):
+    timings = []
+    errors = []
+    lock = threading.Lock()
+    pending = iter(urls)
+
+    def client_thread():
+        client = app.test_client()
+        while True:
+            with lock:
+                url = next(pending, None)
+            if url is None:
+                return
+            started = time.perf_counter()
+            response = client.get(url)
+            response.get_data()
+            with lock:
+                timings.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    errors.append(f"{url} returned {response.status_code}")
+
+    workers = [threading.Thread(target=client_thread) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    if errors:
+        raise click.ClickException(f"{len(errors)} request(s) failed, e.g. {errors[0]}.")
+    return timings
+
+# Compare the synchronous and async car read endpoints under concurrent load
+@benchmarks.cli.command("async_reads")
+@click.option('--scale', default=5000, show_default=True, help="Cars to seed when the database is empty.")
+@click.option('--threads', default=8, show_default=True, help="Concurrent clients.")
+@click.option('--requests', 'request_count', default=1000, show_default=True, help="Requests per mode.")
+@with_appcontext
+def async_reads(scale, threads, request_count):
+    # The async views need the async engine, which is only configured with ASYNC_MODE=1
+    if not async_db.enabled:
+        click.echo("Run with ASYNC_MODE=1 so both modes can be compared.")
+        raise SystemExit(1)
+    ensure_dataset(scale)
+
+    # Half single-car lookups, half make/model searches, in a fixed order for every mode
+    rng = random.Random(0)
+    car_ids = db.session.scalars(select(Car.car_id)).all()
+    makes_models = db.session.execute(select(MakeModelYear.make, MakeModelYear.model).distinct()).all()
+    urls = [
+        f"/api/cars/{rng.choice(car_ids)}" if index % 2 == 0
+        else "/api/cars?make={}&model={}".format(*rng.choice(makes_models))
+        for index in range(request_count)
+    ]
+    db.session.remove()
+
+    app = current_app._get_current_object()
+    modes = (("sync", {'cars.get_cars': get_cars, 'cars.get_car': get_car}), ("async", async_views))
+    click.echo(f"{request_count} requests per mode from {threads} threads on {db.engine.dialect.name}:")
+    for label, views in modes:
+        app.view_functions.update(views)
+        # A short untimed run opens the pooled connections and compiles the statements
+        run_load(app, urls[:threads * 4], threads)
+        started = time.perf_counter()
+        timings = run_load(app, urls, threads)
+        report(label, timings, time.perf_counter() - started)
+
+# Random saved search criteria, shaped like real ones: most name a make, many a model and a price range
+def random_search(rng, makes):
+    criteria = {}
+    if rng.random() < 0.97:
+        criteria["make"] = rng.choice(list(makes))
+        if rng.random() < 0.6:
+            criteria["model"] = rng.choice(makes[criteria["make"]])
+    if rng.random() < 0.3:
+        criteria["condition"] = rng.choice(("new", "used", "certified"))
+    if rng.random() < 0.8:
+        criteria["price_min"] = rng.randint(1000, 40000)
+    if rng.random() < 0.8:
+        criteria["price_max"] = criteria.get("price_min", 0) + rng.randint(1000, 15000)
+    if rng.random() < 0.5:
+        criteria["year_min"] = rng.randint(2000, 2020)
+    if rng.random() < 0.5:
+        criteria["mileage_max"] = rng.randint(10000, 200000)
+    return criteria
+
+# Match a listing by checking every saved search, as a reference for the index
+def scan_searches(searches, listing):
+    return [
+        search_id for search_id, criteria in searches.items()
+        if all(criteria.get(name) in (None, listing[name]) for name in ("make", "model", "condition"))
+        and (criteria.get("price_min") is None or criteria["price_min"] <= listing["price"])
+        and (criteria.get("price_max") is None or listing["price"] <= criteria["price_max"])
+        and all(
+            (criteria.get(f"{name}_min") is None or criteria[f"{name}_min"] <= listing[name])
+            and (criteria.get(f"{name}_max") is None or listing[name] <= criteria[f"{name}_max"])
+            for name in RANGE_CRITERIA
+        )
+    ]
+
+# Compare matching listings with the saved search index against scanning every search
+@benchmarks.cli.command("saved_searches")
+@click.option('--searches', 'search_count', default=100000, show_default=True, help="Saved searches to index.")
+@click.option('--listings', 'listing_count', default=2000, show_default=True, help="Listings matched with the index.")
+@click.option('--scanned', 'scan_count', default=50, show_default=True, help="Listings matched by a full scan.")
+def saved_searches(search_count, listing_count, scan_count):
+    # Synthetic criteria, so the run needs no database and is the same on every machine
+    rng = random.Random(0)
+    makes = {f"make{i}": [f"model{i}_{j}" for j in range(10)] for i in range(40)}
+    searches = {search_id: random_search(rng, makes) for search_id in range(search_count)}
+    listings = []
+    for _ in range(listing_count):
+        make = rng.choice(list(makes))
+        listings.append({
+            "make": make, "model": rng.choice(makes[make]), "condition": rng.choice(("new", "used", "certified")),
+            "price": rng.uniform(1000, 60000), "year": rng.randint(2000, 2024), "mileage": rng.randint(0, 250000)
+        })
+
+    started = time.perf_counter()
+    index = SavedSearchIndex()
+    for search_id, criteria in searches.items():
+        index.add(search_id, criteria)
+    # The first match builds the price interval trees of every bucket it touches
+    for listing in listings:
+        index.match(listing)
+    click.echo(f"Indexed {search_count} saved searches in {time.perf_counter() - started:.1f}s.")
+
+    timings, matched, elapsed = time_calls(index.match, listings)
+    report("index", timings, elapsed, unit="listings/s")
+    scan_timings, scanned, scan_elapsed = time_calls(lambda listing: scan_searches(searches, listing), listings[:scan_count])
+    report("scan", scan_timings, scan_elapsed, unit="listings/s")
+    click.echo(f"{sum(map(len, matched)) / len(matched):.1f} matches per listing on average.")
+    if any(sorted(index_ids) != sorted(scan_ids) for index_ids, scan_ids in zip(matched, scanned)):
+        raise click.ClickException("The index and the scan matched different searches.")
+
+# Measure the similar-car index: its build time, query latency, and query latency during a rebuild
+@benchmarks.cli.command("similar_cars")
+@click.option('--scale', default=1000000, show_default=True, help="Cars to seed when the database is empty.")
+@click.option('--queries', 'query_count', default=200, show_default=True, help="Queries per measurement.")
+@click.option('--batch', default=10, show_default=True, help="Query cars per batched query.")
+@click.option('--threads', 'thread_count', default=4, show_default=True, help="Threads sending batched queries at once.")
+@with_appcontext
+def similar_cars_benchmark(scale, query_count, batch, thread_count):
+    if not similar_cars.available:
+        raise click.ClickException("The similar-car index needs NumPy.")
+    ensure_dataset(scale)
+    rng = random.Random(0)
+    car_ids = db.session.scalars(select(Car.car_id)).all()
+    db.session.remove()
+
+    started = time.perf_counter()
+    similar_cars._built_at = None
+    similar_cars._refreshed_at = None
+    similar_cars.refresh()
+    click.echo(f"Built the index of {similar_cars._size} available cars in {time.perf_counter() - started:.1f}s.")
+
+    queries = [rng.sample(car_ids, batch) for _ in range(query_count)]
+    for label, size in (("1 car", 1), (f"{batch} cars", batch)):
+        timings, _, elapsed = time_calls(lambda ids: similar_cars.similar(ids[:size], 10), queries)
+        report(label, timings, elapsed, unit="queries/s")
+
+    # Queries score the index outside its lock, so concurrent ones overlap instead of queueing
+    timings = []
+    lock = threading.Lock()
+    app = current_app._get_current_object()
+
+    def query_thread(batches):
+        with app.app_context():
+            for ids in batches:
+                call_started = time.perf_counter()
+                similar_cars.similar(ids, 10)
+                with lock:
+                    timings.append(time.perf_counter() - call_started)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=query_thread, args=(queries[i::thread_count],)) for i in range(thread_count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    report(f"{batch} cars x{thread_count}", timings, time.perf_counter() - started, unit="queries/s")
+
+    # Queries keep being answered from the current index while the rebuild runs in the background
+    similar_cars._start_rebuild()
+    timings = []
+    started = time.perf_counter()
+    while similar_cars._rebuild_thread.is_alive():
+        ids = rng.sample(car_ids, batch)
+        call_started = time.perf_counter()
+        similar_cars.similar(ids, 10)
+        timings.append(time.perf_counter() - call_started)
+    report("rebuilding", timings, time.perf_counter() - started, unit="queries/s")
+
+# Measure the price model: its fit time, estimate latency, and estimate latency during a rebuild
+@benchmarks.cli.command("valuations")
+@click.option('--scale', default=1000000, show_default=True, help="Cars to seed when the database is empty.")
+@click.option('--estimates', 'estimate_count', default=10000, show_default=True, help="Estimates per measurement.")
+@with_appcontext
+def valuations_benchmark(scale, estimate_count):
+    if not price_model.available:
+        raise click.ClickException("The price model needs NumPy.")
+    ensure_dataset(scale)
+    rng = random.Random(0)
+    makemodelyears = db.session.execute(select(MakeModelYear.make, MakeModelYear.model, MakeModelYear.year)).all()
+    db.session.remove()
+
+    started = time.perf_counter()
+    price_model._built_at = None
+    price_model._refreshed_at = None
+    price_model.refresh()
+    sales = int(price_model._count[:price_model._size].sum()) // 2
+    click.echo(f"Fitted {price_model._size} groups from {sales} sales in {time.perf_counter() - started:.1f}s.")
+
+    cars = [
+        (*rng.choice(makemodelyears), rng.randint(0, 250000), rng.choice(("new", "used", "certified")))
+        for _ in range(estimate_count)
+    ]
+    timings, _, elapsed = time_calls(lambda car: price_model.estimate(*car), cars)
+    report("estimate", timings, elapsed, unit="estimates/s", precision=3)
+
+    # Estimates keep being answered from the current model while the rebuild runs in the background
+    price_model._start_rebuild()
+    timings = []
+    started = time.perf_counter()
+    while price_model._rebuild_thread.is_alive():
+        car = rng.choice(cars)
+        call_started = time.perf_counter()
+        price_model.estimate(*car)
+        timings.append(time.perf_counter() - call_started)
+    report("rebuilding", timings, time.perf_counter() - started, unit="estimates/s", precision=3)
+    click.echo(f"Slowest estimate during the rebuild: {max(timings) * 1000:.1f} ms.")
+
+# Return the average duration in milliseconds of `repeat` calls to func
+def average_ms(func, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) / repeat * 1000
+
+# Compare the size and encode/decode time of JSON and MessagePack bodies of real responses
+@benchmarks.cli.command("response_formats")
+@click.option('--scale', default=5000, show_default=True, help="Cars to seed when the database is empty.")
+@click.option('--repeat', default=20, show_default=True, help="Encodes and decodes timed per body.")
+@with_appcontext
+def response_formats_benchmark(scale, repeat):
+    if msgpack is None:
+        raise click.ClickException("MessagePack responses need the msgpack package.")
+    ensure_dataset(scale)
+    rng = random.Random(0)
+    car_id = rng.choice(db.session.scalars(select(Car.car_id)).all())
+    make, model = rng.choice(db.session.execute(select(MakeModelYear.make, MakeModelYear.model).distinct()).all())
+    db.session.remove()
+
+    app = current_app._get_current_object()
+    client = app.test_client()
+    endpoints = (
+        ("car", f"/api/cars/{car_id}"),
+        ("car search", f"/api/cars?make={make}&model={model}"),
+        ("makemodelyear", "/api/makemodelyear"),
+    )
+    click.echo(f"{'endpoint':<14} {'format':<8} {'bytes':>10} {'gzip bytes':>11} {'encode ms':>10} {'decode ms':>10}")
+    for label, path in endpoints:
+        response = client.get(path)
+        if response.status_code != 200:
+            raise click.ClickException(f"{path} returned {response.status_code}.")
+        payload = response.get_json()
+        # Encoded the way the JSON provider and the MessagePack negotiation encode responses
+        formats = (
+            ("json", lambda: app.json.dumps(payload).encode("utf-8"), json.loads),
+            ("msgpack", lambda: msgpack.packb(payload, default=app.json.default), msgpack.unpackb),
+        )
+        for name, encode, decode in formats:
+            body = encode()
+            click.echo(
+                f"{label:<14} {name:<8} {len(body):>10} {len(gzip.compress(body, 6)):>11} "
+                f"{average_ms(encode, repeat):>10.2f} {average_ms(lambda: decode(body), repeat):>10.2f}"
+            )
+
+# Run in a fresh interpreter per startup, so every import and cache starts cold. Prints its timings as JSON
+STARTUP_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import main
+timings = {"import main": time.perf_counter() - started}
+started = time.perf_counter()
+app = main.create_app()
+timings["create_app"] = time.perf_counter() - started
+client = app.test_client()
+for path in sys.argv[1:]:
+    started = time.perf_counter()
+    response = client.get(path)
+    response.get_data()
+    timings[f"GET {path}"] = time.perf_counter() - started
+    if response.status_code != 200:
+        sys.exit(f"{path} returned {response.status_code}")
+print(json.dumps({name: seconds * 1000 for name, seconds in timings.items()}))
+"""
+
+# Measure how long a new process takes to serve: importing the app, create_app with and without WARM_UP,
+# and the first request to each warm-up path
+@benchmarks.cli.command("startup")
+@click.option('--scale', default=5000, show_default=True, help="Cars to seed when the database is empty.")
+@click.option('--runs', default=3, show_default=True, help="Fresh processes started per mode.")
+@with_appcontext
+def startup_benchmark(scale, runs):
+    ensure_dataset(scale)
+    db.session.remove()
+    paths = [
+        part.strip() for part in os.environ.get("WARM_UP_PATHS", DEFAULT_WARM_UP_PATHS).split(",") if part.strip()
+    ]
+
+    results = {}
+    for mode, warm_up in (("cold", "0"), ("warm-up", "1")):
+        # The child is not a Flask CLI command, so it honours WARM_UP
+        env = {key: value for key, value in os.environ.items() if key != "FLASK_RUN_FROM_CLI"}
+        env["WARM_UP"] = warm_up
+        samples = []
+        for _ in range(runs):
+            child = subprocess.run(
+                [sys.executable, "-c", STARTUP_SCRIPT, *paths],
+                cwd=current_app.root_path, env=env, capture_output=True, text=True
+            )
+            if child.returncode != 0:
+                raise click.ClickException(f"The {mode} startup failed:\n{(child.stderr or child.stdout).strip()}")
+            samples.append(json.loads(child.stdout.strip().splitlines()[-1]))
+        # Medians, since a single slow start (e.g. a cold disk cache) would skew a mean
+        results[mode] = {name: statistics.median(sample[name] for sample in samples) for name in samples[0]}
+
+    click.echo(f"Median of {runs} fresh processes per mode on {db.engine.dialect.name}, in ms:")
+    click.echo(f"{'step':<28} {'cold':>9} {'warm-up':>9}")
+    for name in results["cold"]:
+        click.echo(f"{name:<28} {results['cold'][name]:>9.1f} {results['warm-up'][name]:>9.1f}")
+    first_requests = {
+        mode: sum(value for name, value in steps.items() if name.startswith("GET ")) for mode, steps in results.items()
+    }
+    click.echo(f"{'first requests':<28} {first_requests['cold']:>9.1f} {first_requests['warm-up']:>9.1f}")
+    ready = {mode: sum(steps.values()) for mode, steps in results.items()}
+    click.echo(f"{'total':<28} {ready['cold']:>9.1f} {ready['warm-up']:>9.1f}")
+
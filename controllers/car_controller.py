@@ -1,29 +1,275 @@
+# Import standard library modules
+import asyncio
+import os
+from collections import defaultdict
+from datetime import datetime
+
 # Import third-party modules
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import get_jwt_identity, jwt_required
 from marshmallow import ValidationError
+from sqlalchemy import bindparam, case, distinct, exists, func, insert, select, update
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.exc import StaleDataError
 
 # Import local modules
 from init import db
-from models.car import Car, CarSchema
+from models.archive import CarTransactionArchive, ListingArchive
+from models.car import Car, CarSchema, CarFilterSchema
+from models.car_transaction import CarTransaction
+from models.change_log import record_changes
+from models.listing import Listing
 from models.makemodelyear import MakeModelYear
 from models.user import User
+from utils.async_db import async_db
+from utils.audit import IGNORED_COLUMNS, audit_log, audit_value
+from utils.cache import TTLCache
+from utils.params import order_by_ids, parse_id_list
+from utils.preconditions import check_if_match, etag_header, precondition_failed
+from utils.similarity import similar_cars
+from utils.valuation import price_model
 
 # Create a Blueprint for car management
 cars_bp = Blueprint('cars', __name__)
 
-# Route to get all cars
+# Upper bounds of the price buckets reported by the facets endpoint
+PRICE_BUCKET_EDGES = [5000, 10000, 20000, 30000, 50000, 100000]
+# Width (in years) of the year buckets reported by the facets endpoint
+YEAR_BUCKET_SIZE = 5
+
+# Short-lived cache of computed facet counts, keyed by the applied filters
+facets_cache = TTLCache(ttl=int(os.environ.get("FACETS_CACHE_TTL") or 30))
+
+# Maximum number of cars accepted by one bulk request
+MAX_BULK_CARS = int(os.environ.get("MAX_BULK_CARS", 1000))
+# Car columns a bulk update may change
+BULK_UPDATE_FIELDS = ('mileage', 'price', 'condition', 'description', 'image_url', 'make_model_year_id')
+
+# Default and maximum number of similar cars returned per car
+DEFAULT_SIMILAR_CARS = 10
+MAX_SIMILAR_CARS = 50
+
+# Relations CarSchema serializes, loaded up front so batch lookups avoid N+1 queries
+CAR_EAGER_LOADS = (
+    joinedload(Car.make_model_year),
+    selectinload(Car.listings).selectinload(Listing.user).selectinload(User.car_transactions),
+    selectinload(Car.car_transactions).selectinload(CarTransaction.user)
+)
+# The same relations for unbounded lists. selectinload sends one IN query per 500 parents, so the
+# per-car collections, which hold a few rows each, are joined into the list query instead (subqueryload
+# crashes the interpreter's garbage collector with SQLAlchemy's C extensions on large lists); the sellers'
+# transactions stay on selectinload, since a join would repeat each seller's transactions once per listing
+CAR_LIST_EAGER_LOADS = (
+    joinedload(Car.make_model_year),
+    joinedload(Car.listings).joinedload(Listing.user).selectinload(User.car_transactions),
+    joinedload(Car.car_transactions).joinedload(CarTransaction.user)
+)
+
+# Apply validated CarFilterSchema filters to a query already joined to MakeModelYear
+def apply_car_filters(query, filters):
+    if 'make' in filters:
+        query = query.filter(MakeModelYear.make == filters['make'])
+    if 'model' in filters:
+        query = query.filter(MakeModelYear.model == filters['model'])
+    if 'year_min' in filters:
+        query = query.filter(MakeModelYear.year >= filters['year_min'])
+    if 'year_max' in filters:
+        query = query.filter(MakeModelYear.year <= filters['year_max'])
+    if 'condition' in filters:
+        query = query.filter(Car.condition == filters['condition'])
+    if 'price_min' in filters:
+        query = query.filter(Car.price >= filters['price_min'])
+    if 'price_max' in filters:
+        query = query.filter(Car.price <= filters['price_max'])
+    if 'mileage_max' in filters:
+        query = query.filter(Car.mileage <= filters['mileage_max'])
+    if 'listing_status' in filters:
+        query = query.filter(Listing.listing_status == filters['listing_status'])
+    return query
+
+# Build the SELECT statement for cars matching the validated search filters
+def car_search_statement(filters):
+    statement = select(Car)
+    if filters:
+        statement = statement.join(Car.make_model_year)
+        if 'listing_status' in filters:
+            statement = statement.join(Car.listings)
+        statement = apply_car_filters(statement, filters).distinct()
+    return statement
+
+# Count available cars grouped by a single expression, honouring the search filters
+def count_available_cars_by(expression, filters):
+    query = (
+        db.session.query(expression, func.count(distinct(Car.car_id)))
+        .select_from(Car)
+        .join(Car.make_model_year)
+        .join(Car.listings)
+        .filter(Listing.listing_status == 'available')
+    )
+    query = apply_car_filters(query, filters)
+    return query.group_by(expression).all()
+
+# Compute every facet in one grouped query per facet
+def compute_car_facets(filters):
+    # Facets are always computed over available cars
+    filters = {key: value for key, value in filters.items() if key != 'listing_status'}
+
+    # Price buckets are numbered in SQL and labelled in Python
+    price_bucket = case(
+        *[(Car.price < edge, index) for index, edge in enumerate(PRICE_BUCKET_EDGES)],
+        else_=len(PRICE_BUCKET_EDGES)
+    ).label('price_bucket')
+    year_bucket = ((MakeModelYear.year // YEAR_BUCKET_SIZE) * YEAR_BUCKET_SIZE).label('year_bucket')
+
+    conditions = count_available_cars_by(Car.condition, filters)
+    makes = count_available_cars_by(MakeModelYear.make, filters)
+    years = count_available_cars_by(year_bucket, filters)
+    prices = count_available_cars_by(price_bucket, filters)
+
+    price_labels = []
+    lower = 0
+    for edge in PRICE_BUCKET_EDGES:
+        price_labels.append(f"{lower}-{edge}")
+        lower = edge
+    price_labels.append(f"{lower}+")
+
+    return {
+        'total': sum(count for _, count in conditions),
+        'condition': [
+            {'value': value, 'count': count} for value, count in sorted(conditions)
+        ],
+        'make': [
+            {'value': value, 'count': count}
+            for value, count in sorted(makes, key=lambda row: (-row[1], row[0]))
+        ],
+        'year': [
+            {'value': f"{start}-{start + YEAR_BUCKET_SIZE - 1}", 'count': count}
+            for start, count in sorted(years)
+        ],
+        'price': [
+            {'value': price_labels[index], 'count': count}
+            for index, count in sorted(prices)
+        ]
+    }
+
+# Route to get all cars (optionally filtered by the car search parameters)
 @cars_bp.route('/cars', methods=['GET'])
 def get_cars():
     try:
-        # Retrieve all car entries from the database
-        cars = Car.query.all()
+        # Batch lookup by id list (e.g. ?ids=3,1,2) in a single IN query
+        if 'ids' in request.args:
+            ids = parse_id_list(request.args['ids'])
+            cars = db.session.scalars(
+                select(Car).where(Car.car_id.in_(ids)).options(*CAR_EAGER_LOADS)
+            ).unique().all()
+            found, missing = order_by_ids(cars, ids, 'car_id')
+            return jsonify({'items': CarSchema(many=True).dump(found), 'missing': missing}), 200
+
+        # Validate any search filters supplied in the query string
+        filters = CarFilterSchema().load(request.args)
+
+        # Retrieve the matching car entries from the database
+        cars = db.session.scalars(
+            car_search_statement(filters).options(*CAR_LIST_EAGER_LOADS)
+        ).unique().all()
 
         # Serialize the data using the CarSchema
         data = CarSchema(many=True).dump(cars)
 
         # Return the serialized data as JSON
         return jsonify(data), 200
+    except ValidationError as ve:
+        # Return validation errors to the client
+        return jsonify({'errors': ve.messages}), 400
+    except Exception:
+        # Return a generic error message to the client
+        return jsonify({'error': 'An internal server error occurred.'}), 500
+
+# Route to get facet counts for available cars
+@cars_bp.route('/cars/facets', methods=['GET'])
+def get_car_facets():
+    try:
+        # Validate the same search filters accepted by get_cars
+        filters = CarFilterSchema().load(request.args)
+
+        # Serve from the short-lived cache when possible
+        cache_key = tuple(sorted(filters.items()))
+        data = facets_cache.get(cache_key)
+        if data is None:
+            data = compute_car_facets(filters)
+            facets_cache.set(cache_key, data)
+
+        # Return the facet counts as JSON
+        return jsonify(data), 200
+    except ValidationError as ve:
+        # Return validation errors to the client
+        return jsonify({'errors': ve.messages}), 400
+    except Exception:
+        # Return a generic error message to the client
+        return jsonify({'error': 'An internal server error occurred.'}), 500
+
+# Return {car_id: [similar Car objects]} for a batch of cars, using the in-memory feature index
+def load_similar_cars(ids):
+    limit = request.args.get('limit', DEFAULT_SIMILAR_CARS, type=int)
+    if limit < 1:
+        raise ValidationError({'limit': ['limit must be a positive integer.']})
+    similar_ids = similar_cars.similar(ids, min(limit, MAX_SIMILAR_CARS))
+
+    # Load every recommended car, with its make/model/year, in one query
+    wanted = {car_id for car_ids in similar_ids.values() for car_id in car_ids}
+    cars = {
+        car.car_id: car for car in
+        Car.query.filter(Car.car_id.in_(wanted)).options(joinedload(Car.make_model_year)).all()
+    } if wanted else {}
+    return {
+        car_id: [cars[similar_id] for similar_id in car_ids if similar_id in cars]
+        for car_id, car_ids in similar_ids.items()
+    }
+
+# Route to get the available cars most similar to one car
+@cars_bp.route('/cars/<int:id>/similar', methods=['GET'])
+def get_similar_cars(id):
+    # The feature index needs NumPy
+    if not similar_cars.available:
+        return jsonify({'error': 'Similar cars are not available on this server.'}), 503
+
+    try:
+        similar = load_similar_cars([id])
+
+        # Check if the car exists
+        if id not in similar:
+            return jsonify({'error': 'Car not found.'}), 404
+
+        # Return the similar cars, most similar first
+        return jsonify(CarSchema(many=True, exclude=['listings', 'car_transactions']).dump(similar[id])), 200
+    except ValidationError as ve:
+        # Return validation errors to the client
+        return jsonify({'errors': ve.messages}), 400
+    except Exception:
+        # Return a generic error message to the client
+        return jsonify({'error': 'An internal server error occurred.'}), 500
+
+# Route to get similar cars for several cars in one vectorised query (e.g. ?ids=3,1,2)
+@cars_bp.route('/cars/similar', methods=['GET'])
+def get_similar_cars_batch():
+    # The feature index needs NumPy
+    if not similar_cars.available:
+        return jsonify({'error': 'Similar cars are not available on this server.'}), 503
+
+    try:
+        ids = parse_id_list(request.args.get('ids', ''))
+        similar = load_similar_cars(ids)
+
+        # Return the similar cars per requested car, and the ids that were not found
+        schema = CarSchema(many=True, exclude=['listings', 'car_transactions'])
+        return jsonify({
+            'items': {str(car_id): schema.dump(similar[car_id]) for car_id in ids if car_id in similar},
+            'missing': [car_id for car_id in ids if car_id not in similar]
+        }), 200
+    except ValidationError as ve:
+        # Return validation errors to the client
+        return jsonify({'errors': ve.messages}), 400
     except Exception:
         # Return a generic error message to the client
         return jsonify({'error': 'An internal server error occurred.'}), 500
@@ -42,12 +288,100 @@ def get_car(id):
         # Serialize the car data
         data = CarSchema().dump(car)
 
-        # Return the serialized data as JSON
-        return jsonify(data), 200
+        # Return the serialized data as JSON, with its version as the ETag
+        return jsonify(data), 200, etag_header(car)
+    except Exception:
+        # Return a generic error message to the client
+        return jsonify({'error': 'An internal server error occurred.'}), 500
+
+# Run a statement on its own AsyncSession so several can run concurrently
+async def fetch_all_async(statement):
+    async with async_db.session() as session:
+        return (await session.scalars(statement)).unique().all()
+
+# Load cars and every relation CarSchema dumps, running the independent queries concurrently
+async def load_cars_async(statement):
+    car_ids = statement.with_only_columns(Car.car_id)
+    cars, makemodelyears, listings, transactions = await asyncio.gather(
+        fetch_all_async(statement),
+        fetch_all_async(
+            select(MakeModelYear)
+            .join(MakeModelYear.cars)
+            .where(Car.car_id.in_(car_ids))
+        ),
+        fetch_all_async(
+            select(Listing)
+            .where(Listing.car_id.in_(car_ids))
+            .options(selectinload(Listing.user).selectinload(User.car_transactions))
+        ),
+        fetch_all_async(
+            select(CarTransaction)
+            .where(CarTransaction.car_id.in_(car_ids))
+            .options(selectinload(CarTransaction.user))
+        )
+    )
+
+    # Attach the related rows so serialization never triggers a lazy load
+    makemodelyears_by_id = {mmy.make_model_year_id: mmy for mmy in makemodelyears}
+    listings_by_car = defaultdict(list)
+    for listing in listings:
+        listings_by_car[listing.car_id].append(listing)
+    transactions_by_car = defaultdict(list)
+    for transaction in transactions:
+        transactions_by_car[transaction.car_id].append(transaction)
+    for car in cars:
+        set_committed_value(car, 'make_model_year', makemodelyears_by_id.get(car.make_model_year_id))
+        set_committed_value(car, 'listings', listings_by_car[car.car_id])
+        set_committed_value(car, 'car_transactions', transactions_by_car[car.car_id])
+    return cars
+
+# Async variant of get_cars, used in place of it when ASYNC_MODE is enabled
+async def get_cars_async():
+    try:
+        # Batch lookup by id list (e.g. ?ids=3,1,2)
+        if 'ids' in request.args:
+            ids = parse_id_list(request.args['ids'])
+            cars = await load_cars_async(select(Car).where(Car.car_id.in_(ids)))
+            found, missing = order_by_ids(cars, ids, 'car_id')
+            return jsonify({'items': CarSchema(many=True).dump(found), 'missing': missing}), 200
+
+        # Validate any search filters supplied in the query string
+        filters = CarFilterSchema().load(request.args)
+
+        # Retrieve the matching cars and their relations concurrently
+        cars = await load_cars_async(car_search_statement(filters))
+
+        # Serialize and return the data as JSON
+        return jsonify(CarSchema(many=True).dump(cars)), 200
+    except ValidationError as ve:
+        # Return validation errors to the client
+        return jsonify({'errors': ve.messages}), 400
     except Exception:
         # Return a generic error message to the client
         return jsonify({'error': 'An internal server error occurred.'}), 500
 
+# Async variant of get_car, used in place of it when ASYNC_MODE is enabled
+async def get_car_async(id):
+    try:
+        # Retrieve the car, its make/model/year, listings and transactions concurrently
+        cars = await load_cars_async(select(Car).where(Car.car_id == id))
+
+        # Check if the car exists
+        if not cars:
+            return jsonify({'error': 'Car not found.'}), 404
+
+        # Serialize and return the car data as JSON, with its version as the ETag
+        return jsonify(CarSchema().dump(cars[0])), 200, etag_header(cars[0])
+    except Exception:
+        # Return a generic error message to the client
+        return jsonify({'error': 'An internal server error occurred.'}), 500
+
+# Async views that replace the synchronous endpoints in async mode
+async_views = {
+    'cars.get_cars': get_cars_async,
+    'cars.get_car': get_car_async
+}
+
 # Route to create a new car
 @cars_bp.route('/cars', methods=['POST'])
 @jwt_required()
@@ -79,12 +413,18 @@ def create_car():
             make_model_year_id=data['make_model_year_id']
         )
 
+        # Compare the price with recent sales of similar cars
+        price_check = price_model.check_price(make_model_year, new_car.mileage, new_car.condition, new_car.price)
+
         # Add and commit the new car to the database
         db.session.add(new_car)
         db.session.commit()
 
-        # Return the new car as JSON
-        return CarSchema().dump(new_car), 201
+        # Return the new car as JSON, flagging a price far outside the expected band
+        response = CarSchema().dump(new_car)
+        if price_check is not None:
+            response['price_check'] = price_check
+        return response, 201
     except ValidationError as ve:
         # Return validation errors to the client
         return jsonify({'errors': ve.messages}), 400
@@ -92,6 +432,185 @@ def create_car():
         # Return a generic error message to the client
         return jsonify({'error': 'An internal server error occurred.'}), 500
 
+# Validate a bulk payload with CarSchema(many=True), returning (valid rows by index, errors by index)
+def load_bulk_cars(payload, partial=False):
+    if not isinstance(payload, list) or not payload:
+        raise ValidationError({'_schema': ['Expected a non-empty list of cars.']})
+    if len(payload) > MAX_BULK_CARS:
+        raise ValidationError({'_schema': [f'At most {MAX_BULK_CARS} cars may be sent at once.']})
+    try:
+        rows = CarSchema(many=True).load(payload, partial=partial)
+        errors = {}
+    except ValidationError as ve:
+        rows, errors = ve.valid_data, ve.messages
+    valid = {
+        index: row for index, row in enumerate(rows)
+        if index not in errors and isinstance(row, dict)
+    }
+    return valid, dict(errors)
+
+# Return the subset of make_model_year_ids that exist, using a single query
+def existing_make_model_year_ids(ids):
+    if not ids:
+        return set()
+    return set(db.session.scalars(
+        select(MakeModelYear.make_model_year_id)
+        .where(MakeModelYear.make_model_year_id.in_(ids))
+    ))
+
+# Route to create many cars at once
+@cars_bp.route('/cars/bulk', methods=['POST'])
+@jwt_required()
+def bulk_create_cars():
+    # Get current user ID from the JWT token
+    current_user_id = get_jwt_identity()
+    user = User.query.get(current_user_id)
+
+    # Check if the user exists and is an admin
+    if not user or not user.is_admin:
+        return jsonify({'error': 'You do not have permission to perform this action.'}), 403
+
+    try:
+        # Validate every row, collecting per-row errors
+        valid, errors = load_bulk_cars(request.get_json())
+
+        # Resolve all referenced make_model_year_ids in one query
+        known_ids = existing_make_model_year_ids({row['make_model_year_id'] for row in valid.values()})
+        for index in [index for index, row in valid.items() if row['make_model_year_id'] not in known_ids]:
+            errors[index] = {'make_model_year_id': ['Invalid make_model_year_id provided.']}
+            del valid[index]
+        if not valid:
+            return jsonify({'created': [], 'errors': errors}), 400
+
+        # Insert all valid rows in one multi-row statement
+        now = datetime.utcnow()
+        indexes = sorted(valid)
+        rows = [
+            {
+                'mileage': valid[index]['mileage'],
+                'price': valid[index]['price'],
+                'condition': valid[index]['condition'],
+                'description': valid[index].get('description'),
+                'image_url': valid[index].get('image_url'),
+                'make_model_year_id': valid[index]['make_model_year_id'],
+                'updated_at': now,
+                'row_version': 1
+            }
+            for index in indexes
+        ]
+        car_ids = db.session.scalars(
+            insert(Car.__table__).returning(Car.__table__.c.car_id, sort_by_parameter_order=True),
+            rows
+        ).all()
+        record_changes(db.session.connection(), 'car', car_ids, 'upsert')
+        for car_id, row in zip(car_ids, rows):
+            audit_log.record(db.session, 'car', car_id, 'create', {
+                field: [None, audit_value(value)] for field, value in row.items() if field not in IGNORED_COLUMNS
+            })
+        db.session.commit()
+
+        # Report the new id of every created row alongside per-row errors
+        return jsonify({
+            'created': [{'index': index, 'car_id': car_id} for index, car_id in zip(indexes, car_ids)],
+            'errors': errors
+        }), 201
+    except ValidationError as ve:
+        # Return validation errors to the client
+        return jsonify({'errors': ve.messages}), 400
+    except Exception:
+        # Return a generic error message to the client
+        db.session.rollback()
+        return jsonify({'error': 'An internal server error occurred.'}), 500
+
+# Route to update many cars at once
+@cars_bp.route('/cars/bulk', methods=['PATCH'])
+@jwt_required()
+def bulk_update_cars():
+    # Get current user ID from the JWT token
+    current_user_id = get_jwt_identity()
+    user = User.query.get(current_user_id)
+
+    # Check if the user exists and is an admin
+    if not user or not user.is_admin:
+        return jsonify({'error': 'You do not have permission to perform this action.'}), 403
+
+    try:
+        # Validate every row (partial updates allowed), collecting per-row errors
+        payload = request.get_json()
+        valid, errors = load_bulk_cars(payload, partial=True)
+        for index in list(valid):
+            car_id = payload[index].get('car_id')
+            if not isinstance(car_id, int) or isinstance(car_id, bool):
+                errors[index] = {'car_id': ['An integer car_id is required.']}
+                del valid[index]
+            else:
+                valid[index] = {
+                    **{field: valid[index][field] for field in BULK_UPDATE_FIELDS if field in valid[index]},
+                    'car_id': car_id
+                }
+
+        # Resolve all referenced cars (with their current values, for the audit log) and make_model_year_ids
+        known_cars = {
+            row.car_id: row._mapping for row in db.session.execute(
+                select(Car.car_id, *[Car.__table__.c[field] for field in BULK_UPDATE_FIELDS])
+                .where(Car.car_id.in_({row['car_id'] for row in valid.values()}))
+            )
+        } if valid else {}
+        known_ids = existing_make_model_year_ids(
+            {row['make_model_year_id'] for row in valid.values() if 'make_model_year_id' in row}
+        )
+        for index, row in list(valid.items()):
+            if row['car_id'] not in known_cars:
+                errors[index] = {'car_id': ['Car not found.']}
+                del valid[index]
+            elif 'make_model_year_id' in row and row['make_model_year_id'] not in known_ids:
+                errors[index] = {'make_model_year_id': ['Invalid make_model_year_id provided.']}
+                del valid[index]
+        if not valid:
+            return jsonify({'updated': [], 'errors': errors}), 400
+
+        # Group rows by the set of fields they change and run one executemany UPDATE per group
+        groups = defaultdict(list)
+        for row in valid.values():
+            groups[tuple(sorted(field for field in row if field != 'car_id'))].append(row)
+        cars_table = Car.__table__
+        now = datetime.utcnow()
+        for fields, rows in groups.items():
+            statement = (
+                update(cars_table)
+                .where(cars_table.c.car_id == bindparam('b_car_id'))
+                .values({
+                    **{field: bindparam(f'b_{field}') for field in fields},
+                    'updated_at': now,
+                    'row_version': cars_table.c.row_version + 1
+                })
+            )
+            db.session.connection().execute(
+                statement,
+                [{f'b_{key}': value for key, value in row.items()} for row in rows]
+            )
+        updated_ids = [row['car_id'] for row in valid.values()]
+        record_changes(db.session.connection(), 'car', updated_ids, 'upsert')
+        for row in valid.values():
+            before = known_cars[row['car_id']]
+            changes = {
+                field: [audit_value(before[field]), audit_value(value)]
+                for field, value in row.items() if field != 'car_id' and before[field] != value
+            }
+            if changes:
+                audit_log.record(db.session, 'car', row['car_id'], 'update', changes)
+        db.session.commit()
+
+        # Report the updated ids alongside per-row errors
+        return jsonify({'updated': updated_ids, 'errors': errors}), 200
+    except ValidationError as ve:
+        # Return validation errors to the client
+        return jsonify({'errors': ve.messages}), 400
+    except Exception:
+        # Return a generic error message to the client
+        db.session.rollback()
+        return jsonify({'error': 'An internal server error occurred.'}), 500
+
 # Route to update a car
 @cars_bp.route('/cars/<int:id>', methods=['PUT'])
 @jwt_required()
@@ -112,6 +631,11 @@ def update_car(id):
         if not car:
             return jsonify({'error': 'Car not found.'}), 404
 
+        # Reject the write if the client edited an older version (If-Match)
+        failed = check_if_match(car)
+        if failed:
+            return failed
+
         # Load and validate input data (partial updates allowed)
         data = CarSchema().load(request.get_json(), partial=True)
 
@@ -133,14 +657,18 @@ def update_car(id):
                 return jsonify({'error': 'Invalid make_model_year_id provided.'}), 400
             car.make_model_year_id = data['make_model_year_id']
 
-        # Commit changes to the database
+        # Commit changes to the database; the UPDATE only applies to the version checked above
         db.session.commit()
 
-        # Return the updated car as JSON
-        return CarSchema().dump(car), 200
+        # Return the updated car as JSON, with its new version as the ETag
+        return CarSchema().dump(car), 200, etag_header(car)
     except ValidationError as ve:
         # Return validation errors to the client
         return jsonify({'errors': ve.messages}), 400
+    except StaleDataError:
+        # Another request updated the car between loading and committing
+        db.session.rollback()
+        return precondition_failed()
     except Exception:
         # Return a generic error message to the client
         return jsonify({'error': 'An internal server error occurred.'}), 500
@@ -171,6 +699,14 @@ def delete_car(id):
                 'error': 'Cannot delete car with associated transactions. Please delete or reassign associated transactions first.'
             }), 400
 
+        # Archived transactions and listings reference the car by ID only, so check them explicitly
+        if db.session.scalar(select(
+            exists().where(CarTransactionArchive.car_id == id) | exists().where(ListingArchive.car_id == id)
+        )):
+            return jsonify({
+                'error': 'Cannot delete car with archived transactions or listings.'
+            }), 400
+
         # Proceed to delete the car
         db.session.delete(car)
         db.session.commit()
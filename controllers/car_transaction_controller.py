@@ -1,10 +1,15 @@
 # Import standard library modules
-from datetime import datetime  # For timestamping
+import csv  # For CSV exports
+import io  # For buffering CSV chunks
+from datetime import date, datetime  # For timestamping and date ranges
 
 # Import third-party modules
-from flask import Blueprint, jsonify, request  # Flask functions
+from flask import Blueprint, Response, jsonify, request, stream_with_context  # Flask functions
 from flask_jwt_extended import jwt_required, get_jwt_identity  # JWT authentication
 from marshmallow import ValidationError  # For input validation errors
+from sqlalchemy import select  # For building the export query
+from sqlalchemy.orm import joinedload  # Eager loading options
+from sqlalchemy.orm.exc import StaleDataError  # Raised when a versioned row changed concurrently
 
 # Import local modules
 from init import db  # Database instance
@@ -12,10 +17,21 @@ from models.car_transaction import CarTransaction, CarTransactionSchema  # CarTr
 from models.user import User  # User model
 from models.car import Car  # Car model
 from models.listing import Listing  # Listing model
+from models.makemodelyear import MakeModelYear  # MakeModelYear model
+from models.archive import CarTransactionArchive  # Archived transactions
+from utils.admission import admission_class  # Admission route classes
+from utils.formats import msgpack, msgpack_default, negotiate_msgpack  # MessagePack exports
+from controllers.listing_controller import publish_listing_event  # Listing stream events
 
 # Create a Blueprint for car transaction routes
 car_transactions_bp = Blueprint('car_transactions', __name__)
 
+# Relations CarTransactionSchema serializes, all many-to-one, so the list loads in a single query
+CAR_TRANSACTION_EAGER_LOADS = (
+    joinedload(CarTransaction.user),
+    joinedload(CarTransaction.car).joinedload(Car.make_model_year)
+)
+
 # Route to get all car transactions
 @car_transactions_bp.route('/car-transactions', methods=['GET'])
 @jwt_required()
@@ -30,7 +46,7 @@ def get_car_transactions():
 
     try:
         # Retrieve all car transactions from the database
-        transactions = CarTransaction.query.all()
+        transactions = CarTransaction.query.options(*CAR_TRANSACTION_EAGER_LOADS).all()
 
         # Serialize the transactions using the CarTransactionSchema
         data = CarTransactionSchema(many=True).dump(transactions)
@@ -41,6 +57,106 @@ def get_car_transactions():
         # Return a generic error message to the client
         return jsonify({'error': 'An internal server error occurred.'}), 500
 
+# Columns of the transaction export and their types, in output order
+EXPORT_COLUMNS = (
+    ('transaction_id', 'integer', CarTransaction.transaction_id),
+    ('transaction_date', 'date', CarTransaction.transaction_date),
+    ('amount', 'float', CarTransaction.amount),
+    ('buyer_id', 'integer', CarTransaction.buyer_id),
+    ('car_id', 'integer', CarTransaction.car_id),
+    ('mileage', 'integer', Car.mileage),
+    ('price', 'float', Car.price),
+    ('condition', 'string', Car.condition),
+    ('make_model_year_id', 'integer', MakeModelYear.make_model_year_id),
+    ('make', 'string', MakeModelYear.make),
+    ('model', 'string', MakeModelYear.model),
+    ('year', 'integer', MakeModelYear.year)
+)
+# Rows fetched from the database and written per streamed chunk
+EXPORT_CHUNK_SIZE = 5000
+
+# Stream the export rows as CSV, one chunk at a time
+def generate_transaction_csv(statement):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _, _ in EXPORT_COLUMNS])
+    result = db.session.connection().execution_options(
+        stream_results=True, yield_per=EXPORT_CHUNK_SIZE
+    ).execute(statement)
+    for partition in result.partitions():
+        writer.writerows(partition)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+# Stream the export rows as MessagePack: an array of column names, then one array per row
+def generate_transaction_msgpack(statement):
+    packer = msgpack.Packer(default=msgpack_default)
+    yield packer.pack([name for name, _, _ in EXPORT_COLUMNS])
+    result = db.session.connection().execution_options(
+        stream_results=True, yield_per=EXPORT_CHUNK_SIZE
+    ).execute(statement)
+    for partition in result.partitions():
+        yield b"".join(packer.pack(tuple(row)) for row in partition)
+
+# Route to export car transactions with car and make/model/year attributes as CSV (Admin-only)
+@car_transactions_bp.route('/car-transactions/export', methods=['GET'])
+@admission_class("exports")
+@jwt_required()
+def export_car_transactions():
+    # Get current user ID from the JWT token
+    current_user_id = get_jwt_identity()
+    user = User.query.get(current_user_id)
+
+    # Check if the user exists and is an admin
+    if not user or not user.is_admin:
+        return jsonify({'error': 'You do not have permission to perform this action.'}), 403
+
+    # Parse the optional, inclusive transaction_date range (YYYY-MM-DD)
+    try:
+        start = request.args.get('from')
+        end = request.args.get('to')
+        start = date.fromisoformat(start) if start else None
+        end = date.fromisoformat(end) if end else None
+    except ValueError:
+        return jsonify({'error': "'from' and 'to' must be dates in YYYY-MM-DD format."}), 400
+
+    # Build the joined query; the transaction_date index serves the range filter
+    statement = (
+        select(*[column for _, _, column in EXPORT_COLUMNS])
+        .join(Car, CarTransaction.car_id == Car.car_id)
+        .join(MakeModelYear, Car.make_model_year_id == MakeModelYear.make_model_year_id)
+        .order_by(CarTransaction.transaction_date, CarTransaction.transaction_id)
+    )
+    if start:
+        statement = statement.where(CarTransaction.transaction_date >= start)
+    if end:
+        statement = statement.where(CarTransaction.transaction_date <= end)
+
+    # Stream CSV, or MessagePack when the client prefers it; column types are described in a response header
+    mimetype = negotiate_msgpack(default='text/csv')
+    column_types = ','.join(f"{name}:{type_}" for name, type_, _ in EXPORT_COLUMNS)
+    if mimetype:
+        return Response(
+            stream_with_context(generate_transaction_msgpack(statement)),
+            mimetype=mimetype,
+            headers={
+                'Content-Disposition': 'attachment; filename="car_transactions.msgpack"',
+                'X-Column-Types': column_types,
+                'Vary': 'Accept'
+            }
+        )
+    return Response(
+        stream_with_context(generate_transaction_csv(statement)),
+        mimetype='text/csv',
+        headers={
+            'Content-Disposition': 'attachment; filename="car_transactions.csv"',
+            'X-Column-Types': column_types,
+            'Vary': 'Accept'
+        }
+    )
+
 # Route to get a specific car transaction by ID
 @car_transactions_bp.route('/car-transactions/<int:id>', methods=['GET'])
 @jwt_required()
@@ -54,8 +170,8 @@ def get_car_transaction(id):
         return jsonify({'error': 'User not found.'}), 404
 
     try:
-        # Retrieve the car transaction by ID
-        transaction = CarTransaction.query.get(id)
+        # Retrieve the car transaction by ID, falling back to the archive for old transactions
+        transaction = CarTransaction.query.get(id) or CarTransactionArchive.query.get(id)
 
         # Check if the transaction exists
         if not transaction:
@@ -129,8 +245,15 @@ def create_car_transaction():
         db.session.add(new_transaction)
         db.session.commit()
 
+        # Notify listing stream subscribers that the car was sold
+        publish_listing_event('listing_status', listing)
+
         # Return the new transaction as JSON
         return CarTransactionSchema().dump(new_transaction), 201
+    except StaleDataError:
+        # A concurrent purchase marked the listing sold between loading and committing
+        db.session.rollback()
+        return jsonify({'error': 'Car is no longer available.'}), 409
     except Exception:
         # Return a generic error message to the client
         return jsonify({'error': 'An internal server error occurred.'}), 500
@@ -0,0 +1,102 @@
+# Import standard library modules
+import os
+
+# Import third-party modules
+from flask import Blueprint, jsonify, request
+from sqlalchemy import and_, distinct, func, select
+
+# Import local modules
+from init import db
+from models.car import Car
+from models.listing import Listing
+from models.makemodelyear import MakeModelYear
+from utils.cache import TTLCache
+
+# Create a Blueprint for the make -> model -> year catalog
+catalog_bp = Blueprint('catalog', __name__)
+
+# Cache of catalog lookups; cleared by every makemodelyear write
+# Counts also change when cars and listings change, so entries still expire after a TTL
+catalog_cache = TTLCache(ttl=int(os.environ.get("CATALOG_CACHE_TTL", 300)))
+
+# Return True when the client asked for car and available-listing counts
+def wants_counts():
+    return request.args.get('counts', '').lower() in ('1', 'true', 'yes')
+
+# Run a grouped catalog query over the given columns, optionally with counts
+def catalog_rows(columns, conditions, counts):
+    statement = (
+        select(*columns)
+        .where(*conditions)
+        .group_by(*columns)
+        .order_by(*columns)
+    )
+    if counts:
+        # Outer joins keep combinations that have no cars or no available listings
+        statement = (
+            statement
+            .add_columns(
+                func.count(distinct(Car.car_id)).label('car_count'),
+                func.count(distinct(Listing.listing_id)).label('available_listing_count')
+            )
+            .select_from(MakeModelYear)
+            .outerjoin(Car, Car.make_model_year_id == MakeModelYear.make_model_year_id)
+            .outerjoin(Listing, and_(Listing.car_id == Car.car_id, Listing.listing_status == 'available'))
+        )
+    return [dict(row._mapping) for row in db.session.execute(statement)]
+
+# Return cached catalog rows, computing and caching them on a miss
+def cached_catalog(cache_key, columns, conditions):
+    counts = wants_counts()
+    cache_key = cache_key + (counts,)
+    rows = catalog_cache.get(cache_key)
+    if rows is None:
+        rows = catalog_rows(columns, conditions, counts)
+        catalog_cache.set(cache_key, rows)
+    return rows
+
+# Route to list the distinct car makes
+@catalog_bp.route('/makes', methods=['GET'])
+def get_makes():
+    try:
+        # Return every distinct make
+        return jsonify(cached_catalog(('makes',), [MakeModelYear.make], [])), 200
+    except Exception:
+        # Return a generic error message with a 500 Internal Server Error status
+        return jsonify({'error': 'An internal server error occurred.'}), 500
+
+# Route to list the distinct models of a make
+@catalog_bp.route('/makes/<make>/models', methods=['GET'])
+def get_models(make):
+    try:
+        rows = cached_catalog(('models', make), [MakeModelYear.model], [MakeModelYear.make == make])
+
+        # An unknown make has no models
+        if not rows:
+            return jsonify({'error': 'Make not found.'}), 404
+
+        # Return the distinct models of the make
+        return jsonify(rows), 200
+    except Exception:
+        # Return a generic error message with a 500 Internal Server Error status
+        return jsonify({'error': 'An internal server error occurred.'}), 500
+
+# Route to list the years (and their make_model_year_id) of a make and model
+@catalog_bp.route('/makes/<make>/models/<model>/years', methods=['GET'])
+def get_years(make, model):
+    try:
+        rows = cached_catalog(
+            ('years', make, model),
+            [MakeModelYear.year, MakeModelYear.make_model_year_id],
+            [MakeModelYear.make == make, MakeModelYear.model == model]
+        )
+
+        # An unknown make or model has no years
+        if not rows:
+            return jsonify({'error': 'Make and model combination not found.'}), 404
+
+        # Return the years of the make and model
+        return jsonify(rows), 200
+    except Exception:
+        # Return a generic error message with a 500 Internal Server Error status
+        return jsonify({'error': 'An internal server error occurred.'}), 500
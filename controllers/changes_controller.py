@@ -0,0 +1,102 @@
+# Import standard library modules
+import re
+
+# Import third-party modules
+from flask import Blueprint, jsonify, request
+from sqlalchemy import select
+
+# Import local modules
+from init import db
+from models.car import Car, CarSchema
+from models.change_log import ChangeLog, changes_after
+from models.listing import Listing, ListingSchema
+from models.makemodelyear import MakeModelYear, MakeModelYearSchema
+
+# Create a Blueprint for the incremental change feed
+changes_bp = Blueprint('changes', __name__)
+
+# Default and maximum number of change log entries per page
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# A change token is "<change_id>", or "<xact_id>.<change_id>" on PostgreSQL
+CHANGE_TOKEN_PATTERN = re.compile(r"^(?:(\d+)\.)?(\d+)$")
+
+# Model and flat (non-nested) schema used to serialize each tracked entity
+CHANGE_ENTITIES = {
+    'car': (Car, Car.car_id, CarSchema(exclude=["make_model_year", "listings", "car_transactions"])),
+    'listing': (Listing, Listing.listing_id, ListingSchema(exclude=["user", "car"])),
+    'makemodelyear': (MakeModelYear, MakeModelYear.make_model_year_id, MakeModelYearSchema(exclude=["cars"]))
+}
+
+# Route to get the inserts, updates and deletes made after a change token
+@changes_bp.route('/changes', methods=['GET'])
+def get_changes():
+    try:
+        # Parse the change token and page size
+        since = request.args.get('since', '0')
+        limit = request.args.get('limit', str(DEFAULT_PAGE_SIZE))
+        token = CHANGE_TOKEN_PATTERN.match(since)
+        if not token or not limit.isdigit() or int(limit) < 1:
+            return jsonify({'error': 'since must be a change token and limit a positive integer.'}), 400
+        since_xact, since_change = int(token.group(1) or 0), int(token.group(2))
+        limit = min(int(limit), MAX_PAGE_SIZE)
+
+        # Read one page of the change log in commit order, so nothing can appear behind the returned token
+        statement = changes_after(select(ChangeLog), db.session.connection(), (since_xact, since_change))
+        entries = db.session.scalars(statement.limit(limit + 1)).all()
+        has_more = len(entries) > limit
+        entries = entries[:limit]
+
+        # Keep only the latest change per entity within the page, remembering its position
+        latest = {}
+        for position, entry in enumerate(entries):
+            latest[(entry.entity, entry.entity_id)] = (position, entry)
+
+        # Load the current state of every upserted entity with one query per entity type
+        rows = {}
+        for entity, (model, primary_key, schema) in CHANGE_ENTITIES.items():
+            ids = [
+                entity_id for (name, entity_id), (_, entry) in latest.items()
+                if name == entity and entry.operation == 'upsert'
+            ]
+            if ids:
+                for obj in model.query.filter(primary_key.in_(ids)).all():
+                    rows[(entity, getattr(obj, primary_key.key))] = schema.dump(obj)
+
+        # Build the response in change order
+        changes = []
+        for _, entry in sorted(latest.values(), key=lambda item: item[0]):
+            key = (entry.entity, entry.entity_id)
+            if entry.operation == 'upsert':
+                # A row missing here was deleted later; its tombstone follows in a later page
+                if key not in rows:
+                    continue
+                changes.append({
+                    'change_id': entry.change_id,
+                    'entity': entry.entity,
+                    'id': entry.entity_id,
+                    'operation': 'upsert',
+                    'data': rows[key]
+                })
+            else:
+                changes.append({
+                    'change_id': entry.change_id,
+                    'entity': entry.entity,
+                    'id': entry.entity_id,
+                    'operation': 'delete'
+                })
+
+        # The next token is the last change read, even if it was collapsed away
+        next_token = since
+        if entries:
+            last = entries[-1]
+            next_token = f"{last.xact_id}.{last.change_id}" if last.xact_id is not None else str(last.change_id)
+        return jsonify({
+            'changes': changes,
+            'next_token': next_token,
+            'has_more': has_more
+        }), 200
+    except Exception:
+        # Return a generic error message to the client
+        return jsonify({'error': 'An internal server error occurred.'}), 500
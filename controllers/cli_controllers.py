@@ -1,19 +1,36 @@
 # Import standard library modules
+import csv
+import gzip
 import json
+import os
+import random
+import time
+import uuid
+from datetime import date, datetime, timedelta
 
 # Import third-party modules
 import click
-from flask import Blueprint
+from flask import Blueprint, current_app, url_for
 from flask.cli import with_appcontext
-from sqlalchemy import text
+from flask_jwt_extended import create_access_token
+from marshmallow import ValidationError
+from sqlalchemy import Date, DateTime, delete, func, insert, literal, select, text
 
 # Import local modules
 from init import db, bcrypt  # Database and bcrypt instances
 from models.user import User
-from models.car import Car
+from models.car import Car, CarSchema
 from models.listing import Listing
 from models.car_transaction import CarTransaction
 from models.makemodelyear import MakeModelYear
+from models.change_log import record_changes
+from models.archive import ListingArchive, CarTransactionArchive
+from models.saved_search import SavedSearch
+from utils.query_plans import StatementRecorder, sequential_scans
+from controllers.batch_controller import PATH_REFERENCE_PATTERN, lookup_reference, resolve_references
+from utils.revocation import token_denylist
+from utils.similarity import similar_cars
+from utils.valuation import price_model
 
 # Create a blueprint for CLI commands
 db_commands = Blueprint('db_commands', __name__)
@@ -24,7 +41,8 @@ db_commands = Blueprint('db_commands', __name__)
 def create_tables():
     # Create all database tables defined by the SQLAlchemy models
     try:
-        db.create_all()
+        # Only the primary database is created; read replicas are populated by replication
+        db.create_all(bind_key=None)
         click.echo("All tables created successfully.")
     except Exception:
         click.echo("An error occurred while creating tables.")
@@ -41,7 +59,8 @@ def drop_tables():
         try:
             # Drop all tables with cascade
             db.session.execute(text(
-                'DROP TABLE IF EXISTS users, makemodelyear, cars, listings, car_transactions CASCADE'
+                'DROP TABLE IF EXISTS users, makemodelyear, cars, listings, car_transactions, change_log, revoked_tokens, saved_searches, saved_search_matches, '
+                'listings_archive, car_transactions_archive, audit_log CASCADE'
             ))
             db.session.commit()
             click.echo("All tables dropped successfully.")
@@ -100,3 +119,721 @@ def seed_tables(file_path):
         click.echo("Invalid JSON file format.")
     except Exception:
         click.echo("An error occurred during database seeding.")
+
+# Validate one inventory CSV row, raising ValueError with the reason if it is rejected
+def parse_inventory_row(raw, schema):
+    # csv.DictReader keeps the values of surplus columns in a list under the key None
+    if raw.get(None):
+        raise ValueError(f"row has {len(raw[None])} more field(s) than the header.")
+    make = (raw.get('make') or '').strip()
+    model = (raw.get('model') or '').strip()
+    if not make or not model:
+        raise ValueError("make and model are required.")
+    try:
+        year = int(raw.get('year') or '')
+    except ValueError:
+        raise ValueError("year must be an integer.")
+    listing_status = (raw.get('listing_status') or 'available').strip()
+    if listing_status not in ('available', 'sold'):
+        raise ValueError("listing_status must be 'available' or 'sold'.")
+    try:
+        car = schema.load({
+            key: raw[key] for key in ('mileage', 'price', 'condition', 'description', 'image_url')
+            if raw.get(key)
+        })
+    except ValidationError as ve:
+        raise ValueError(json.dumps(ve.messages))
+    return {'key': (make, model, year), 'car': car, 'listing_status': listing_status}
+
+# Insert one batch of validated inventory rows with set-based statements
+def insert_inventory_batch(batch, lookup, seller_id):
+    connection = db.session.connection()
+    now = datetime.utcnow()
+
+    # Create any make/model/year combinations this batch introduced
+    new_keys = sorted({row['key'] for row in batch if row['key'] not in lookup})
+    if new_keys:
+        mmy_table = MakeModelYear.__table__
+        new_ids = connection.execute(
+            insert(mmy_table).returning(mmy_table.c.make_model_year_id, sort_by_parameter_order=True),
+            [
+                {'make': make, 'model': model, 'year': year, 'updated_at': now, 'row_version': 1}
+                for make, model, year in new_keys
+            ]
+        ).scalars().all()
+        lookup.update(zip(new_keys, new_ids))
+        record_changes(connection, 'makemodelyear', new_ids, 'upsert')
+
+    # Insert the cars, then one listing per car
+    cars_table = Car.__table__
+    car_ids = connection.execute(
+        insert(cars_table).returning(cars_table.c.car_id, sort_by_parameter_order=True),
+        [
+            {
+                **row['car'],
+                'make_model_year_id': lookup[row['key']],
+                'updated_at': now,
+                'row_version': 1
+            }
+            for row in batch
+        ]
+    ).scalars().all()
+    listings_table = Listing.__table__
+    listing_ids = connection.execute(
+        insert(listings_table).returning(listings_table.c.listing_id, sort_by_parameter_order=True),
+        [
+            {
+                'car_id': car_id,
+                'user_id': seller_id,
+                'listing_status': row['listing_status'],
+                'date_posted': now,
+                'updated_at': now,
+                'row_version': 1
+            }
+            for car_id, row in zip(car_ids, batch)
+        ]
+    ).scalars().all()
+    record_changes(connection, 'car', car_ids, 'upsert')
+    record_changes(connection, 'listing', listing_ids, 'upsert')
+    db.session.commit()
+
+# Command to stream a dealer inventory CSV into the Cars and Listings tables
+@db_commands.cli.command("import_inventory")
+@click.argument('file_path')
+@click.option('--seller-email', required=True, help='Email of the user the listings belong to.')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows inserted per statement batch.')
+@click.option('--rejects', 'rejects_path', default=None, help='CSV file for rejected rows (default: <file>.rejects.csv).')
+@with_appcontext
+def import_inventory(file_path, seller_email, batch_size, rejects_path):
+    # Expected columns: make, model, year, mileage, price, condition,
+    # and optionally description, image_url and listing_status
+    try:
+        seller = User.query.filter_by(email=seller_email).first()
+        if not seller:
+            click.echo(f"No user found with email '{seller_email}'.")
+            return
+
+        # Load every make/model/year once into an in-memory lookup table
+        lookup = {
+            (make, model, year): make_model_year_id
+            for make_model_year_id, make, model, year in db.session.execute(select(
+                MakeModelYear.make_model_year_id, MakeModelYear.make,
+                MakeModelYear.model, MakeModelYear.year
+            ))
+        }
+
+        # Validate car fields only; the make_model_year_id is resolved from the lookup
+        schema = CarSchema(partial=('make_model_year_id',))
+        rejects_path = rejects_path or f"{file_path}.rejects.csv"
+        imported = rejected = 0
+        started = time.monotonic()
+
+        with open(file_path, newline='') as file, open(rejects_path, 'w', newline='') as rejects_file:
+            reader = csv.DictReader(file)
+            fieldnames = reader.fieldnames or []
+            rejects = csv.DictWriter(rejects_file, fieldnames=fieldnames + ['error'])
+            rejects.writeheader()
+
+            batch = []
+            for raw in reader:
+                try:
+                    batch.append(parse_inventory_row(raw, schema))
+                except ValueError as err:
+                    # Write the rejected row's header columns, with the reason, to the side file
+                    rejects.writerow({**{key: raw.get(key) for key in fieldnames}, 'error': str(err)})
+                    rejected += 1
+                    continue
+
+                if len(batch) >= batch_size:
+                    insert_inventory_batch(batch, lookup, seller.user_id)
+                    imported += len(batch)
+                    batch = []
+                    elapsed = time.monotonic() - started
+                    click.echo(f"{imported} rows imported ({imported / elapsed:.0f} rows/s).")
+
+            if batch:
+                insert_inventory_batch(batch, lookup, seller.user_id)
+                imported += len(batch)
+
+        elapsed = time.monotonic() - started
+        click.echo(
+            f"Imported {imported} rows and rejected {rejected} in {elapsed:.1f}s "
+            f"({imported / elapsed if elapsed else 0:.0f} rows/s)."
+        )
+        if rejected:
+            click.echo(f"Rejected rows were written to '{rejects_path}'.")
+    except FileNotFoundError:
+        click.echo(f"File '{file_path}' not found.")
+    except Exception:
+        db.session.rollback()
+        click.echo("An error occurred during the inventory import.")
+
+# Identifies snapshot files written by dump_tables
+SNAPSHOT_FORMAT = "car-marketplace-snapshot"
+
+# Convert a column value into something JSON can store
+def snapshot_value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+# Command to stream every table into a compressed, chunked snapshot file
+@db_commands.cli.command("dump_tables")
+@click.argument('file_path')
+@click.option('--chunk-size', default=5000, show_default=True, help='Rows per chunk in the snapshot.')
+@with_appcontext
+def dump_tables(file_path, chunk_size):
+    # Each line of the gzip file is a JSON document: a header, then for each table
+    # (in foreign-key dependency order) its columns followed by chunks of rows.
+    # Stored values are written as-is, so passwords stay as bcrypt hashes.
+    try:
+        started = time.monotonic()
+        tables = db.metadata.sorted_tables
+        with db.engine.connect() as connection, gzip.open(file_path, 'wt', encoding='utf-8', compresslevel=6) as file:
+            # Read every table from one snapshot, so rows written during the dump cannot break foreign keys
+            if connection.dialect.name == 'postgresql':
+                # READ COMMITTED takes a new snapshot per statement; a deferrable read-only serializable
+                # transaction waits for a safe snapshot, then never blocks writers or fails
+                connection.execution_options(
+                    isolation_level='SERIALIZABLE', postgresql_readonly=True, postgresql_deferrable=True
+                )
+            elif connection.dialect.name == 'sqlite':
+                connection.execution_options(isolation_level='AUTOCOMMIT')
+            transaction = connection.begin()
+            if connection.dialect.name == 'sqlite':
+                # pysqlite opens no transaction for SELECTs, so begin the read transaction explicitly
+                connection.exec_driver_sql("BEGIN")
+            file.write(json.dumps({
+                'format': SNAPSHOT_FORMAT,
+                'version': 1,
+                'tables': [table.name for table in tables]
+            }) + "\n")
+
+            for table in tables:
+                columns = [column.name for column in table.columns]
+                file.write(json.dumps({'table': table.name, 'columns': columns}) + "\n")
+
+                # Stream rows with a server-side cursor instead of loading the table
+                count = 0
+                result = connection.execution_options(
+                    stream_results=True, yield_per=chunk_size
+                ).execute(select(table).order_by(*table.primary_key.columns))
+                for partition in result.partitions():
+                    file.write(json.dumps({
+                        'table': table.name,
+                        'rows': [[snapshot_value(value) for value in row] for row in partition]
+                    }) + "\n")
+                    count += len(partition)
+                click.echo(f"Dumped {count} rows from '{table.name}'.")
+            if connection.dialect.name == 'sqlite':
+                connection.exec_driver_sql("COMMIT")
+            transaction.commit()
+
+        click.echo(f"Snapshot written to '{file_path}' in {time.monotonic() - started:.1f}s.")
+    except Exception:
+        click.echo("An error occurred while dumping tables.")
+
+# Command to restore a snapshot written by dump_tables into empty tables
+@db_commands.cli.command("restore_tables")
+@click.argument('file_path')
+@with_appcontext
+def restore_tables(file_path):
+    try:
+        started = time.monotonic()
+        tables_by_name = {table.name: table for table in db.metadata.sorted_tables}
+        connection = db.session.connection()
+
+        with gzip.open(file_path, 'rt', encoding='utf-8') as file:
+            header = json.loads(file.readline())
+            if header.get('format') != SNAPSHOT_FORMAT:
+                click.echo("The file is not a snapshot created by dump_tables.")
+                return
+
+            # Refuse to restore over existing data
+            for name in header['tables']:
+                table = tables_by_name.get(name)
+                if table is None:
+                    click.echo(f"The snapshot contains unknown table '{name}'.")
+                    return
+                if connection.execute(select(func.count()).select_from(table)).scalar():
+                    click.echo(f"Table '{name}' is not empty. Drop and recreate the tables first.")
+                    return
+
+            columns = {}
+            counts = {}
+            for line in file:
+                entry = json.loads(line)
+                table = tables_by_name[entry['table']]
+                if 'columns' in entry:
+                    columns[table.name] = entry['columns']
+                    counts[table.name] = 0
+                    continue
+
+                # Parse date and datetime columns back from ISO strings
+                names = columns[table.name]
+                parsers = [
+                    datetime.fromisoformat if isinstance(table.c[name].type, DateTime)
+                    else date.fromisoformat if isinstance(table.c[name].type, Date)
+                    else None
+                    for name in names
+                ]
+                rows = [
+                    {
+                        name: parser(value) if parser and value is not None else value
+                        for name, parser, value in zip(names, parsers, row)
+                    }
+                    for row in entry['rows']
+                ]
+                # One multi-row INSERT per chunk
+                connection.execute(table.insert(), rows)
+                counts[table.name] += len(rows)
+
+        # Move each serial sequence past the restored ids (PostgreSQL only)
+        if connection.dialect.name == 'postgresql':
+            for table in tables_by_name.values():
+                for column in table.primary_key.columns:
+                    if column.autoincrement and isinstance(column.type, db.Integer):
+                        connection.execute(text(
+                            f"SELECT setval(pg_get_serial_sequence('{table.name}', '{column.name}'), "
+                            f"COALESCE(MAX({column.name}), 1), MAX({column.name}) IS NOT NULL) "
+                            f"FROM {table.name}"
+                        ))
+
+        db.session.commit()
+        for name, count in counts.items():
+            click.echo(f"Restored {count} rows into '{name}'.")
+        click.echo(f"Snapshot restored in {time.monotonic() - started:.1f}s.")
+    except FileNotFoundError:
+        click.echo(f"File '{file_path}' not found.")
+    except Exception:
+        db.session.rollback()
+        click.echo("An error occurred while restoring tables.")
+
+# Move rows matching a condition from a hot table into its archive table, one short transaction per batch
+def archive_in_batches(model, archive_model, condition, batch_size, pause):
+    table = model.__table__
+    primary_key = table.primary_key.columns[0]
+    columns = [column.name for column in table.columns]
+    archived = 0
+    while True:
+        # Lock only this batch; rows held by live requests are skipped and picked up by a later run
+        ids = db.session.scalars(
+            select(primary_key)
+            .where(condition)
+            .order_by(primary_key)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        ).all()
+        if not ids:
+            return archived
+
+        # Copy the batch into the archive and remove it from the hot table in the same transaction
+        connection = db.session.connection()
+        connection.execute(insert(archive_model.__table__).from_select(
+            columns + ['archived_at'],
+            select(*[table.c[name] for name in columns], literal(datetime.utcnow())).where(primary_key.in_(ids))
+        ))
+        connection.execute(delete(table).where(primary_key.in_(ids)))
+        # Archived rows leave the hot table, so change feed clients must see them as deleted
+        entity = getattr(model, '__change_entity__', None)
+        if entity is not None:
+            record_changes(connection, entity, ids, 'delete')
+        db.session.commit()
+
+        archived += len(ids)
+        click.echo(f"{archived} rows moved from '{table.name}' to '{archive_model.__tablename__}'.")
+        if pause:
+            # Give replication and concurrent writers room between batches
+            time.sleep(pause)
+
+# Command to move sold listings and old transactions into the archive tables
+@db_commands.cli.command("archive_records")
+@click.option('--listing-age-days', default=int(os.environ.get("ARCHIVE_LISTING_AGE_DAYS", 90)), show_default=True,
+              help='Archive sold listings last updated more than this many days ago.')
+@click.option('--transaction-age-days', default=int(os.environ.get("ARCHIVE_TRANSACTION_AGE_DAYS", 365)), show_default=True,
+              help='Archive transactions dated more than this many days ago.')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows moved per transaction.')
+@click.option('--pause', default=0.1, show_default=True, help='Seconds to sleep between batches.')
+@with_appcontext
+def archive_records(listing_age_days, transaction_age_days, batch_size, pause):
+    # Safe to run repeatedly (e.g. nightly from cron): each run only moves what has aged since the last
+    try:
+        started = time.monotonic()
+        listings = archive_in_batches(
+            Listing, ListingArchive,
+            (Listing.listing_status == 'sold')
+            & (Listing.updated_at < datetime.utcnow() - timedelta(days=listing_age_days)),
+            batch_size, pause
+        )
+        transactions = archive_in_batches(
+            CarTransaction, CarTransactionArchive,
+            CarTransaction.transaction_date < date.today() - timedelta(days=transaction_age_days),
+            batch_size, pause
+        )
+        click.echo(
+            f"Archived {listings} listings and {transactions} transactions "
+            f"in {time.monotonic() - started:.1f}s."
+        )
+    except Exception:
+        db.session.rollback()
+        click.echo("An error occurred while archiving records.")
+
+# Shape of the synthetic dataset seeded by check_query_plans --scale
+SCALED_USERS = 100
+SCALED_MAKES = 20
+SCALED_MODELS_PER_MAKE = 10
+SCALED_YEARS = range(2005, 2025)
+
+# Insert rows in batches with one multi-row INSERT each, returning the new primary keys in order
+def insert_rows(model, rows, batch_size=5000):
+    table = model.__table__
+    primary_key = table.primary_key.columns[0]
+    connection = db.session.connection()
+    ids = []
+    for start in range(0, len(rows), batch_size):
+        ids += connection.execute(
+            insert(table).returning(primary_key, sort_by_parameter_order=True),
+            rows[start:start + batch_size]
+        ).scalars().all()
+    return ids
+
+# Seed a reproducible synthetic dataset with `scale` cars, one listing each, and a sale for every sold listing
+def seed_scaled_dataset(scale):
+    rng = random.Random(0)
+    now = datetime.utcnow()
+    today = date.today()
+
+    # Every synthetic user shares one password hash; the first user is an admin
+    password = bcrypt.generate_password_hash('password').decode('utf-8')
+    user_ids = insert_rows(User, [
+        {'name': f'User {index}', 'email': f'user{index}@example.com', 'password': password,
+         'is_admin': index == 0, 'row_version': 1}
+        for index in range(SCALED_USERS)
+    ])
+    makemodelyears = [
+        (f'Make {make}', f'Model {make}-{model}', year)
+        for make in range(SCALED_MAKES) for model in range(SCALED_MODELS_PER_MAKE) for year in SCALED_YEARS
+    ]
+    make_model_year_ids = insert_rows(MakeModelYear, [
+        {'make': make, 'model': model, 'year': year, 'updated_at': now, 'row_version': 1}
+        for make, model, year in makemodelyears
+    ])
+
+    cars = [
+        {
+            'mileage': rng.randint(0, 250000),
+            'price': round(rng.uniform(2000, 80000), 2),
+            'condition': rng.choice(('new', 'used', 'certified')),
+            'make_model_year_id': rng.choice(make_model_year_ids),
+            'updated_at': now,
+            'row_version': 1
+        }
+        for _ in range(scale)
+    ]
+    car_ids = insert_rows(Car, cars)
+    listings = [
+        {
+            'car_id': car_id,
+            'user_id': rng.choice(user_ids),
+            'listing_status': 'available' if rng.random() < 0.7 else 'sold',
+            'date_posted': now - timedelta(days=rng.randint(0, 730)),
+            'updated_at': now,
+            'row_version': 1
+        }
+        for car_id in car_ids
+    ]
+    listing_ids = insert_rows(Listing, listings)
+    insert_rows(CarTransaction, [
+        {
+            'car_id': listing['car_id'],
+            'buyer_id': rng.choice(user_ids),
+            'amount': round(car['price'] * rng.uniform(0.85, 1.0), 2),
+            'transaction_date': today - timedelta(days=rng.randint(0, 730))
+        }
+        for car, listing in zip(cars, listings) if listing['listing_status'] == 'sold'
+    ])
+    insert_rows(SavedSearch, [
+        {
+            'user_id': rng.choice(user_ids),
+            'make': makemodelyears[index % len(makemodelyears)][0],
+            'price_max': rng.choice((10000, 20000, 40000)),
+            'created_at': now
+        }
+        for index in range(max(scale // 20, 1))
+    ])
+    record_changes(db.session.connection(), 'car', car_ids, 'upsert')
+    record_changes(db.session.connection(), 'listing', listing_ids, 'upsert')
+    db.session.commit()
+
+# Endpoints the query-plan check never calls (the listing stream never ends)
+QUERY_PLAN_SKIPPED_ENDPOINTS = {'static', 'listings.stream_listings'}
+# Sample row used for the <id> of each blueprint's routes
+QUERY_PLAN_SAMPLE_IDS = {
+    'cars': 'car_id',
+    'listings': 'listing_id',
+    'car_transactions': 'transaction_id',
+    'makemodelyear': 'make_model_year_id',
+    'saved_searches': 'saved_search_id',
+}
+# Query strings each endpoint is called with; endpoints not listed are called once without one
+QUERY_PLAN_VARIANTS = {
+    'cars.get_cars': ['', 'ids={car_id}', 'make={make}&model={model}', 'price_min=5000&price_max=8000&condition=used'],
+    'cars.get_car_facets': ['', 'make={make}'],
+    'cars.get_similar_cars_batch': ['ids={car_id}'],
+    'listings.get_listings': ['', 'ids={listing_id}'],
+    'makemodelyear.get_makemodelyears': ['', 'ids={make_model_year_id}'],
+    'auth.get_my_listings': ['', 'status=available'],
+    'auth.get_my_transactions': ['', 'from={date}&to={date}'],
+    'car_transactions.export_car_transactions': ['', 'from={date}&to={date}'],
+    'valuations.get_valuation': ['make_model_year_id={make_model_year_id}&mileage=50000&condition=used'],
+}
+
+# Pick existing rows whose ids and attributes fill in route arguments and query strings
+def query_plan_samples(admin):
+    listing = db.session.execute(
+        select(Listing.listing_id, Listing.car_id)
+        .where(Listing.listing_status == 'available')
+        .order_by(Listing.listing_id)
+        .limit(1)
+    ).first()
+    car = db.session.get(Car, listing.car_id) if listing else None
+    transaction = db.session.execute(
+        select(CarTransaction.transaction_id, CarTransaction.transaction_date)
+        .order_by(CarTransaction.transaction_id)
+        .limit(1)
+    ).first()
+    # A make/model/year with a sold car, so every relation its routes load has rows
+    make_model_year_id = db.session.scalar(
+        select(Car.make_model_year_id)
+        .join(CarTransaction, CarTransaction.car_id == Car.car_id)
+        .order_by(CarTransaction.transaction_id)
+        .limit(1)
+    )
+    saved_search_id = db.session.scalar(
+        select(SavedSearch.saved_search_id).where(SavedSearch.user_id == admin.user_id).limit(1)
+    ) or db.session.scalar(select(func.min(SavedSearch.saved_search_id)))
+    return {
+        'car_id': car.car_id if car else 0,
+        'price': car.price if car else 0,
+        'listing_id': listing.listing_id if listing else 0,
+        'transaction_id': transaction.transaction_id if transaction else 0,
+        'date': (transaction.transaction_date if transaction else date.today()).isoformat(),
+        'make_model_year_id': make_model_year_id or (car.make_model_year_id if car else 0),
+        'make': car.make_model_year.make if car else 'none',
+        'model': car.make_model_year.model if car else 'none',
+        'saved_search_id': saved_search_id or 0,
+    }
+
+# Return (endpoint, method, path, JSON body) for one call of every write endpoint, in the order they run.
+# They create their own rows and then update and delete them; "$<index>.<field>" in a path or body
+# refers to a field of an earlier write's response, as in a batch request.
+# Two bulk-created cars and a sale of the sample car stay behind, so run the check on a scratch database
+def query_plan_writes(samples, run):
+    email = f'query-plan-{run}@example.com'
+    car = {'mileage': 10000, 'price': 15000.0, 'condition': 'used'}
+    return [
+        ('makemodelyear.create_makemodelyear', 'POST', '/api/makemodelyear',
+         {'make': f'Query Plan {run}', 'model': 'Check', 'year': 2024}),
+        ('makemodelyear.update_makemodelyear', 'PUT', '/api/makemodelyear/$0.make_model_year_id',
+         {'model': 'Checked'}),
+        ('cars.create_car', 'POST', '/api/cars', {**car, 'make_model_year_id': '$0.make_model_year_id'}),
+        ('cars.update_car', 'PUT', '/api/cars/$2.car_id', {'price': 14500.0}),
+        ('cars.bulk_create_cars', 'POST', '/api/cars/bulk',
+         [{**car, 'make_model_year_id': samples['make_model_year_id']}] * 2),
+        ('cars.bulk_update_cars', 'PATCH', '/api/cars/bulk', [{'car_id': '$2.car_id', 'mileage': 12000}]),
+        ('listings.create_listing', 'POST', '/api/listings', {'car_id': '$2.car_id'}),
+        ('listings.update_listing', 'PUT', '/api/listings/$6.listing_id', {'listing_status': 'sold'}),
+        ('listings.delete_listing', 'DELETE', '/api/listings/$6.listing_id', None),
+        ('car_transactions.create_car_transaction', 'POST', '/api/car-transactions',
+         {'car_id': samples['car_id'], 'amount': samples['price']}),
+        ('cars.delete_car', 'DELETE', '/api/cars/$2.car_id', None),
+        ('makemodelyear.delete_makemodelyear', 'DELETE', '/api/makemodelyear/$0.make_model_year_id', None),
+        ('saved_searches.create_saved_search', 'POST', '/api/saved-searches', {'make': samples['make']}),
+        ('saved_searches.delete_saved_search', 'DELETE', '/api/saved-searches/$12.saved_search_id', None),
+        ('auth.register_user', 'POST', '/api/register',
+         {'name': 'Query Plan', 'email': email, 'password': 'password'}),
+        ('auth.login_user', 'POST', '/api/login', {'email': email, 'password': 'password'}),
+        ('auth.update_user', 'PUT', '/api/users/$14.user_id', {'name': 'Query Plan Checked'}),
+        ('auth.delete_user', 'DELETE', '/api/users/$14.user_id', None),
+        ('batch.run_batch', 'POST', '/api/batch', {'requests': [
+            {'method': 'GET', 'path': f"/api/cars/{samples['car_id']}"},
+            {'method': 'GET', 'path': f"/api/listings/{samples['listing_id']}"}
+        ]}),
+        # Revokes the check's own token, so it runs last
+        ('auth.logout_user', 'POST', '/api/logout', None),
+    ]
+
+# Return (budget key, method, path, JSON body) for every GET endpoint of the API and each of its
+# query-string variants, followed by the write requests, and the write endpoints that have none
+def query_plan_requests(samples, run):
+    rules = sorted(current_app.url_map.iter_rules(), key=lambda rule: rule.endpoint)
+    requests = []
+    writes = query_plan_writes(samples, run)
+    written = {endpoint for endpoint, _, _, _ in writes}
+    uncovered = []
+    with current_app.test_request_context():
+        for rule in rules:
+            if rule.endpoint in QUERY_PLAN_SKIPPED_ENDPOINTS:
+                continue
+            if 'GET' not in rule.methods:
+                if rule.endpoint not in written:
+                    uncovered.append(rule.endpoint)
+                continue
+            blueprint = rule.endpoint.split('.')[0]
+            arguments = {
+                name: samples[QUERY_PLAN_SAMPLE_IDS[blueprint]] if name == 'id' else samples[name]
+                for name in rule.arguments
+            }
+            path = url_for(rule.endpoint, **arguments)
+            for variant in QUERY_PLAN_VARIANTS.get(rule.endpoint, ['']):
+                key = f"{rule.endpoint}?{variant}" if variant else rule.endpoint
+                requests.append((key, 'GET', f"{path}?{variant.format(**samples)}" if variant else path, None))
+    # Writes run after every read, since they change the sample rows
+    return requests + writes, uncovered
+
+# Command to check every endpoint's query count and query plans against committed budgets
+@db_commands.cli.command("check_query_plans")
+@click.option('--budgets', 'budgets_path', default='query_plan_budgets.json', show_default=True,
+              help='JSON file with the committed query budgets and allowed sequential scans.')
+@click.option('--scale', default=0, show_default=True,
+              help='First seed this many synthetic cars (with listings and sales) into empty tables.')
+@click.option('--min-rows', default=1000, show_default=True,
+              help='Tables with at least this many rows count as large.')
+@click.option('--update', is_flag=True,
+              help='Raise the budgets to cover the current query counts and scans.')
+@with_appcontext
+def check_query_plans(budgets_path, scale, min_rows, update):
+    started = time.monotonic()
+    if scale:
+        if db.session.scalar(select(func.count()).select_from(Car)):
+            click.echo("--scale needs empty tables. Run it against a scratch database after create_tables.")
+            raise SystemExit(1)
+        seed_scaled_dataset(scale)
+        click.echo(f"Seeded {scale} cars in {time.monotonic() - started:.1f}s.")
+    # Refresh planner statistics so plans reflect the data as it is now
+    db.session.execute(text("ANALYZE"))
+    db.session.commit()
+
+    dialect = db.engine.dialect.name
+    large_tables = {
+        table.name for table in db.metadata.sorted_tables
+        if db.session.scalar(select(func.count()).select_from(table)) >= min_rows
+    }
+    admin = User.query.filter_by(is_admin=True).order_by(User.user_id).first()
+    if admin is None:
+        click.echo("An admin user is needed to call the authenticated endpoints.")
+        raise SystemExit(1)
+    headers = {'Authorization': f"Bearer {create_access_token(identity=str(admin.user_id))}"}
+    samples = query_plan_samples(admin)
+    db.session.remove()
+
+    # Load periodically refreshed state now and freeze it, so its queries are not charged to an endpoint
+    for cache in (token_denylist, similar_cars, price_model):
+        if getattr(cache, 'available', True):
+            cache.refresh()
+        cache.refresh_seconds = float('inf')
+
+    # Budgets hold {"requests": {key: budget}}. Endpoints load their relations eagerly, so a request's query
+    # count does not grow with the data, and a budget recorded at one scale holds at any other
+    try:
+        with open(budgets_path) as file:
+            recorded = json.load(file)
+    except FileNotFoundError:
+        recorded = {}
+    budgets = recorded.get('requests', {})
+
+    client = current_app.test_client()
+    engines = list(db.engines.values())
+    failures = 0
+    requests, uncovered = query_plan_requests(samples, uuid.uuid4().hex[:8])
+    for endpoint in uncovered:
+        failures += 1
+        click.echo(f"FAIL {endpoint}: no sample request in query_plan_writes")
+    # Responses of the write requests, for their "$<index>.<field>" references
+    written = []
+    for key, method, path, body in requests:
+        if method != 'GET':
+            try:
+                path = PATH_REFERENCE_PATTERN.sub(
+                    lambda match: str(lookup_reference(int(match.group(1)), match.group(2), written)), path
+                )
+                body = resolve_references(body, written)
+            except ValueError as err:
+                # An earlier write failed, so this one has nothing to act on
+                failures += 1
+                written.append({'status': None, 'body': None})
+                click.echo(f"FAIL {key}: {err}")
+                continue
+
+        request_started = time.monotonic()
+        with StatementRecorder(engines) as recorder:
+            # Read the whole body so streamed responses run all of their queries
+            response = client.open(path, method=method, json=body, headers=headers)
+            response.get_data()
+            response.close()
+        elapsed_ms = (time.monotonic() - request_started) * 1000
+        # Requests share the command's app context, so drop the session to start the next one cold
+        db.session.remove()
+        if method != 'GET':
+            written.append({'status': response.status_code, 'body': response.get_json(silent=True)})
+        # A rejected write skips the statements it is budgeted for
+        failed_status = response.status_code >= (500 if method == 'GET' else 400)
+
+        # Explain every captured statement and keep the sequential scans of large tables
+        scans = {}
+        for engine, statement, parameters in recorder.statements:
+            with engine.connect() as connection:
+                for table in sequential_scans(connection, statement, parameters) & large_tables:
+                    scans.setdefault(table, statement)
+        count = len(recorder.statements)
+
+        if update and failed_status:
+            failures += 1
+            click.echo(f"FAIL {key}: returned {response.status_code}; budget not recorded")
+            continue
+        if update:
+            # Budgets only grow, so recording at two scales covers the plans the planner picks at either
+            budget = budgets.get(key, {})
+            allowed = budget.get('allow_scans', {})
+            budgets[key] = {
+                'max_queries': max(count, budget.get('max_queries', 0)),
+                'allow_scans': {**allowed, dialect: sorted(set(scans) | set(allowed.get(dialect, [])))}
+            }
+            click.echo(f"{key}: {count} queries in {elapsed_ms:.0f} ms, scans {sorted(scans) or 'none'}")
+            continue
+
+        problems = []
+        budget = budgets.get(key)
+        if failed_status:
+            problems.append(f"returned {response.status_code}")
+        if budget is None:
+            problems.append("no budget recorded (run with --update)")
+        else:
+            if count > budget['max_queries']:
+                problems.append(f"{count} queries, budget is {budget['max_queries']}")
+            allowed = budget.get('allow_scans', {})
+            # Plans differ between databases, so one recorded on another database says nothing about this one
+            if dialect not in allowed:
+                problems.append(f"no allow_scans recorded for {dialect} (run with --update on {dialect})")
+            else:
+                for table in sorted(set(scans) - set(allowed[dialect])):
+                    problems.append(f"sequential scan on '{table}': {' '.join(scans[table].split())[:300]}")
+        if problems:
+            failures += 1
+            click.echo(f"FAIL {key} ({count} queries in {elapsed_ms:.0f} ms)")
+            for problem in problems:
+                click.echo(f"  - {problem}")
+        else:
+            click.echo(f"ok   {key} ({count} queries in {elapsed_ms:.0f} ms)")
+
+    if update:
+        with open(budgets_path, 'w') as file:
+            json.dump({'requests': budgets}, file, indent=2, sort_keys=True)
+            file.write("\n")
+        click.echo(f"Budgets for {len(budgets)} requests written to '{budgets_path}'.")
+        if failures:
+            raise SystemExit(1)
+        return
+    click.echo(f"Checked query plans on {dialect} in {time.monotonic() - started:.1f}s; {failures} request(s) failed.")
+    if failures:
+        raise SystemExit(1)
@@ -1,42 +1,114 @@
 # Import standard library modules
+import os  # For environment configuration
 from datetime import datetime  # For timestamping
 
 # Import third-party modules
-from flask import Blueprint, jsonify, request  # Flask functions
+from flask import Blueprint, Response, g, jsonify, request, stream_with_context  # Flask functions
 from flask_jwt_extended import jwt_required, get_jwt_identity  # JWT authentication
 from marshmallow import ValidationError  # For input validation errors
+from sqlalchemy.orm import joinedload, selectinload  # Eager loading options
+from sqlalchemy.orm.exc import StaleDataError  # Raised when a versioned row changed concurrently
 
 # Import local modules
 from init import db  # Database instance
 from models.listing import Listing, ListingSchema  # Listing model and schema
 from models.user import User  # User model
 from models.car import Car  # Car model
+from models.car_transaction import CarTransaction  # CarTransaction model
+from models.archive import ListingArchive  # Archived listings
+from utils.admission import admission_class  # Admission route classes
+from utils.events import listing_events, stream_events  # Listing event broker
+from utils.params import order_by_ids, parse_id_list  # Batch id helpers
+from utils.preconditions import check_if_match, etag_header, precondition_failed  # If-Match handling
+
+# Seconds between heartbeat comments on idle listing streams
+SSE_HEARTBEAT_SECONDS = int(os.environ.get("SSE_HEARTBEAT_SECONDS", 15))
 
 # Create a Blueprint for listing routes
 listings_bp = Blueprint('listings', __name__)
 
+# Relations ListingSchema serializes, loaded up front so batch lookups avoid N+1 queries
+LISTING_EAGER_LOADS = (
+    joinedload(Listing.user).selectinload(User.car_transactions),
+    joinedload(Listing.car).joinedload(Car.make_model_year),
+    selectinload(Listing.car, Car.listings).selectinload(Listing.user),
+    selectinload(Listing.car, Car.car_transactions).selectinload(CarTransaction.user)
+)
+# The same relations for the full list, loading each per-car collection in one query (see CAR_LIST_EAGER_LOADS)
+LISTING_LIST_EAGER_LOADS = (
+    joinedload(Listing.user).selectinload(User.car_transactions),
+    joinedload(Listing.car).joinedload(Car.make_model_year),
+    joinedload(Listing.car).joinedload(Car.listings).joinedload(Listing.user),
+    joinedload(Listing.car).joinedload(Car.car_transactions).joinedload(CarTransaction.user)
+)
+
+# Publish a listing event to stream subscribers (call only after a successful commit)
+def publish_listing_event(event, listing):
+    data = {
+        'listing_id': listing.listing_id,
+        'car_id': listing.car_id,
+        'user_id': listing.user_id,
+        'listing_status': listing.listing_status
+    }
+    # Inside a transactional batch, events wait until the whole batch commits
+    deferred = g.get('deferred_listing_events')
+    if deferred is not None:
+        deferred.append((event, data))
+    else:
+        listing_events.publish(event, data)
+
 # Route to get all listings
 @listings_bp.route('/listings', methods=['GET'])
 def get_listings():
     try:
+        # Batch lookup by id list (e.g. ?ids=3,1,2) in a single IN query
+        if 'ids' in request.args:
+            ids = parse_id_list(request.args['ids'])
+            listings = (
+                Listing.query
+                .filter(Listing.listing_id.in_(ids))
+                .options(*LISTING_EAGER_LOADS)
+                .all()
+            )
+            found, missing = order_by_ids(listings, ids, 'listing_id')
+            return jsonify({'items': ListingSchema(many=True).dump(found), 'missing': missing}), 200
+
         # Retrieve all listings from the database
-        listings = Listing.query.all()
+        listings = Listing.query.options(*LISTING_LIST_EAGER_LOADS).all()
 
         # Serialize the listings using the ListingSchema
         data = ListingSchema(many=True).dump(listings)
 
         # Return the serialized data as JSON
         return jsonify(data), 200
+    except ValidationError as ve:
+        # Return validation errors to the client
+        return jsonify({'errors': ve.messages}), 400
     except Exception:
         # Return a generic error message to the client
         return jsonify({'error': 'An internal server error occurred.'}), 500
 
+# Route to stream new listings and listing status changes as Server-Sent Events
+@listings_bp.route('/listings/stream', methods=['GET'])
+@admission_class("streams")
+def stream_listings():
+    # Resume after the last event the client saw, if it tells us; an unknown id gets a reset event
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+
+    # Stream events until the client disconnects
+    events = stream_events(listing_events, last_event_id, SSE_HEARTBEAT_SECONDS)
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 # Route to get a specific listing by ID
 @listings_bp.route('/listings/<int:id>', methods=['GET'])
 def get_listing(id):
     try:
-        # Retrieve the listing by ID
-        listing = Listing.query.get(id)
+        # Retrieve the listing by ID, falling back to the archive for old sold listings
+        listing = Listing.query.get(id) or ListingArchive.query.get(id)
 
         # Check if the listing exists
         if not listing:
@@ -45,8 +117,8 @@ def get_listing(id):
         # Serialize the listing using the ListingSchema
         data = ListingSchema().dump(listing)
 
-        # Return the serialized data as JSON
-        return jsonify(data), 200
+        # Return the serialized data as JSON, with its version as the ETag
+        return jsonify(data), 200, etag_header(listing)
     except Exception:
         # Return a generic error message to the client
         return jsonify({'error': 'An internal server error occurred.'}), 500
@@ -88,6 +160,9 @@ def create_listing():
         db.session.add(new_listing)
         db.session.commit()
 
+        # Notify stream subscribers of the new listing
+        publish_listing_event('listing_created', new_listing)
+
         # Return the new listing as JSON
         return ListingSchema().dump(new_listing), 201
     except ValidationError as ve:
@@ -121,10 +196,16 @@ def update_listing(id):
         if listing.user_id != current_user_id and not current_user.is_admin:
             return jsonify({'error': 'You do not have permission to update this listing.'}), 403
 
+        # Reject the write if the client edited an older version (If-Match)
+        failed = check_if_match(listing)
+        if failed:
+            return failed
+
         # Load input data
         data = request.get_json()
 
         # Only allow updating the 'listing_status' field
+        previous_status = listing.listing_status
         if 'listing_status' in data:
             # Validate the new status
             if data['listing_status'] not in ['available', 'sold']:
@@ -134,8 +215,16 @@ def update_listing(id):
         # Commit changes to the database
         db.session.commit()
 
-        # Return the updated listing as JSON
-        return ListingSchema().dump(listing), 200
+        # Notify stream subscribers if the status changed
+        if listing.listing_status != previous_status:
+            publish_listing_event('listing_status', listing)
+
+        # Return the updated listing as JSON, with its new version as the ETag
+        return ListingSchema().dump(listing), 200, etag_header(listing)
+    except StaleDataError:
+        # Another request updated the listing between loading and committing
+        db.session.rollback()
+        return precondition_failed()
     except Exception:
         # Return a generic error message to the client
         return jsonify({'error': 'An internal server error occurred.'}), 500
@@ -168,6 +257,9 @@ def delete_listing(id):
         db.session.delete(listing)
         db.session.commit()
 
+        # Notify stream subscribers that the listing is gone
+        publish_listing_event('listing_deleted', listing)
+
         # Return a success message
         return jsonify({'message': 'Listing deleted successfully.'}), 200
     except Exception:
@@ -1,26 +1,65 @@
 # Import necessary modules and functions
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from marshmallow import ValidationError
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.orm.exc import StaleDataError
 
 from init import db
+from models.car import Car
+from models.car_transaction import CarTransaction
+from models.listing import Listing
 from models.makemodelyear import MakeModelYear, MakeModelYearSchema
 from models.user import User
+from controllers.catalog_controller import catalog_cache
+from utils.params import order_by_ids, parse_id_list
+from utils.preconditions import check_if_match, etag_header, precondition_failed
 
 # Create a Blueprint for make, model, and year endpoints
 makemodelyear_bp = Blueprint('makemodelyear', __name__)
 
+# Relations MakeModelYearSchema serializes, loaded up front so batch lookups avoid N+1 queries
+MAKEMODELYEAR_EAGER_LOADS = (
+    selectinload(MakeModelYear.cars).selectinload(Car.listings)
+    .selectinload(Listing.user).selectinload(User.car_transactions),
+    selectinload(MakeModelYear.cars).selectinload(Car.car_transactions)
+    .selectinload(CarTransaction.user)
+)
+# The same relations for the full list, loading each per-car collection in one query (see CAR_LIST_EAGER_LOADS)
+MAKEMODELYEAR_LIST_EAGER_LOADS = (
+    joinedload(MakeModelYear.cars).joinedload(Car.listings)
+    .joinedload(Listing.user).selectinload(User.car_transactions),
+    joinedload(MakeModelYear.cars).joinedload(Car.car_transactions)
+    .joinedload(CarTransaction.user)
+)
+
 # Route to get all make, model, and year combinations
 @makemodelyear_bp.route('/makemodelyear', methods=['GET'])
 def get_makemodelyears():
     try:
+        # Batch lookup by id list (e.g. ?ids=3,1,2) in a single IN query
+        if 'ids' in request.args:
+            ids = parse_id_list(request.args['ids'])
+            makemodelyears = (
+                MakeModelYear.query
+                .filter(MakeModelYear.make_model_year_id.in_(ids))
+                .options(*MAKEMODELYEAR_EAGER_LOADS)
+                .all()
+            )
+            found, missing = order_by_ids(makemodelyears, ids, 'make_model_year_id')
+            return jsonify({'items': MakeModelYearSchema(many=True).dump(found), 'missing': missing}), 200
+
         # Query all MakeModelYear entries from the database
-        makemodelyears = MakeModelYear.query.all()
+        makemodelyears = MakeModelYear.query.options(*MAKEMODELYEAR_LIST_EAGER_LOADS).all()
 
         # Serialize the data using the MakeModelYearSchema
         data = MakeModelYearSchema(many=True).dump(makemodelyears)
 
         # Return the serialized data as JSON with a 200 OK status
         return jsonify(data), 200
+    except ValidationError as ve:
+        # Return validation errors with a 400 Bad Request status
+        return jsonify({'errors': ve.messages}), 400
     except Exception:
         # Return a generic error message with a 500 Internal Server Error status
         return jsonify({'error': 'An internal server error occurred.'}), 500
@@ -30,7 +69,7 @@ def get_makemodelyears():
 def get_makemodelyear(id):
     try:
         # Query the MakeModelYear entry with the given ID
-        makemodelyear = MakeModelYear.query.get(id)
+        makemodelyear = MakeModelYear.query.options(*MAKEMODELYEAR_EAGER_LOADS).get(id)
 
         # Check if the entry exists
         if makemodelyear is None:
@@ -40,8 +79,8 @@ def get_makemodelyear(id):
         # Serialize the data using the MakeModelYearSchema
         data = MakeModelYearSchema().dump(makemodelyear)
 
-        # Return the serialized data as JSON with a 200 OK status
-        return jsonify(data), 200
+        # Return the serialized data as JSON with a 200 OK status and its version as the ETag
+        return jsonify(data), 200, etag_header(makemodelyear)
     except Exception:
         # Return a generic error message with a 500 Internal Server Error status
         return jsonify({'error': 'An internal server error occurred.'}), 500
@@ -94,6 +133,9 @@ def create_makemodelyear():
         db.session.add(new_makemodelyear)
         db.session.commit()
 
+        # The make/model/year catalog has changed
+        catalog_cache.clear()
+
         # Return the new entry as JSON with a 201 Created status
         return MakeModelYearSchema().dump(new_makemodelyear), 201
     except Exception:
@@ -120,6 +162,11 @@ def update_makemodelyear(id):
         if not makemodelyear:
             return jsonify({'error': 'Make, model, and year combination not found.'}), 404
 
+        # Reject the write if the client edited an older version (If-Match)
+        failed = check_if_match(makemodelyear)
+        if failed:
+            return failed
+
         # Load input data (partial updates allowed)
         data = request.get_json()
 
@@ -140,8 +187,15 @@ def update_makemodelyear(id):
         # Commit the changes to the database
         db.session.commit()
 
-        # Return the updated entry as JSON with a 200 OK status
-        return MakeModelYearSchema().dump(makemodelyear), 200
+        # The make/model/year catalog has changed
+        catalog_cache.clear()
+
+        # Return the updated entry as JSON with a 200 OK status and its new version as the ETag
+        return MakeModelYearSchema().dump(makemodelyear), 200, etag_header(makemodelyear)
+    except StaleDataError:
+        # Another request updated the entry between loading and committing
+        db.session.rollback()
+        return precondition_failed()
     except Exception:
         # Return a generic error message with a 500 Internal Server Error status
         return jsonify({'error': 'An internal server error occurred.'}), 500
@@ -174,6 +228,9 @@ def delete_makemodelyear(id):
         db.session.delete(makemodelyear)
         db.session.commit()
 
+        # The make/model/year catalog has changed
+        catalog_cache.clear()
+
         # Return a success message with a 200 OK status
         return jsonify({'message': 'Make, model, and year combination deleted successfully.'}), 200
     except Exception:
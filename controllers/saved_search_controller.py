@@ -0,0 +1,128 @@
+# Import third-party modules
+from flask import Blueprint, jsonify, request
+from flask_jwt_extended import get_jwt_identity, jwt_required
+from marshmallow import ValidationError
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload
+
+# Import local modules
+from init import db
+from models.car import Car
+from models.listing import Listing
+from models.saved_search import SavedSearch, SavedSearchMatch, SavedSearchMatchSchema, SavedSearchSchema
+from models.user import User
+from utils.params import paginated_response
+from utils.saved_searches import saved_search_matcher
+
+# Create a Blueprint for saved searches and their alerts
+saved_searches_bp = Blueprint('saved_searches', __name__)
+
+# Route to save a new search
+@saved_searches_bp.route('/saved-searches', methods=['POST'])
+@jwt_required()
+def create_saved_search():
+    # Get the current user ID from the JWT token
+    current_user_id = get_jwt_identity()
+    user = User.query.get(current_user_id)
+
+    # Check if the user exists
+    if not user:
+        return jsonify({'error': 'User not found.'}), 404
+
+    try:
+        # Load and validate the search criteria
+        data = SavedSearchSchema().load(request.get_json())
+
+        # Add and commit the new saved search; the matcher picks it up on its next refresh
+        saved_search = SavedSearch(user_id=user.user_id, **data)
+        db.session.add(saved_search)
+        db.session.commit()
+
+        # Return the new saved search as JSON
+        return jsonify(SavedSearchSchema().dump(saved_search)), 201
+    except ValidationError as ve:
+        # Return validation errors to the client
+        return jsonify({'errors': ve.messages}), 400
+    except Exception:
+        # Return a generic error message to the client
+        return jsonify({'error': 'An internal server error occurred.'}), 500
+
+# Route to get the current user's saved searches
+@saved_searches_bp.route('/saved-searches', methods=['GET'])
+@jwt_required()
+def get_saved_searches():
+    # Get the current user ID from the JWT token
+    current_user_id = int(get_jwt_identity())
+
+    try:
+        # Retrieve the user's saved searches
+        saved_searches = SavedSearch.query.filter_by(user_id=current_user_id).order_by(SavedSearch.saved_search_id).all()
+
+        # Return the saved searches as JSON
+        return jsonify(SavedSearchSchema(many=True).dump(saved_searches)), 200
+    except Exception:
+        # Return a generic error message to the client
+        return jsonify({'error': 'An internal server error occurred.'}), 500
+
+# Route to get the listings that matched a saved search (paginated, newest first)
+@saved_searches_bp.route('/saved-searches/<int:id>/matches', methods=['GET'])
+@jwt_required()
+def get_saved_search_matches(id):
+    # Get the current user ID from the JWT token
+    current_user_id = int(get_jwt_identity())
+
+    # Retrieve the saved search and check it belongs to the current user
+    saved_search = SavedSearch.query.get(id)
+    if not saved_search or saved_search.user_id != current_user_id:
+        return jsonify({'error': 'Saved search not found.'}), 404
+
+    try:
+        # Load the matches with their listings and cars
+        statement = (
+            select(SavedSearchMatch)
+            .where(SavedSearchMatch.saved_search_id == id)
+            .options(joinedload(SavedSearchMatch.listing).joinedload(Listing.car).joinedload(Car.make_model_year))
+            .order_by(SavedSearchMatch.saved_search_match_id.desc())
+        )
+
+        # Return the requested page of matches
+        return jsonify(paginated_response(statement, SavedSearchMatchSchema(many=True))), 200
+    except Exception:
+        # Return a generic error message to the client
+        return jsonify({'error': 'An internal server error occurred.'}), 500
+
+# Route to delete a saved search
+@saved_searches_bp.route('/saved-searches/<int:id>', methods=['DELETE'])
+@jwt_required()
+def delete_saved_search(id):
+    # Get the current user ID from the JWT token
+    current_user_id = get_jwt_identity()
+    user = User.query.get(current_user_id)
+
+    # Check if the user exists
+    if not user:
+        return jsonify({'error': 'User not found.'}), 404
+
+    try:
+        # Retrieve the saved search by ID
+        saved_search = SavedSearch.query.get(id)
+        if not saved_search:
+            return jsonify({'error': 'Saved search not found.'}), 404
+
+        # Check if the user is the owner or an admin
+        if saved_search.user_id != user.user_id and not user.is_admin:
+            return jsonify({'error': 'You do not have permission to delete this saved search.'}), 403
+
+        # Delete the saved search and its matches
+        SavedSearchMatch.query.filter_by(saved_search_id=id).delete()
+        db.session.delete(saved_search)
+        db.session.commit()
+
+        # Stop matching it in this process straight away
+        saved_search_matcher.forget(id)
+
+        # Return a success message
+        return jsonify({'message': 'Saved search deleted successfully.'}), 200
+    except Exception:
+        # Return a generic error message to the client
+        return jsonify({'error': 'An internal server error occurred.'}), 500
@@ -0,0 +1,46 @@
+# Import third-party modules
+from flask import Blueprint, jsonify, request
+from marshmallow import ValidationError
+
+# Import local modules
+from models.car import CarValuationSchema
+from models.makemodelyear import MakeModelYear
+from utils.valuation import price_model
+
+# Create a Blueprint for price valuations
+valuations_bp = Blueprint('valuations', __name__)
+
+# Route to estimate a fair price band from historical sales
+@valuations_bp.route('/valuation', methods=['GET'])
+def get_valuation():
+    # The price model needs NumPy
+    if not price_model.available:
+        return jsonify({'error': 'Valuations are not available on this server.'}), 503
+
+    try:
+        # Load and validate the query-string parameters
+        params = CarValuationSchema().load(request.args)
+
+        # Resolve make_model_year_id to its make, model and year
+        if 'make_model_year_id' in params:
+            make_model_year = MakeModelYear.query.get(params['make_model_year_id'])
+            if not make_model_year:
+                return jsonify({'error': 'Invalid make_model_year_id provided.'}), 400
+            params.update(make=make_model_year.make, model=make_model_year.model, year=make_model_year.year)
+
+        valuation = price_model.estimate(
+            params['make'], params['model'], params['year'], params['mileage'], params['condition']
+        )
+
+        # Check if there are enough sales to value the car
+        if valuation is None:
+            return jsonify({'error': 'Not enough sales to value this car.'}), 404
+
+        # Return the estimated price band
+        return jsonify(valuation), 200
+    except ValidationError as ve:
+        # Return validation errors to the client
+        return jsonify({'errors': ve.messages}), 400
+    except Exception:
+        # Return a generic error message to the client
+        return jsonify({'error': 'An internal server error occurred.'}), 500
@@ -3,7 +3,9 @@ from flask_marshmallow import Marshmallow
 from flask_bcrypt import Bcrypt
 from flask_jwt_extended import JWTManager
 
-db = SQLAlchemy()
+from utils.replicas import RoutingSession, replica_router
+
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 ma = Marshmallow()
 bcrypt = Bcrypt()
 jwt = JWTManager()
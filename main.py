@@ -1,15 +1,35 @@
 # Main application module for initializing and configuring the Flask app
 import os
 from flask import Flask
-from init import db, ma, bcrypt, jwt
+from init import db, ma, bcrypt, jwt, replica_router
+from utils.async_db import async_db
+from utils.compression import compressor
+from utils.formats import response_formats
+from utils.preconditions import conditional_responses, etag_hasher
+from utils.admission import admission
+from utils.revocation import token_denylist
+from utils.audit import audit_log
 
 # Import the Blueprint
 from controllers.cli_controllers import db_commands  
+from controllers.benchmark_controllers import benchmarks
 from controllers.auth_controller import auth_bp
-from controllers.car_controller import cars_bp
+from controllers.car_controller import cars_bp, async_views
 from controllers.listing_controller import listings_bp
 from controllers.car_transaction_controller import car_transactions_bp
 from controllers.makemodelyear_controller import makemodelyear_bp
+from controllers.changes_controller import changes_bp
+from controllers.batch_controller import batch_bp
+from controllers.catalog_controller import catalog_bp
+from controllers.saved_search_controller import saved_searches_bp
+from controllers.valuation_controller import valuations_bp
+
+# Imported after the controllers, which load every model before the matcher's queries are built
+from utils.events import listing_events
+from utils.saved_searches import saved_search_matcher
+from utils.similarity import similar_cars
+from utils.valuation import price_model
+from utils.warmup import warmup
 
 def create_app():
     # Create the Flask application instance
@@ -17,18 +37,45 @@ def create_app():
     app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL")
     app.config["SECRET_KEY"] = os.environ.get("JWT_SECRET_KEY")
 
+    # Configure optional read replicas (must run before the database is initialised)
+    replica_router.init_app(app)
+
     # Initialize Flask extensions
     db.init_app(app)
     ma.init_app(app)
     bcrypt.init_app(app)
     jwt.init_app(app)
+    token_denylist.init_app(app, jwt, db)
+    async_db.init_app(app)
+    conditional_responses.init_app(app)
+    compressor.init_app(app)
+    response_formats.init_app(app)
+    etag_hasher.init_app(app)
+    admission.init_app(app, db)
+    audit_log.init_app(app, db)
+    saved_search_matcher.init_app(app, db, listing_events)
+    similar_cars.init_app(app, db)
+    price_model.init_app(app, db)
 
     # Register blueprints to organize the app's routes and functionalities
     app.register_blueprint(db_commands)
+    app.register_blueprint(benchmarks)
     app.register_blueprint(auth_bp, url_prefix='/api')
     app.register_blueprint(cars_bp, url_prefix='/api')
     app.register_blueprint(listings_bp, url_prefix='/api')
     app.register_blueprint(car_transactions_bp, url_prefix='/api')
     app.register_blueprint(makemodelyear_bp, url_prefix='/api')
+    app.register_blueprint(changes_bp, url_prefix='/api')
+    app.register_blueprint(batch_bp, url_prefix='/api')
+    app.register_blueprint(catalog_bp, url_prefix='/api')
+    app.register_blueprint(saved_searches_bp, url_prefix='/api')
+    app.register_blueprint(valuations_bp, url_prefix='/api')
+
+    # In async mode, swap read endpoints for their async equivalents (same URLs)
+    if async_db.enabled:
+        app.view_functions.update(async_views)
+
+    # Register the post-fork reset and, with WARM_UP=1, warm the app up before workers fork
+    warmup.init_app(app, db, indexes=(("similar_cars", similar_cars), ("valuations", price_model)))
 
     return app
@@ -0,0 +1,72 @@
+# Import the SQLAlchemy database instance (db)
+from init import db
+
+# Import datetime for timestamping
+from datetime import datetime
+
+# Define the ListingArchive model representing the 'listings_archive' table
+# Cold storage for sold listings moved out of 'listings' by the archive_records command
+class ListingArchive(db.Model):
+    __tablename__ = "listings_archive"  # Specify the table name
+
+    # Same columns as 'listings'; the listing keeps its original ID
+    listing_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    listing_status = db.Column(
+        db.Enum('available', 'sold', name='listing_status_enum'),
+        nullable=False
+    )
+    date_posted = db.Column(db.DateTime, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False)
+    row_version = db.Column(db.Integer, nullable=False)
+    car_id = db.Column(db.Integer, nullable=False, index=True)
+    user_id = db.Column(db.Integer, nullable=False, index=True)
+
+    # When the listing was moved to the archive
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    # Read-only relationships so ListingSchema can serialize archived listings
+    user = db.relationship(
+        "User",
+        primaryjoin="foreign(ListingArchive.user_id) == User.user_id",
+        viewonly=True
+    )
+    car = db.relationship(
+        "Car",
+        primaryjoin="foreign(ListingArchive.car_id) == Car.car_id",
+        viewonly=True
+    )
+
+    def __repr__(self):
+        # String representation for debugging
+        return f"<ListingArchive {self.listing_id}, Status: {self.listing_status}>"
+
+# Define the CarTransactionArchive model representing the 'car_transactions_archive' table
+# Cold storage for old transactions moved out of 'car_transactions' by the archive_records command
+class CarTransactionArchive(db.Model):
+    __tablename__ = "car_transactions_archive"  # Specify the table name
+
+    # Same columns as 'car_transactions'; the transaction keeps its original ID
+    transaction_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    transaction_date = db.Column(db.Date, nullable=False)
+    amount = db.Column(db.Float, nullable=False)
+    car_id = db.Column(db.Integer, nullable=False, index=True)
+    buyer_id = db.Column(db.Integer, nullable=False, index=True)
+
+    # When the transaction was moved to the archive
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    # Read-only relationships so CarTransactionSchema can serialize archived transactions
+    user = db.relationship(
+        "User",
+        primaryjoin="foreign(CarTransactionArchive.buyer_id) == User.user_id",
+        viewonly=True
+    )
+    car = db.relationship(
+        "Car",
+        primaryjoin="foreign(CarTransactionArchive.car_id) == Car.car_id",
+        viewonly=True
+    )
+
+    def __repr__(self):
+        # String representation for debugging
+        return f"<CarTransactionArchive {self.transaction_id}, Amount: {self.amount}>"
@@ -0,0 +1,38 @@
+# Import the SQLAlchemy database instance (db)
+from init import db
+
+# Import datetime for timestamping
+from datetime import datetime
+
+# Define the AuditLog model representing the 'audit_log' table
+# Written in batches by the background audit flusher, never inside a request
+class AuditLog(db.Model):
+    __tablename__ = "audit_log"  # Specify the table name
+
+    # Primary key, unique identifier for each audit entry
+    audit_id = db.Column(db.Integer, primary_key=True)
+    # ID of the user who made the change (None for anonymous requests and CLI commands)
+    # Deliberately not a foreign key so entries outlive the user they refer to
+    actor_id = db.Column(db.Integer, index=True)
+    # Name of the changed entity type (e.g. 'car')
+    entity = db.Column(db.String(30), nullable=False)
+    # Primary key of the changed row
+    entity_id = db.Column(db.Integer, nullable=False)
+    # Whether the row was created, updated or deleted
+    operation = db.Column(
+        db.Enum('create', 'update', 'delete', name='audit_operation_enum'),
+        nullable=False
+    )
+    # Changed columns as {"column": [before, after]}
+    changes = db.Column(db.JSON, nullable=False)
+    # When the change was committed
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    # Look up the history of one row
+    __table_args__ = (
+        db.Index("ix_audit_log_entity_entity_id", "entity", "entity_id"),
+    )
+
+    def __repr__(self):
+        # String representation for debugging
+        return f"<AuditLog {self.audit_id}, {self.operation} {self.entity} {self.entity_id}>"
@@ -1,8 +1,11 @@
 # Import the SQLAlchemy database instance (db) and Marshmallow (ma) for serialization
 from init import db, ma
 
+# Import datetime for timestamping
+from datetime import datetime
+
 # Import fields and validation utilities from Marshmallow
-from marshmallow import fields, validate
+from marshmallow import fields, validate, validates_schema, ValidationError, EXCLUDE
 
 # Import the MakeModelYear model for relationships
 from models.makemodelyear import MakeModelYear
@@ -10,6 +13,8 @@ from models.makemodelyear import MakeModelYear
 # Define the Car model representing the 'cars' table in the database
 class Car(db.Model):
     __tablename__ = "cars"  # Specify the table name
+    __change_entity__ = "car"  # Entity name used by the change feed
+    __audit_entity__ = "car"  # Entity name used by the audit log
 
     # Primary key, unique identifier for each car
     car_id = db.Column(db.Integer, primary_key=True)
@@ -31,9 +36,23 @@ class Car(db.Model):
     make_model_year_id = db.Column(
         db.Integer,
         db.ForeignKey('makemodelyear.make_model_year_id'),
-        nullable=False
+        nullable=False,
+        index=True
     )
 
+    # Timestamp of the last insert or update
+    updated_at = db.Column(
+        db.DateTime,
+        nullable=False,
+        default=datetime.utcnow,
+        onupdate=datetime.utcnow
+    )
+    # Row version, incremented by SQLAlchemy on every update
+    row_version = db.Column(db.Integer, nullable=False)
+
+    # Let SQLAlchemy maintain row_version as the optimistic version counter
+    __mapper_args__ = {"version_id_col": row_version}
+
     # Relationship to the Listing model
     listings = db.relationship(
         "Listing",
@@ -83,14 +102,65 @@ class CarSchema(ma.Schema):
     image_url = fields.String()
     make_model_year_id = fields.Integer(required=True)
 
+    # Change-tracking fields, maintained by the server
+    updated_at = fields.DateTime(dump_only=True)
+    row_version = fields.Integer(dump_only=True)
+
     class Meta:
         # Fields to include in the serialized output
         fields = (
             "car_id", "mileage", "price", "condition",
             "description", "image_url", "make_model_year_id",
-            "make_model_year", "listings", "car_transactions"
+            "make_model_year", "listings", "car_transactions",
+            "updated_at", "row_version"
         )
 
 # Schema instances for serializing Car objects
 car_schema = CarSchema()
 cars_schema = CarSchema(many=True)
+
+# Define the CarFilterSchema for validating car search query-string parameters
+class CarFilterSchema(ma.Schema):
+    # Make/model/year filters (applied to the joined MakeModelYear row)
+    make = fields.String()
+    model = fields.String()
+    year_min = fields.Integer()
+    year_max = fields.Integer()
+
+    # Car attribute filters
+    condition = fields.String(validate=validate.OneOf(['new', 'used', 'certified']))
+    price_min = fields.Float()
+    price_max = fields.Float()
+    mileage_max = fields.Integer()
+
+    # Listing filter (applied to the joined Listing row)
+    listing_status = fields.String(validate=validate.OneOf(['available', 'sold']))
+
+    class Meta:
+        # Ignore unrelated query-string parameters instead of rejecting the request
+        unknown = EXCLUDE
+
+# Define the CarValuationSchema for validating valuation query-string parameters
+class CarValuationSchema(ma.Schema):
+    # The car is identified by make_model_year_id, or by make, model and year
+    make_model_year_id = fields.Integer()
+    make = fields.String()
+    model = fields.String()
+    year = fields.Integer()
+
+    # Car attributes the price depends on
+    mileage = fields.Integer(required=True, validate=validate.Range(min=0))
+    condition = fields.String(
+        required=True,
+        validate=validate.OneOf(['new', 'used', 'certified'])
+    )
+
+    @validates_schema
+    def validate_vehicle(self, data, **kwargs):
+        # Either form of identification is enough, but one is required
+        if 'make_model_year_id' not in data and not all(key in data for key in ('make', 'model', 'year')):
+            raise ValidationError("Provide make_model_year_id, or make, model and year.")
+
+    class Meta:
+        # Ignore unrelated query-string parameters instead of rejecting the request
+        unknown = EXCLUDE
@@ -7,11 +7,12 @@ from marshmallow import fields
 # Define the CarTransaction model representing the 'car_transactions' table
 class CarTransaction(db.Model):
     __tablename__ = "car_transactions"  # Specify the table name
+    __audit_entity__ = "car_transaction"  # Entity name used by the audit log
 
     # Primary key, unique identifier for each transaction
     transaction_id = db.Column(db.Integer, primary_key=True)
     # Date of the transaction, required
-    transaction_date = db.Column(db.Date, nullable=False)
+    transaction_date = db.Column(db.Date, nullable=False, index=True)
     # Transaction amount, required
     amount = db.Column(db.Float, nullable=False)
 
@@ -19,13 +20,15 @@ class CarTransaction(db.Model):
     car_id = db.Column(
         db.Integer,
         db.ForeignKey("cars.car_id"),
-        nullable=False
+        nullable=False,
+        index=True
     )
     # Foreign key referencing 'user_id' in the 'users' table
     buyer_id = db.Column(
         db.Integer,
         db.ForeignKey("users.user_id"),
-        nullable=False
+        nullable=False,
+        index=True
     )
 
     # Relationship to the User model (buyer)
@@ -0,0 +1,113 @@
+# Import the SQLAlchemy database instance (db)
+from init import db
+
+# Import SQLAlchemy ORM utilities for tracking flushed changes
+from sqlalchemy import event, inspect, literal_column, select, text, tuple_
+from sqlalchemy.orm import Session
+
+# Import datetime for timestamping
+from datetime import datetime
+
+# Define the ChangeLog model representing the 'change_log' table
+# Every insert, update and delete of a tracked model appends one row; deletes act as tombstones
+class ChangeLog(db.Model):
+    __tablename__ = "change_log"  # Specify the table name
+
+    # Primary key, also the monotonic change token handed to clients
+    change_id = db.Column(db.Integer, primary_key=True)
+    # Name of the changed entity type (e.g. 'car')
+    entity = db.Column(db.String(30), nullable=False)
+    # Primary key of the changed row
+    entity_id = db.Column(db.Integer, nullable=False)
+    # Whether the row was inserted/updated ('upsert') or deleted ('delete')
+    operation = db.Column(
+        db.Enum('upsert', 'delete', name='change_operation_enum'),
+        nullable=False
+    )
+    # When the change was flushed
+    changed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # Id of the transaction that wrote the change (PostgreSQL only). change_id is assigned at insert
+    # time, so concurrent transactions can commit out of change_id order; the feed pages by this instead
+    xact_id = db.Column(db.BigInteger, nullable=True)
+
+    # Index used by the change feed on PostgreSQL
+    __table_args__ = (db.Index("ix_change_log_xact_id_change_id", "xact_id", "change_id"),)
+
+    def __repr__(self):
+        # String representation for debugging
+        return f"<ChangeLog {self.change_id}, {self.operation} {self.entity} {self.entity_id}>"
+
+# INSERT for change log rows, stamped on PostgreSQL with the id of the transaction running it
+def change_log_insert(connection):
+    statement = ChangeLog.__table__.insert()
+    if connection.dialect.name == "postgresql":
+        statement = statement.values(xact_id=literal_column("pg_current_xact_id()::text::bigint"))
+    return statement
+
+# PostgreSQL transaction id below which every transaction has finished, or None on other databases
+def committed_horizon(connection):
+    if connection.dialect.name != "postgresql":
+        return None
+    return connection.scalar(text("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint"))
+
+# Restrict a change log SELECT to the entries after a (xact_id, change_id) position, in commit order
+def changes_after(statement, connection, position):
+    xact_id, change_id = position
+    horizon = committed_horizon(connection)
+    if horizon is None:
+        # SQLite runs one write transaction at a time, so change_id order is commit order
+        return statement.where(ChangeLog.change_id > change_id).order_by(ChangeLog.change_id)
+    # change_id is assigned at insert, so a lower id can commit after a higher one. Read in
+    # transaction order instead, and only through transactions older than every transaction
+    # still running: nothing can appear behind the last entry read later.
+    return statement.where(
+        tuple_(ChangeLog.xact_id, ChangeLog.change_id) > tuple_(xact_id, change_id),
+        ChangeLog.xact_id < horizon
+    ).order_by(ChangeLog.xact_id, ChangeLog.change_id)
+
+# Position of a change log entry, as compared by changes_after
+def change_position(entry):
+    return (entry.xact_id or 0, entry.change_id)
+
+# Position of the last entry changes_after could return now, or (0, 0) for an empty log
+def latest_change_position(connection):
+    statement = changes_after(select(ChangeLog.xact_id, ChangeLog.change_id), connection, (0, 0))
+    entry = connection.execute(
+        statement.order_by(None).order_by(ChangeLog.xact_id.desc(), ChangeLog.change_id.desc()).limit(1)
+    ).first()
+    return change_position(entry) if entry is not None else (0, 0)
+
+# Append change log rows for rows written outside the ORM unit of work (bulk statements)
+def record_changes(connection, entity, entity_ids, operation):
+    now = datetime.utcnow()
+    rows = [
+        {"entity": entity, "entity_id": entity_id, "operation": operation, "changed_at": now}
+        for entity_id in entity_ids
+    ]
+    if rows:
+        connection.execute(change_log_insert(connection), rows)
+
+# Record every flushed change to a model that declares a __change_entity__ name
+@event.listens_for(Session, "after_flush")
+def record_flushed_changes(session, flush_context):
+    rows = []
+    now = datetime.utcnow()
+    for operation, instances in (
+        ("upsert", session.new),
+        ("upsert", [obj for obj in session.dirty if session.is_modified(obj)]),
+        ("delete", session.deleted),
+    ):
+        for obj in instances:
+            entity = getattr(obj, "__change_entity__", None)
+            if entity is None:
+                continue
+            rows.append({
+                "entity": entity,
+                "entity_id": inspect(obj).mapper.primary_key_from_instance(obj)[0],
+                "operation": operation,
+                "changed_at": now,
+            })
+    if rows:
+        # Written on the flush's own connection so it commits or rolls back with the change
+        connection = session.connection()
+        connection.execute(change_log_insert(connection), rows)
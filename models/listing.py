@@ -10,6 +10,8 @@ from datetime import datetime
 # Define the Listing model representing the 'listings' table
 class Listing(db.Model):
     __tablename__ = "listings"  # Specify the table name
+    __change_entity__ = "listing"  # Entity name used by the change feed
+    __audit_entity__ = "listing"  # Entity name used by the audit log
 
     # Primary key, unique identifier for each listing
     listing_id = db.Column(db.Integer, primary_key=True)
@@ -18,7 +20,8 @@ class Listing(db.Model):
     listing_status = db.Column(
         db.Enum('available', 'sold', name='listing_status_enum'),
         nullable=False,
-        default='available'
+        default='available',
+        index=True
     )
 
     # Date when the listing was posted
@@ -28,18 +31,34 @@ class Listing(db.Model):
         default=datetime.utcnow
     )
 
+    # Timestamp of the last insert or update
+    updated_at = db.Column(
+        db.DateTime,
+        nullable=False,
+        default=datetime.utcnow,
+        onupdate=datetime.utcnow
+    )
+
+    # Row version, incremented by SQLAlchemy on every update
+    row_version = db.Column(db.Integer, nullable=False)
+
+    # Let SQLAlchemy maintain row_version as the optimistic version counter
+    __mapper_args__ = {"version_id_col": row_version}
+
     # Foreign key referencing 'car_id' in the 'cars' table
     car_id = db.Column(
         db.Integer,
         db.ForeignKey("cars.car_id", ondelete="CASCADE"),
-        nullable=False
+        nullable=False,
+        index=True
     )
 
     # Foreign key referencing 'user_id' in the 'users' table
     user_id = db.Column(
         db.Integer,
         db.ForeignKey("users.user_id", ondelete="CASCADE"),
-        nullable=False
+        nullable=False,
+        index=True
     )
 
     # Relationship to the User model
@@ -80,6 +99,8 @@ class ListingSchema(ma.SQLAlchemyAutoSchema):
     date_posted = ma.auto_field(dump_only=True)
     listing_status = ma.auto_field(dump_only=True)
     user_id = ma.auto_field(dump_only=True)
+    updated_at = ma.auto_field(dump_only=True)
+    row_version = ma.auto_field(dump_only=True)
 
     # 'car_id' is required input from the client when creating a listing
     car_id = fields.Integer(required=True)
@@ -92,6 +113,6 @@ class ListingSchema(ma.SQLAlchemyAutoSchema):
         fields = (
             "listing_id", "car_id", "user_id",
             "listing_status", "date_posted",
-            "user", "car"
+            "user", "car", "updated_at", "row_version"
         )
 
@@ -4,10 +4,18 @@ from init import db, ma
 # Import fields from Marshmallow for schema definitions
 from marshmallow import fields
 
+# Import datetime for timestamping
+from datetime import datetime
+
 
 # Define the MakeModelYear model representing the 'makemodelyear' table
 class MakeModelYear(db.Model):
     __tablename__ = "makemodelyear"  # Specify the table name
+    __change_entity__ = "makemodelyear"  # Entity name used by the change feed
+    __audit_entity__ = "makemodelyear"  # Entity name used by the audit log
+    __table_args__ = (
+        db.Index("ix_makemodelyear_make_model_year", "make", "model", "year"),
+    )  # Composite index backing the make -> model -> year catalog lookups
 
     # Define the columns/attributes
     make_model_year_id = db.Column(
@@ -22,6 +30,15 @@ class MakeModelYear(db.Model):
     year = db.Column(
         db.Integer, nullable=False
     )  # Year of the car's make, required
+    updated_at = db.Column(
+        db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow
+    )  # Timestamp of the last insert or update
+    row_version = db.Column(
+        db.Integer, nullable=False
+    )  # Row version, incremented by SQLAlchemy on every update
+
+    # Let SQLAlchemy maintain row_version as the optimistic version counter
+    __mapper_args__ = {"version_id_col": row_version}
 
     # Relationship with the Car model
     cars = db.relationship(
@@ -40,8 +57,13 @@ class MakeModelYearSchema(ma.Schema):
         fields.Nested('CarSchema', exclude=["make_model_year"])
     )  # Exclude 'make_model_year' to prevent recursion
 
+    # Change-tracking fields, maintained by the server
+    updated_at = fields.DateTime(dump_only=True)
+    row_version = fields.Integer(dump_only=True)
+
     class Meta:
         # Fields to include in the serialized output
         fields = (
-            "make_model_year_id", "make", "model", "year", "cars"
+            "make_model_year_id", "make", "model", "year", "cars",
+            "updated_at", "row_version"
         )
@@ -0,0 +1,23 @@
+# Import the SQLAlchemy database instance (db)
+from init import db
+
+# Import datetime for timestamping
+from datetime import datetime
+
+# Define the RevokedToken model representing the 'revoked_tokens' table
+# One row per logged-out token; rows are only needed until the token would have expired anyway
+class RevokedToken(db.Model):
+    __tablename__ = "revoked_tokens"  # Specify the table name
+
+    # Primary key, also the watermark used to load new revocations incrementally
+    revoked_token_id = db.Column(db.Integer, primary_key=True)
+    # Unique identifier ('jti' claim) of the revoked token
+    jti = db.Column(db.String(36), nullable=False, unique=True)
+    # When the token expires; the row can be purged after this
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    # When the token was revoked
+    revoked_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        # String representation for debugging
+        return f"<RevokedToken {self.jti}, expires {self.expires_at}>"
@@ -0,0 +1,130 @@
+# Import the SQLAlchemy database instance (db) and Marshmallow (ma) for serialization
+from init import db, ma
+
+# Import fields and validation utilities from Marshmallow
+from marshmallow import fields, validate, validates_schema, ValidationError
+
+# Import datetime for timestamping
+from datetime import datetime
+
+# Criteria a saved search may use; every criterion is optional and omitted ones match anything
+SAVED_SEARCH_CRITERIA = (
+    "make", "model", "condition",
+    "year_min", "year_max", "price_min", "price_max", "mileage_min", "mileage_max"
+)
+
+# Define the SavedSearch model representing the 'saved_searches' table
+# Saved searches are immutable: changing one means deleting it and saving a new one
+class SavedSearch(db.Model):
+    __tablename__ = "saved_searches"  # Specify the table name
+
+    # Primary key, also the watermark used to load new searches incrementally
+    saved_search_id = db.Column(db.Integer, primary_key=True)
+    # Foreign key referencing the buyer who saved the search
+    user_id = db.Column(
+        db.Integer,
+        db.ForeignKey("users.user_id", ondelete="CASCADE"),
+        nullable=False,
+        index=True
+    )
+    # Optional name chosen by the buyer
+    name = db.Column(db.String(100))
+
+    # Equality criteria on MakeModelYear and Car attributes
+    make = db.Column(db.String(100))
+    model = db.Column(db.String(100))
+    condition = db.Column(db.Enum('new', 'used', 'certified', name='car_condition_enum'))
+
+    # Inclusive range criteria on MakeModelYear and Car attributes
+    year_min = db.Column(db.Integer)
+    year_max = db.Column(db.Integer)
+    price_min = db.Column(db.Float)
+    price_max = db.Column(db.Float)
+    mileage_min = db.Column(db.Integer)
+    mileage_max = db.Column(db.Integer)
+
+    # When the search was saved
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        # String representation for debugging
+        return f"<SavedSearch {self.saved_search_id}, User: {self.user_id}>"
+
+# Define the SavedSearchMatch model representing the 'saved_search_matches' table
+# One row per new listing that matched a saved search (the buyer's alerts)
+class SavedSearchMatch(db.Model):
+    __tablename__ = "saved_search_matches"  # Specify the table name
+    __table_args__ = (
+        db.UniqueConstraint("saved_search_id", "listing_id"),
+    )  # A listing matches a search at most once
+
+    # Primary key, unique identifier for each match
+    saved_search_match_id = db.Column(db.Integer, primary_key=True)
+    # Foreign key referencing the matched saved search
+    saved_search_id = db.Column(
+        db.Integer,
+        db.ForeignKey("saved_searches.saved_search_id", ondelete="CASCADE"),
+        nullable=False
+    )
+    # Foreign key referencing the matching listing
+    listing_id = db.Column(
+        db.Integer,
+        db.ForeignKey("listings.listing_id", ondelete="CASCADE"),
+        nullable=False,
+        index=True
+    )
+    # When the listing was matched
+    matched_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    # Relationship to the Listing model
+    listing = db.relationship("Listing")
+
+    def __repr__(self):
+        # String representation for debugging
+        return f"<SavedSearchMatch {self.saved_search_id}, Listing: {self.listing_id}>"
+
+# Define the SavedSearchSchema for serialization/deserialization
+class SavedSearchSchema(ma.Schema):
+    # Fields set as dump_only to prevent client from supplying them
+    saved_search_id = fields.Integer(dump_only=True)
+    user_id = fields.Integer(dump_only=True)
+    created_at = fields.DateTime(dump_only=True)
+
+    # Optional name and criteria
+    name = fields.String(validate=validate.Length(max=100))
+    make = fields.String(validate=validate.Length(min=1, max=100))
+    model = fields.String(validate=validate.Length(min=1, max=100))
+    condition = fields.String(validate=validate.OneOf(['new', 'used', 'certified']))
+    year_min = fields.Integer()
+    year_max = fields.Integer()
+    price_min = fields.Float()
+    price_max = fields.Float()
+    mileage_min = fields.Integer()
+    mileage_max = fields.Integer()
+
+    @validates_schema
+    def validate_criteria(self, data, **kwargs):
+        # A search needs at least one criterion, and every range needs min <= max
+        if not any(data.get(criterion) is not None for criterion in SAVED_SEARCH_CRITERIA):
+            raise ValidationError("At least one search criterion is required.")
+        for prefix in ("year", "price", "mileage"):
+            low, high = data.get(f"{prefix}_min"), data.get(f"{prefix}_max")
+            if low is not None and high is not None and low > high:
+                raise ValidationError(f"{prefix}_min must not exceed {prefix}_max.", f"{prefix}_min")
+
+    class Meta:
+        # Fields to include in the serialized output
+        fields = ("saved_search_id", "user_id", "name", "created_at") + SAVED_SEARCH_CRITERIA
+
+# Define the SavedSearchMatchSchema for serializing alerts
+class SavedSearchMatchSchema(ma.Schema):
+    # Nested listing with its car, leaving out back-references
+    listing = fields.Nested(
+        'ListingSchema',
+        exclude=["user", "car.listings", "car.car_transactions"],
+        dump_only=True
+    )
+
+    class Meta:
+        # Fields to include in the serialized output
+        fields = ("saved_search_match_id", "saved_search_id", "listing_id", "matched_at", "listing")
@@ -11,6 +11,8 @@ from models.car_transaction import CarTransaction
 # Define the User model representing the 'users' table
 class User(db.Model):
     __tablename__ = "users"  # Specify the table name
+    __audit_entity__ = "user"  # Entity name used by the audit log
+    __audit_redact__ = ("password",)  # Columns whose values are never written to the audit log
 
     # Define the columns/attributes
     user_id = db.Column(db.Integer, primary_key=True)  # Primary key
@@ -20,6 +22,10 @@ class User(db.Model):
     phone_number = db.Column(db.String(15))  # User's phone number
     address = db.Column(db.String(255))  # User's address
     is_admin = db.Column(db.Boolean, default=False)  # Flag to indicate admin users
+    row_version = db.Column(db.Integer, nullable=False)  # Row version, incremented by SQLAlchemy on every update
+
+    # Let SQLAlchemy maintain row_version as the optimistic version counter
+    __mapper_args__ = {"version_id_col": row_version}
 
     # Relationship to the Listing model
     listings = db.relationship(
@@ -62,12 +68,15 @@ class UserSchema(ma.Schema):
     # Password field, load_only to avoid exposing it
     password = fields.String(required=True, load_only=True)  # Required but not included in output
 
+    # Row version, maintained by the server
+    row_version = fields.Integer(dump_only=True)
+
     class Meta:
         # Fields to include in the serialized output
         fields = (
             "user_id", "name", "email", "password",
             "phone_number", "address", "is_admin",
-            "listings", "car_transactions"
+            "listings", "car_transactions", "row_version"
         )
 
 # Schema instances for serializing User objects
@@ -0,0 +1,145 @@
+# Import standard library modules
+import os
+import threading
+import time
+
+# Import third-party modules
+from flask import current_app, g, has_request_context, jsonify, request
+from sqlalchemy import event
+
+# Default limits per route class as (max concurrent, max queued, statement timeout in ms)
+# None means that limit is not enforced for the class
+DEFAULT_ROUTE_CLASSES = {
+    "auth": (8, 16, 5000),
+    "exports": (2, 0, 120000),
+    "streams": (50, 0, 5000),
+    "reads": (None, None, 5000),
+    "writes": (None, None, 10000),
+}
+
+# Decorator assigning a view function to an admission route class
+def admission_class(name):
+    def decorator(view):
+        view.admission_class = name
+        return view
+    return decorator
+
+# Parse "name=value:value,..." environment settings into a dict of lists
+def parse_class_settings(value):
+    settings = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        name, _, numbers = item.partition("=")
+        settings[name.strip()] = [
+            int(number) if number.strip() else None for number in numbers.split(":")
+        ]
+    return settings
+
+# Counting semaphore with a bounded number of waiters
+class ConcurrencyLimit:
+    def __init__(self, max_concurrent, max_queue, queue_timeout):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue or 0
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        # Return True once a slot is held, or False if the request should be shed
+        with self._condition:
+            if self.active < self.max_concurrent:
+                self.active += 1
+                return True
+            if self.waiting >= self.max_queue:
+                return False
+
+            self.waiting += 1
+            try:
+                deadline = time.monotonic() + self.queue_timeout
+                while self.active >= self.max_concurrent:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    self._condition.wait(remaining)
+                self.active += 1
+                return True
+            finally:
+                self.waiting -= 1
+
+    def release(self):
+        with self._condition:
+            self.active -= 1
+            self._condition.notify()
+
+# Sheds excess load per route class and applies per-class statement timeouts
+class AdmissionController:
+    def __init__(self):
+        self.limits = {}
+        self.statement_timeouts = {}
+        self.retry_after = 1
+
+    def init_app(self, app, db):
+        # ADMISSION_LIMITS="auth=8:16,reads=64:128" overrides concurrency and queue depth
+        # STATEMENT_TIMEOUTS="reads=5000,exports=120000" overrides timeouts (milliseconds)
+        limits = parse_class_settings(os.environ.get("ADMISSION_LIMITS", ""))
+        timeouts = parse_class_settings(os.environ.get("STATEMENT_TIMEOUTS", ""))
+        queue_timeout = float(os.environ.get("ADMISSION_QUEUE_TIMEOUT", 2))
+        self.retry_after = int(os.environ.get("ADMISSION_RETRY_AFTER", 1))
+
+        for name in set(DEFAULT_ROUTE_CLASSES) | set(limits) | set(timeouts):
+            max_concurrent, max_queue, timeout = DEFAULT_ROUTE_CLASSES.get(name, (None, None, None))
+            if name in limits:
+                max_concurrent = limits[name][0]
+                max_queue = limits[name][1] if len(limits[name]) > 1 else 0
+            if name in timeouts:
+                timeout = timeouts[name][0]
+            if max_concurrent is not None:
+                self.limits[name] = ConcurrencyLimit(max_concurrent, max_queue, queue_timeout)
+            if timeout:
+                self.statement_timeouts[name] = timeout
+
+        app.before_request(self._before_request)
+        app.teardown_request(self._teardown_request)
+        event.listen(db.session.session_factory.class_, "after_begin", self._after_begin)
+
+    def route_class(self):
+        # Explicitly tagged views use their tag; everything else is a read or a write
+        view = current_app.view_functions.get(request.endpoint)
+        name = getattr(view, "admission_class", None)
+        if name:
+            return name
+        return "reads" if request.method in ("GET", "HEAD", "OPTIONS") else "writes"
+
+    def _before_request(self):
+        if request.endpoint is None:
+            return None
+        g.admission_class = self.route_class()
+
+        limit = self.limits.get(g.admission_class)
+        if limit is None:
+            return None
+        if not limit.acquire():
+            # Reject immediately rather than doing work the client will time out on
+            response = jsonify({"error": "The server is busy. Please retry shortly."})
+            response.status_code = 503
+            response.headers["Retry-After"] = str(self.retry_after)
+            return response
+        # Held on the request (not g) so in-process sub-requests cannot release it
+        request.environ["admission.limit"] = limit
+        return None
+
+    def _teardown_request(self, exc):
+        limit = request.environ.pop("admission.limit", None)
+        if limit is not None:
+            limit.release()
+
+    def _after_begin(self, session, transaction, connection):
+        # Bound every statement in the transaction by the route class timeout
+        if not has_request_context() or connection.dialect.name != "postgresql":
+            return
+        timeout = self.statement_timeouts.get(g.get("admission_class"))
+        if timeout:
+            connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout)}")
+
+# Shared admission controller instance used by create_app
+admission = AdmissionController()
@@ -0,0 +1,89 @@
+# Import standard library modules
+import asyncio
+import os
+import threading
+
+# Import third-party modules
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+# Async drivers used for each synchronous database backend
+ASYNC_DRIVERS = {
+    "postgresql": "asyncpg",
+    "sqlite": "aiosqlite",
+}
+
+# Convert a synchronous database URL into its async-driver equivalent
+def async_database_url(url):
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver is configured for '{backend}' databases.")
+    return url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}")
+
+# Manages the optional async SQLAlchemy engine used by async view functions
+class AsyncDatabase:
+    def __init__(self):
+        self.enabled = False
+        self.url = None
+        self.pool_size = 10
+        self._engine = None
+        self._session_factory = None
+        self._loop = None
+        self._lock = threading.Lock()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork_in_child)
+
+    def init_app(self, app):
+        # Async mode is opt-in so the default deployment stays fully synchronous
+        self.enabled = os.environ.get("ASYNC_MODE", "").lower() in ("1", "true", "yes")
+        if not self.enabled:
+            return
+        self.url = os.environ.get("ASYNC_DATABASE_URL") or async_database_url(
+            app.config["SQLALCHEMY_DATABASE_URI"]
+        )
+        self.pool_size = int(os.environ.get("ASYNC_POOL_SIZE", 10))
+        # Run async views on this process's event loop instead of a new loop per request
+        app.async_to_sync = self.async_to_sync
+
+    def _start_loop(self):
+        # One event loop per process, on a daemon thread, shared by every request thread.
+        # Pooled async connections belong to this loop, so they are reused across requests.
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="async-db", daemon=True).start()
+                self._loop = loop
+        return self._loop
+
+    def async_to_sync(self, func):
+        # Used as app.async_to_sync: the request thread waits while the coroutine runs on the
+        # shared loop. The request's context variables are copied, so request and current_app work.
+        def run(*args, **kwargs):
+            future = asyncio.run_coroutine_threadsafe(func(*args, **kwargs), self._start_loop())
+            return future.result()
+        return run
+
+    def session(self):
+        # Return a new AsyncSession; each concurrent query needs its own session
+        if self._session_factory is None:
+            # Imported lazily so the async extras are only required in async mode
+            from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+            # Only ever called on the shared loop, so the pool never hands a connection to another loop.
+            # The pool class is explicit because aiosqlite would otherwise default to NullPool.
+            self._engine = create_async_engine(
+                self.url, poolclass=AsyncAdaptedQueuePool, pool_size=self.pool_size, max_overflow=self.pool_size
+            )
+            self._session_factory = async_sessionmaker(self._engine, expire_on_commit=False)
+        return self._session_factory()
+
+    def _after_fork_in_child(self):
+        # The loop thread and its pooled connections stay in the parent; the worker starts its own
+        self._lock = threading.Lock()
+        self._loop = None
+        self._engine = None
+        self._session_factory = None
+
+# Shared async database instance used by create_app and the async views
+async_db = AsyncDatabase()
@@ -0,0 +1,226 @@
+# Import standard library modules
+import atexit
+import os
+import queue
+import threading
+import time
+from datetime import date, datetime
+
+# Import third-party modules
+from flask import has_request_context
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import event, inspect, insert
+
+# Import local modules
+from models.audit_log import AuditLog
+
+# Bookkeeping columns left out of audit diffs
+IGNORED_COLUMNS = {"updated_at", "row_version"}
+# Placeholder stored instead of the value of redacted columns (e.g. password hashes)
+REDACTED = "[redacted]"
+# What to do when the buffer is full: wait for room ("block") or discard the entry ("drop")
+BACKPRESSURE_POLICIES = ("block", "drop")
+
+# Convert a column value into something JSON can store
+def audit_value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+# Return the ID of the authenticated user, if the current request has one
+def current_actor_id():
+    if not has_request_context():
+        return None
+    try:
+        identity = get_jwt_identity()
+    except RuntimeError:
+        # The view does not use @jwt_required (e.g. register or login)
+        return None
+    return int(identity) if identity is not None else None
+
+# Build {"column": [before, after]} for an ORM object taking part in a flush
+def object_changes(obj, operation):
+    state = inspect(obj)
+    redacted = getattr(obj, "__audit_redact__", ())
+    changes = {}
+    for attr in state.mapper.column_attrs:
+        name = attr.key
+        if name in IGNORED_COLUMNS:
+            continue
+        history = state.attrs[name].history
+        if operation == "update":
+            if not history.has_changes():
+                continue
+            before = history.deleted[0] if history.deleted else None
+            after = history.added[0] if history.added else None
+        else:
+            value = state.attrs[name].value
+            before, after = (None, value) if operation == "create" else (value, None)
+        if name in redacted:
+            before = REDACTED if before is not None else None
+            after = REDACTED if after is not None else None
+        changes[name] = [audit_value(before), audit_value(after)]
+    return changes
+
+# Captures audited changes at flush and writes them behind the request from a bounded buffer
+class AuditLogWriter:
+    def __init__(self):
+        self.batch_size = 500
+        self.flush_interval = 1.0
+        self.policy = "block"
+        self.block_timeout = 5.0
+        # Entries lost to a full buffer or a failed write; changed from request threads and the flusher
+        self.dropped = 0
+        self._dropped_lock = threading.Lock()
+        self._app = None
+        self._db = None
+        self._queue = None
+        self._thread = None
+        self._stopping = False
+        self._write_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+
+    def init_app(self, app, db):
+        # AUDIT_BUFFER_SIZE bounds memory; AUDIT_BACKPRESSURE chooses what happens when it is full
+        self.batch_size = int(os.environ.get("AUDIT_BATCH_SIZE", 500))
+        self.flush_interval = float(os.environ.get("AUDIT_FLUSH_INTERVAL", 1.0))
+        self.policy = os.environ.get("AUDIT_BACKPRESSURE", "block").lower()
+        if self.policy not in BACKPRESSURE_POLICIES:
+            raise ValueError(f"AUDIT_BACKPRESSURE must be one of {', '.join(BACKPRESSURE_POLICIES)}.")
+        self.block_timeout = float(os.environ.get("AUDIT_BLOCK_TIMEOUT", 5.0))
+        self._queue = queue.Queue(maxsize=int(os.environ.get("AUDIT_BUFFER_SIZE", 10000)))
+        self._app = app
+        self._db = db
+
+        session_class = db.session.session_factory.class_
+        event.listen(session_class, "after_flush", self._after_flush)
+        event.listen(session_class, "after_commit", self._after_commit)
+        event.listen(session_class, "after_rollback", self._after_rollback)
+        # Whatever is still buffered is written before the interpreter exits
+        atexit.register(self.shutdown)
+
+    def record(self, session, entity, entity_id, operation, changes):
+        # Stage an entry on the session; it is only buffered, and timestamped, once the transaction commits
+        session.info.setdefault("audit_entries", []).append({
+            "actor_id": current_actor_id(),
+            "entity": entity,
+            "entity_id": entity_id,
+            "operation": operation,
+            "changes": changes,
+        })
+
+    def _after_flush(self, session, flush_context):
+        for operation, instances in (
+            ("create", session.new),
+            ("update", [obj for obj in session.dirty if session.is_modified(obj)]),
+            ("delete", session.deleted),
+        ):
+            for obj in instances:
+                entity = getattr(obj, "__audit_entity__", None)
+                if entity is None:
+                    continue
+                changes = object_changes(obj, operation)
+                if operation == "update" and not changes:
+                    continue
+                self.record(
+                    session, entity,
+                    inspect(obj).mapper.primary_key_from_instance(obj)[0],
+                    operation, changes
+                )
+
+    def _after_commit(self, session):
+        # A session joined to an outer transaction (a transactional batch) only released a savepoint;
+        # its owner calls commit_entries once the outer transaction commits
+        if session.info.get("outer_transaction"):
+            return
+        self.commit_entries(session)
+
+    def commit_entries(self, session):
+        # Buffer the entries staged on a session whose changes are now committed, stamped with the commit time
+        committed_at = datetime.utcnow()
+        for entry in session.info.pop("audit_entries", []):
+            entry["created_at"] = committed_at
+            self._enqueue(entry)
+
+    def _after_rollback(self, session):
+        # Rolled-back changes never happened, so their entries are discarded
+        session.info.pop("audit_entries", None)
+
+    def _enqueue(self, entry):
+        self._start_flusher()
+        try:
+            if self.policy == "block":
+                # Slow the request down rather than lose the entry, up to the timeout
+                self._queue.put(entry, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(entry)
+        except queue.Full:
+            self._count_dropped(1)
+            self._app.logger.error(
+                "Audit buffer is full; dropped %s entry for %s %s.",
+                entry["operation"], entry["entity"], entry["entity_id"]
+            )
+
+    def _start_flusher(self):
+        # Started on first use so forked worker processes each get their own thread
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="audit-flusher", daemon=True)
+                self._thread.start()
+
+    def _drain(self, first=None):
+        # Take up to batch_size buffered entries without waiting
+        batch = [] if first is None else [first]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        # One multi-row INSERT per batch, retried a few times before giving up
+        for attempt in range(3):
+            try:
+                with self._app.app_context():
+                    with self._db.engine.begin() as connection:
+                        connection.execute(insert(AuditLog.__table__), batch)
+                return
+            except Exception:
+                self._app.logger.exception("Writing %s audit entries failed (attempt %s).", len(batch), attempt + 1)
+                time.sleep(attempt + 1)
+        self._count_dropped(len(batch))
+
+    def _count_dropped(self, count):
+        # Not _write_lock: a request that drops an entry must not wait for a write in progress
+        with self._dropped_lock:
+            self.dropped += count
+
+    def _run(self):
+        while not self._stopping:
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            with self._write_lock:
+                self._write(self._drain(first))
+
+    def flush(self):
+        # Write everything buffered so far from the calling thread
+        with self._write_lock:
+            while True:
+                batch = self._drain()
+                if not batch:
+                    return
+                self._write(batch)
+
+    def shutdown(self):
+        # Stop the flusher, let it finish its current batch, then write the remaining entries
+        self._stopping = True
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout=self.flush_interval + 10)
+        if self._queue is not None:
+            self.flush()
+
+# Shared audit writer instance used by create_app and the bulk car routes
+audit_log = AuditLogWriter()
@@ -0,0 +1,38 @@
+# Import standard library modules
+import threading
+import time
+
+# Simple thread-safe, in-process cache where every entry expires after a fixed TTL
+class TTLCache:
+    def __init__(self, ttl=30, max_entries=1024):
+        # Number of seconds an entry stays valid
+        self.ttl = ttl
+        # Upper bound on stored entries so unbounded keys cannot grow memory
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        # Return the cached value, or None if it is missing or expired
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            return value
+
+    def set(self, key, value):
+        # Store a value, evicting the entry closest to expiry when the cache is full
+        with self._lock:
+            if key not in self._entries and len(self._entries) >= self.max_entries:
+                oldest_key = min(self._entries, key=lambda k: self._entries[k][0])
+                del self._entries[oldest_key]
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+
+    def clear(self):
+        # Drop every cached entry (used when underlying data changes)
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,115 @@
+# Import standard library modules
+import os
+import zlib
+
+# Import third-party modules
+from flask import request
+
+# Brotli is optional; without it only gzip is offered
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Response mimetypes worth compressing (event streams are left alone so each event is sent immediately)
+COMPRESSIBLE_MIMETYPES = {
+    "application/json",
+    "application/msgpack",
+    "application/x-msgpack",
+    "text/csv",
+    "text/html",
+    "text/plain",
+}
+
+# Status codes whose responses never carry a body to compress
+UNCOMPRESSED_STATUS_CODES = {204, 206, 304}
+
+# Remove the "-gzip"/"-br" suffix that compression adds to ETags
+def strip_encoding_suffix(etag):
+    for encoding in ("gzip", "br"):
+        suffix = f"-{encoding}"
+        if etag.endswith(suffix):
+            return etag[:-len(suffix)]
+    return etag
+
+# Negotiates and applies gzip or brotli Content-Encoding to outgoing responses
+class Compressor:
+    def __init__(self):
+        self.min_size = 1024
+        self.gzip_level = 6
+        self.brotli_level = 4
+
+    def init_app(self, app):
+        self.min_size = int(os.environ.get("COMPRESS_MIN_SIZE", 1024))
+        self.gzip_level = int(os.environ.get("COMPRESS_GZIP_LEVEL", 6))
+        self.brotli_level = int(os.environ.get("COMPRESS_BROTLI_LEVEL", 4))
+        app.after_request(self._after_request)
+
+    def _choose_encoding(self, request):
+        # Prefer brotli when the client accepts it equally or more than gzip
+        offered = ["br", "gzip"] if brotli is not None else ["gzip"]
+        return request.accept_encodings.best_match(offered)
+
+    def _make_compressor(self, encoding):
+        # Return (compress, flush) callables for an incremental compressor
+        if encoding == "br":
+            compressor = brotli.Compressor(quality=self.brotli_level)
+            return compressor.process, compressor.finish
+        compressor = zlib.compressobj(self.gzip_level, zlib.DEFLATED, 31)
+        return compressor.compress, compressor.flush
+
+    def _compress_stream(self, chunks, encoding):
+        # Compress a streamed body chunk by chunk instead of buffering it
+        compress, finish = self._make_compressor(encoding)
+        try:
+            for chunk in chunks:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode("utf-8")
+                data = compress(chunk)
+                if data:
+                    yield data
+            yield finish()
+        finally:
+            if hasattr(chunks, "close"):
+                chunks.close()
+
+    def _after_request(self, response):
+        if (
+            response.status_code < 200
+            or response.status_code in UNCOMPRESSED_STATUS_CODES
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES
+            or "Content-Encoding" in response.headers
+            or request.method == "HEAD"
+        ):
+            return response
+
+        # The representation depends on Accept-Encoding even when left uncompressed
+        response.vary.add("Accept-Encoding")
+
+        encoding = self._choose_encoding(request)
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            # Streamed bodies have unknown length, so they are always compressed
+            response.response = self._compress_stream(response.response, encoding)
+            response.direct_passthrough = False
+            response.headers.pop("Content-Length", None)
+        else:
+            body = response.get_data()
+            if len(body) < self.min_size:
+                return response
+            compress, finish = self._make_compressor(encoding)
+            response.set_data(compress(body) + finish())
+
+        response.headers["Content-Encoding"] = encoding
+
+        # A compressed body is a different representation, so it needs its own ETag.
+        # If-None-Match is answered afterwards by ConditionalResponses, against this suffixed ETag
+        etag, weak = response.get_etag()
+        if etag:
+            response.set_etag(f"{etag}-{encoding}", weak=weak)
+        return response
+
+# Shared compressor instance used by create_app
+compressor = Compressor()
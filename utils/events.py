@@ -0,0 +1,120 @@
+# Import standard library modules
+import json
+import os
+import queue
+import secrets
+import threading
+from collections import deque
+
+# A single client's bounded event buffer
+class Subscriber:
+    def __init__(self, buffer_size):
+        self.queue = queue.Queue(maxsize=buffer_size)
+        # Set when the client fell too far behind and must reconnect to resume
+        self.overflowed = False
+
+# In-process publish/subscribe broker that keeps recent events for resumption
+class EventBroker:
+    def __init__(self, history_size=1000, buffer_size=100):
+        self.buffer_size = buffer_size
+        self._history = deque(maxlen=history_size)
+        self._subscribers = set()
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._reset_stream()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork_in_child)
+
+    def _reset_stream(self):
+        # Event ids are "<stream id>-<sequence>". Sequences are per process, so the random stream id
+        # lets a reconnect that lands on another worker, or a restarted one, be detected and reset
+        self._stream_id = secrets.token_hex(4)
+        self._next_id = 1
+        self._history.clear()
+
+    def _after_fork_in_child(self):
+        # Workers forked from one parent must not share a stream id; parent subscribers stay there
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._reset_stream()
+
+    def publish(self, event, data):
+        # Assign the next event id, remember the event, and fan it out to every subscriber
+        with self._lock:
+            sequence = self._next_id
+            message = (f"{self._stream_id}-{sequence}", event, data)
+            self._next_id += 1
+            self._history.append((sequence, message))
+            subscribers = list(self._subscribers)
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener(event, data)
+        for subscriber in subscribers:
+            try:
+                subscriber.queue.put_nowait(message)
+            except queue.Full:
+                # Never block the publisher on a slow client
+                subscriber.overflowed = True
+
+    def subscribe(self, last_event_id=None):
+        # Register a subscriber and return it with the events it missed since last_event_id
+        subscriber = Subscriber(self.buffer_size)
+        with self._lock:
+            self._subscribers.add(subscriber)
+            if last_event_id is None:
+                return subscriber, []
+
+            stream_id, _, sequence = last_event_id.rpartition("-")
+            if stream_id != self._stream_id or not sequence.isdigit():
+                # The id comes from another worker or an earlier process, so its position is unknown here
+                return subscriber, [(None, "reset", {})]
+            sequence = int(sequence)
+            oldest_id = self._history[0][0] if self._history else self._next_id
+            if sequence >= self._next_id or sequence + 1 < oldest_id:
+                # The requested position is no longer retained
+                return subscriber, [(None, "reset", {})]
+            return subscriber, [message for number, message in self._history if number > sequence]
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def add_listener(self, listener):
+        # Register an in-process callback(event, data); it runs on the publisher's thread so must not block
+        with self._lock:
+            self._listeners.append(listener)
+
+# Format an event in the Server-Sent Events wire format
+def format_sse(event_id, event, data):
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+# Stream events to one client, replaying missed events first and sending heartbeats
+def stream_events(broker, last_event_id=None, heartbeat_seconds=15):
+    subscriber, replay = broker.subscribe(last_event_id)
+    try:
+        # Ask clients to wait three seconds before reconnecting
+        yield "retry: 3000\n\n"
+        for message in replay:
+            yield format_sse(*message)
+        while not subscriber.overflowed:
+            try:
+                message = subscriber.queue.get(timeout=heartbeat_seconds)
+            except queue.Empty:
+                # Comment lines keep idle connections open through proxies
+                yield ": heartbeat\n\n"
+                continue
+            yield format_sse(*message)
+        # The buffer overflowed: end the stream so the client resumes from its last event id
+    finally:
+        broker.unsubscribe(subscriber)
+
+# Shared broker for listing status changes and new listings
+listing_events = EventBroker(
+    history_size=int(os.environ.get("SSE_HISTORY_SIZE", 1000)),
+    buffer_size=int(os.environ.get("SSE_CLIENT_BUFFER", 100))
+)
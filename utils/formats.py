@@ -0,0 +1,70 @@
+# Import standard library modules
+from datetime import date
+
+# Import third-party modules
+from flask import has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+
+# MessagePack is optional; without it every response stays JSON
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Media types offered for API responses, in order of preference when the client has none
+JSON_MIMETYPE = "application/json"
+MSGPACK_MIMETYPES = ("application/msgpack", "application/x-msgpack")
+
+# Suffix added to the ETag of a MessagePack response, as it is a different representation
+MSGPACK_ETAG_SUFFIX = "-msgpack"
+
+# Remove the "-msgpack" suffix that negotiation adds to ETags
+def strip_format_suffix(etag):
+    if etag.endswith(MSGPACK_ETAG_SUFFIX):
+        return etag[:-len(MSGPACK_ETAG_SUFFIX)]
+    return etag
+
+# Return the MessagePack media type the client prefers over `default`, or None
+def negotiate_msgpack(default=JSON_MIMETYPE):
+    if msgpack is None or not has_request_context():
+        return None
+    match = request.accept_mimetypes.best_match((default,) + MSGPACK_MIMETYPES, default=default)
+    return match if match in MSGPACK_MIMETYPES else None
+
+# Convert values MessagePack has no type for, e.g. dates in streamed export rows
+def msgpack_default(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} cannot be packed.")
+
+# JSON provider that serializes jsonify() and returned dicts as MessagePack when the client asks for it
+class NegotiatingJSONProvider(DefaultJSONProvider):
+    def response(self, *args, **kwargs):
+        mimetype = negotiate_msgpack()
+        if mimetype is None:
+            return super().response(*args, **kwargs)
+        # Same payload as the JSON response, just packed: the view's schema output is unchanged
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(msgpack.packb(obj, default=self.default), mimetype=mimetype)
+
+# Negotiates JSON or MessagePack responses from the Accept header
+class ResponseFormats:
+    def init_app(self, app):
+        # Must run after the compressor is set up: after_request hooks run in reverse order,
+        # so the "-msgpack" ETag suffix is added before any "-gzip"/"-br" suffix
+        app.json = NegotiatingJSONProvider(app)
+        app.after_request(self._after_request)
+
+    def _after_request(self, response):
+        # JSON and MessagePack responses depend on Accept even when JSON was chosen
+        if response.mimetype != JSON_MIMETYPE and response.mimetype not in MSGPACK_MIMETYPES:
+            return response
+        response.vary.add("Accept")
+
+        etag, weak = response.get_etag()
+        if etag and response.mimetype in MSGPACK_MIMETYPES:
+            response.set_etag(f"{etag}{MSGPACK_ETAG_SUFFIX}", weak=weak)
+        return response
+
+# Shared response format negotiator used by create_app
+response_formats = ResponseFormats()
@@ -0,0 +1,52 @@
+# Import standard library modules
+import bisect
+import time
+
+# Import third-party modules
+from sqlalchemy import or_
+
+# How long a skipped id keeps being re-read in case its transaction commits late
+GAP_GRACE_SECONDS = 60
+# Most skipped id ranges tracked at once; the highest ranges are kept, as in-flight ids are recent
+MAX_GAPS = 100
+
+# Incremental read position over an autoincrement id column.
+# Ids are assigned at insert but only become visible at commit, so on PostgreSQL a lower id can
+# appear after a higher one was read. Ids skipped over are re-read until they turn up or their
+# grace period runs out, and ids that were read are never selected again.
+class IdCursor:
+    def __init__(self, grace_seconds=GAP_GRACE_SECONDS):
+        self.grace_seconds = grace_seconds
+        self.last_id = 0
+        # [low, high, expires_at] ranges of ids below last_id that have not been read
+        self._gaps = []
+
+    def condition(self, column):
+        # WHERE clause selecting every id that has not been read yet
+        return or_(column > self.last_id, *(column.between(low, high) for low, high, _ in self._gaps))
+
+    def advance(self, ids, now=None):
+        # Record the ids returned by a query built with condition()
+        now = time.monotonic() if now is None else now
+        ids = sorted(set(ids))
+
+        # Split the open gaps around the ids that turned up, and drop expired ones
+        gaps = []
+        for low, high, expires_at in self._gaps:
+            if expires_at <= now:
+                continue
+            for found in ids[bisect.bisect_left(ids, low):bisect.bisect_right(ids, high)]:
+                if found > low:
+                    gaps.append([low, found - 1, expires_at])
+                low = found + 1
+            if low <= high:
+                gaps.append([low, high, expires_at])
+
+        # Ids skipped above the old position open new gaps
+        previous = self.last_id
+        for found in ids[bisect.bisect_right(ids, previous):]:
+            if found > previous + 1:
+                gaps.append([previous + 1, found - 1, now + self.grace_seconds])
+            previous = found
+        self.last_id = previous
+        self._gaps = sorted(gaps)[-MAX_GAPS:]
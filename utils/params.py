@@ -0,0 +1,60 @@
+# Import standard library modules
+import os
+
+# Import third-party modules
+from flask import request
+from marshmallow import ValidationError
+
+# Import local modules
+from init import db
+
+# Maximum number of ids accepted by a batch lookup
+MAX_BATCH_IDS = int(os.environ.get("MAX_BATCH_IDS", 100))
+
+# Default and maximum page sizes for paginated endpoints
+DEFAULT_PER_PAGE = 20
+MAX_PER_PAGE = 100
+
+# Parse a comma-separated id list, keeping request order and dropping duplicates
+def parse_id_list(value, field_name="ids", max_ids=MAX_BATCH_IDS):
+    ids = []
+    seen = set()
+    for part in value.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if not part.isdigit():
+            raise ValidationError({field_name: ["Ids must be positive integers."]})
+        id = int(part)
+        if id not in seen:
+            seen.add(id)
+            ids.append(id)
+    if not ids:
+        raise ValidationError({field_name: ["At least one id is required."]})
+    if len(ids) > max_ids:
+        raise ValidationError({field_name: [f"At most {max_ids} ids may be requested at once."]})
+    return ids
+
+# Order fetched objects to match the requested ids and report the ids that were not found
+def order_by_ids(objects, ids, primary_key):
+    by_id = {getattr(obj, primary_key): obj for obj in objects}
+    found = [by_id[id] for id in ids if id in by_id]
+    missing = [id for id in ids if id not in by_id]
+    return found, missing
+
+# Paginate a select statement from the page/per_page query parameters and serialize the page
+def paginated_response(statement, schema):
+    page = db.paginate(
+        statement,
+        page=request.args.get('page', 1, type=int),
+        per_page=request.args.get('per_page', DEFAULT_PER_PAGE, type=int),
+        max_per_page=MAX_PER_PAGE,
+        error_out=False
+    )
+    return {
+        'items': schema.dump(page.items),
+        'page': page.page,
+        'per_page': page.per_page,
+        'total': page.total,
+        'pages': page.pages
+    }
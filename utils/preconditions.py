@@ -0,0 +1,85 @@
+# Import standard library modules
+import hashlib
+import os
+
+# Import third-party modules
+from flask import jsonify, request
+
+# Import local modules
+from utils.compression import strip_encoding_suffix
+from utils.formats import strip_format_suffix
+
+# When enabled, updates without an If-Match header are rejected instead of overwriting blindly
+REQUIRE_IF_MATCH = os.environ.get("REQUIRE_IF_MATCH", "").lower() in ("1", "true", "yes")
+
+# Return response headers carrying a versioned row's ETag
+def etag_header(obj):
+    return {"ETag": f'"{obj.row_version}"'}
+
+# Return the row_version an ETag names, ignoring its body hash and representation suffixes
+def etag_version(etag):
+    return strip_format_suffix(strip_encoding_suffix(etag)).split(".", 1)[0]
+
+# Return the 412 response sent when a write is based on an outdated version
+def precondition_failed(obj=None):
+    response = jsonify({"error": "This resource has been changed by another request. Fetch it again and retry."})
+    return (response, 412, etag_header(obj)) if obj is not None else (response, 412)
+
+# Check the If-Match header against a loaded row; return an error response, or None to proceed
+def check_if_match(obj):
+    if not request.if_match:
+        if REQUIRE_IF_MATCH:
+            return jsonify({"error": "An If-Match header with the resource's ETag is required."}), 428
+        return None
+    if request.if_match.star_tag:
+        return None
+    # Clients may echo the "-msgpack"/"-gzip"/"-br" ETag of another representation; it names the same version
+    etags = {etag_version(etag) for etag in request.if_match.as_set()}
+    if str(obj.row_version) in etags:
+        return None
+    return precondition_failed(obj)
+
+# Appends a hash of the body to the ETag of successful responses (detail GETs and updates alike).
+# row_version only changes when the row itself is updated, but responses also embed related rows
+# (listings, transactions, make/model/year); with the hash, If-None-Match only matches an identical
+# body. If-Match still compares the row_version part alone.
+class ETagHasher:
+    def init_app(self, app):
+        # Must be set up after the format negotiator and the compressor: after_request hooks run
+        # in reverse order, so the hash is appended before the "-msgpack" and "-gzip"/"-br" suffixes
+        app.after_request(self._after_request)
+
+    def _after_request(self, response):
+        etag, weak = response.get_etag()
+        if not etag or response.status_code != 200 or response.is_streamed:
+            return response
+        digest = hashlib.blake2b(response.get_data(), digest_size=8).hexdigest()
+        response.set_etag(f"{etag}.{digest}", weak=weak)
+        return response
+
+# Answers GET and HEAD requests whose If-None-Match matches the final ETag with 304 Not Modified.
+# Compressed, MessagePack and identity responses are all revalidated here, against the ETag of the
+# representation actually sent, so it must run after every hook that changes the ETag
+class ConditionalResponses:
+    def init_app(self, app):
+        # Must be set up before the compressor: after_request hooks run in reverse order, so this runs last
+        app.after_request(self._after_request)
+
+    def _after_request(self, response):
+        if request.method not in ("GET", "HEAD") or response.status_code != 200:
+            return response
+        etag, _ = response.get_etag()
+        if not etag or not request.if_none_match.contains_weak(etag):
+            return response
+        # The 304 keeps the ETag and Vary headers, but carries no body
+        response.status_code = 304
+        response.response = []
+        for header in ("Content-Encoding", "Content-Length", "Content-Type"):
+            response.headers.pop(header, None)
+        return response
+
+# Shared ETag hasher instance used by create_app
+etag_hasher = ETagHasher()
+
+# Shared revalidation hook used by create_app
+conditional_responses = ConditionalResponses()
@@ -0,0 +1,74 @@
+# Import standard library modules
+import json
+import re
+import threading
+
+# Import third-party modules
+from sqlalchemy import event
+
+# Statements that manage the session rather than query data are not counted against budgets
+UNCOUNTED_PREFIXES = ("SET ", "SAVEPOINT", "RELEASE", "ROLLBACK", "BEGIN", "COMMIT")
+# Statements that find rows are explained; EXPLAIN without ANALYZE plans an UPDATE or DELETE without running it
+EXPLAINED_PREFIXES = ("SELECT", "WITH", "UPDATE", "DELETE")
+
+# "FROM cars AS cars_1" / "JOIN listings l": maps the alias SQLite reports back to its table
+TABLE_ALIAS_PATTERN = re.compile(r'\b(?:FROM|JOIN)\s+"?(\w+)"?(?:\s+(?:AS\s+)?"?(\w+)"?)?', re.IGNORECASE)
+# A SQLite full table scan is reported as "SCAN <name>" (SQLite 3.36+) or "SCAN TABLE <name>" (older);
+# "SCAN <name> USING ... INDEX" is not sequential
+SQLITE_SCAN_PATTERN = re.compile(r"^SCAN (?:TABLE )?(\w+)$")
+
+# Records every statement the current thread executes on the given engines while active.
+# Statements of background threads (e.g. the audit log flusher) are not charged to the request
+class StatementRecorder:
+    def __init__(self, engines):
+        self.engines = list(engines)
+        self.statements = []
+        self._thread_id = None
+
+    def __enter__(self):
+        self._thread_id = threading.get_ident()
+        for engine in self.engines:
+            event.listen(engine, "before_cursor_execute", self._record)
+        return self
+
+    def __exit__(self, *exc_info):
+        for engine in self.engines:
+            event.remove(engine, "before_cursor_execute", self._record)
+
+    def _record(self, connection, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() != self._thread_id:
+            return
+        if not statement.lstrip().upper().startswith(UNCOUNTED_PREFIXES):
+            self.statements.append((connection.engine, statement, parameters))
+
+# Return the names of the tables a statement reads with a sequential scan
+def sequential_scans(connection, statement, parameters):
+    if not statement.lstrip().upper().startswith(EXPLAINED_PREFIXES):
+        return set()
+    if connection.dialect.name == "postgresql":
+        plan = connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters).scalar()
+        # psycopg2 decodes the json column; other drivers return it as text
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return postgresql_scans(plan[0]["Plan"])
+
+    # SQLite reports aliases, so resolve them through the statement's FROM and JOIN clauses
+    aliases = {}
+    for table, alias in TABLE_ALIAS_PATTERN.findall(statement):
+        aliases[table] = table
+        if alias and alias.upper() not in ("ON", "WHERE", "JOIN", "LEFT", "INNER", "OUTER", "GROUP", "ORDER", "LIMIT"):
+            aliases[alias] = table
+    scans = set()
+    for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters):
+        match = SQLITE_SCAN_PATTERN.match(row[-1])
+        if match:
+            scans.add(aliases.get(match.group(1), match.group(1)))
+    return scans
+
+# Walk a PostgreSQL JSON plan and collect the relations read by Seq Scan nodes.
+# Parallel scans are "Seq Scan" nodes too, and InitPlans and SubPlans are nested under "Plans"
+def postgresql_scans(plan):
+    scans = {plan["Relation Name"]} if plan.get("Node Type") == "Seq Scan" else set()
+    for child in plan.get("Plans", []):
+        scans |= postgresql_scans(child)
+    return scans
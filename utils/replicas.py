@@ -0,0 +1,172 @@
+# Import standard library modules
+import itertools
+import os
+import threading
+import time
+
+# Import third-party modules
+from flask import g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from itsdangerous import BadSignature, URLSafeSerializer
+from sqlalchemy import event
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import DBAPIError
+
+# HTTP methods that never write and can therefore be served by a replica
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+# Cookie, and equivalent request/response header, carrying the signed "read from the primary until" time
+STICKY_COOKIE = "primary_until"
+STICKY_HEADER = "X-Primary-Until"
+
+# Routes safe reads to read replicas and everything else to the primary database
+class ReplicaRouter:
+    def __init__(self):
+        # Bind keys of the configured replicas (empty means routing is disabled)
+        self.replica_keys = []
+        # Seconds a user's reads stay on the primary after they write
+        self.sticky_seconds = 5
+        # Seconds a failing replica is taken out of rotation
+        self.eject_seconds = 30
+        self._counter = itertools.count()
+        self._ejected_until = {}
+        self._serializer = None
+        self._watched_engines = set()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        # Replicas are configured as a comma-separated list of database URLs
+        urls = [
+            url.strip()
+            for url in os.environ.get("REPLICA_DATABASE_URLS", "").split(",")
+            if url.strip()
+        ]
+        self.sticky_seconds = float(os.environ.get("REPLICA_STICKY_SECONDS", 5))
+        self.eject_seconds = float(os.environ.get("REPLICA_EJECT_SECONDS", 30))
+        if not urls:
+            return
+
+        # Register each replica as a Flask-SQLAlchemy bind (no models use these keys)
+        self.replica_keys = [f"replica_{index}" for index in range(len(urls))]
+        binds = app.config.setdefault("SQLALCHEMY_BINDS", {})
+        binds.update(dict(zip(self.replica_keys, urls)))
+
+        # The sticky window travels with the client, so it holds whichever worker serves the next read
+        self._serializer = URLSafeSerializer(app.config["SECRET_KEY"], salt="replica-sticky")
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def _sticky_until(self):
+        # Return the "primary until" wall-clock time the client sent back, or None if absent or forged
+        token = request.headers.get(STICKY_HEADER) or request.cookies.get(STICKY_COOKIE)
+        if not token:
+            return None
+        try:
+            return float(self._serializer.loads(token))
+        except (BadSignature, TypeError, ValueError):
+            return None
+
+    def _before_request(self):
+        # Decide once per request whether reads may go to a replica
+        g.read_from_primary = request.method not in SAFE_METHODS
+        if g.read_from_primary:
+            return
+
+        # Keep clients that have just written on the primary to read their own writes
+        sticky_until = self._sticky_until()
+        if sticky_until is not None and sticky_until > time.time():
+            g.read_from_primary = True
+
+    def _after_request(self, response):
+        # After a successful write, send the client a signed time until which its reads use the primary
+        if request.method in SAFE_METHODS or response.status_code >= 400:
+            return response
+        token = self._serializer.dumps(time.time() + self.sticky_seconds)
+        response.set_cookie(
+            STICKY_COOKIE, token, max_age=max(int(self.sticky_seconds), 1), httponly=True, samesite="Lax"
+        )
+        # Clients without a cookie jar can echo the header instead
+        response.headers[STICKY_HEADER] = token
+        return response
+
+    def should_use_replica(self):
+        # Only reads made while handling a safe request are eligible
+        return (
+            bool(self.replica_keys)
+            and has_request_context()
+            and not g.get("read_from_primary", True)
+        )
+
+    def pick_replica(self, engines):
+        # Return the next healthy replica engine in round-robin order, or None
+        now = time.monotonic()
+        for _ in range(len(self.replica_keys)):
+            key = self.replica_keys[next(self._counter) % len(self.replica_keys)]
+            if self._ejected_until.get(key, 0) > now:
+                continue
+            engine = engines[key]
+            self._watch(key, engine)
+            return engine
+        return None
+
+    def _watch(self, key, engine):
+        # Eject a replica from rotation when its connection fails
+        if id(engine) in self._watched_engines:
+            return
+        with self._lock:
+            if id(engine) in self._watched_engines:
+                return
+
+            def on_error(context):
+                # Timeouts, constraint errors and bad queries say nothing about the replica's health.
+                # A lost connection, or a failure while connecting (no connection yet), does
+                if not context.is_disconnect and context.connection is not None:
+                    return
+                self._ejected_until[key] = time.monotonic() + self.eject_seconds
+                if has_request_context():
+                    g.replica_failed = True
+
+            event.listen(engine, "handle_error", on_error)
+            self._watched_engines.add(id(engine))
+
+# Shared router instance used by the session class and create_app
+replica_router = ReplicaRouter()
+
+# Session that sends reads on safe requests to a replica when one is available
+class RoutingSession(Session):
+    def _with_replica_fallback(self, method, *args, **kwargs):
+        # Retry a read once on the primary when the replica it ran on lost its connection
+        try:
+            return method(*args, **kwargs)
+        except DBAPIError:
+            if not has_request_context() or not g.pop("replica_failed", False):
+                raise
+            # Only reads ran on this session, so rolling back discards nothing
+            self.rollback()
+            g.replica_engine = None
+            g.read_from_primary = True
+            return method(*args, **kwargs)
+
+    def execute(self, *args, **kwargs):
+        return self._with_replica_fallback(super().execute, *args, **kwargs)
+
+    def scalars(self, *args, **kwargs):
+        return self._with_replica_fallback(super().scalars, *args, **kwargs)
+
+    def scalar(self, *args, **kwargs):
+        return self._with_replica_fallback(super().scalar, *args, **kwargs)
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        # A session opened on a connection (a transactional batch) runs everything on that connection
+        if bind is None and isinstance(self.bind, Connection):
+            return self.bind
+        # Flushes always write, so they must go to the primary
+        if bind is None and not self._flushing and replica_router.should_use_replica():
+            # Pin one replica per request so all of its reads see the same snapshot
+            engine = g.get("replica_engine")
+            if engine is None:
+                engine = replica_router.pick_replica(self._db.engines)
+                g.replica_engine = engine
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
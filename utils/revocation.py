@@ -0,0 +1,155 @@
+# Import standard library modules
+import hashlib
+import math
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+# Import third-party modules
+from flask import g, has_request_context
+from sqlalchemy import delete, insert, select
+
+# Import local modules
+from models.revoked_token import RevokedToken
+from utils.id_cursor import IdCursor
+
+# Fixed-size Bloom filter over strings; it can return false positives but never false negatives
+class BloomFilter:
+    def __init__(self, capacity, error_rate):
+        # Size the bit array and hash count for the expected number of entries
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        # Derive every bit position from two 64-bit hashes (double hashing)
+        digest = hashlib.blake2b(value.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * second) % self.size for i in range(self.hash_count)]
+
+    def add(self, value):
+        for position in self._positions(value):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+# Durable JTI denylist with an in-process Bloom filter in front of the database
+class TokenDenylist:
+    def __init__(self):
+        self.capacity = 100000
+        self.error_rate = 0.001
+        self.refresh_seconds = 5
+        self.rebuild_seconds = 3600
+        self._db = None
+        self._bloom = None
+        self._entries = 0
+        self._cursor = IdCursor()
+        self._built_at = None
+        self._refreshed_at = None
+        # Tokens revoked by this process since the current refresh started
+        self._recent = []
+        # _lock guards the filter; _refresh_lock lets only one thread query the database at a time
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def init_app(self, app, jwt, db):
+        # REVOCATION_REFRESH_SECONDS bounds how long other processes take to see a logout
+        self.capacity = int(os.environ.get("REVOCATION_BLOOM_CAPACITY", 100000))
+        self.error_rate = float(os.environ.get("REVOCATION_BLOOM_ERROR_RATE", 0.001))
+        self.refresh_seconds = float(os.environ.get("REVOCATION_REFRESH_SECONDS", 5))
+        self.rebuild_seconds = float(os.environ.get("REVOCATION_REBUILD_SECONDS", 3600))
+        self._db = db
+        jwt.token_in_blocklist_loader(self._is_revoked)
+
+    def revoke(self, jti, expires_at):
+        # Record the revocation durably, then make it visible to this process immediately
+        now = datetime.utcnow()
+        with self._db.engine.begin() as connection:
+            connection.execute(insert(RevokedToken).values(jti=jti, expires_at=expires_at, revoked_at=now))
+            # Rows of tokens that have expired anyway are no longer needed
+            connection.execute(delete(RevokedToken).where(RevokedToken.expires_at < now))
+        with self._lock:
+            if self._bloom is not None:
+                self._bloom.add(jti)
+            self._recent.append(jti)
+
+    def _is_revoked(self, jwt_header, jwt_payload):
+        jti = jwt_payload["jti"]
+        # Sub-requests of a batch carry this key over from its g, so the batch's token is only looked up once
+        checked = g.setdefault("revocation_checked", {}) if has_request_context() else {}
+        if jti not in checked:
+            checked[jti] = self._lookup(jti)
+        return checked[jti]
+
+    def _lookup(self, jti):
+        self.refresh()
+        # A Bloom filter miss proves the token was never revoked, so no I/O is needed
+        if jti not in self._bloom:
+            return False
+        # A hit may be a false positive, so confirm it against the database
+        with self._db.engine.connect() as connection:
+            return connection.execute(
+                select(RevokedToken.revoked_token_id).where(RevokedToken.jti == jti)
+            ).first() is not None
+
+    def refresh(self):
+        now = time.monotonic()
+        if self._refreshed_at is not None and now - self._refreshed_at < self.refresh_seconds:
+            return
+        # While another thread refreshes, keep using the current filter unless there is none yet
+        if not self._refresh_lock.acquire(blocking=self._bloom is None):
+            return
+        try:
+            if self._refreshed_at is not None and now - self._refreshed_at < self.refresh_seconds:
+                return
+            # Entries cannot be removed from a Bloom filter, so rebuild it once it is full, and
+            # periodically as a backstop for revocations that committed after their grace period
+            rebuild = (
+                self._bloom is None or self._entries >= self.capacity
+                or now - self._built_at >= self.rebuild_seconds
+            )
+            with self._lock:
+                self._recent = []
+            cursor = IdCursor() if rebuild else self._cursor
+            statement = select(RevokedToken.revoked_token_id, RevokedToken.jti)
+            if rebuild:
+                statement = statement.where(RevokedToken.expires_at >= datetime.utcnow())
+            else:
+                # Only load revocations not read yet, including lower ids that committed late
+                statement = statement.where(cursor.condition(RevokedToken.revoked_token_id))
+
+            # Query without holding _lock, so token checks never wait on the database
+            with self._db.engine.connect() as connection:
+                rows = connection.execute(statement).all()
+            cursor.advance(revoked_token_id for revoked_token_id, _ in rows)
+
+            if rebuild:
+                bloom = BloomFilter(self.capacity, self.error_rate)
+                for _, jti in rows:
+                    bloom.add(jti)
+                with self._lock:
+                    # Revocations by this process during the query may be missing from its rows
+                    for jti in self._recent:
+                        bloom.add(jti)
+                    self._bloom = bloom
+                    self._entries = len(rows)
+                    self._cursor = cursor
+                self._built_at = now
+            else:
+                with self._lock:
+                    for _, jti in rows:
+                        self._bloom.add(jti)
+                    self._entries += len(rows)
+            self._refreshed_at = now
+        finally:
+            self._refresh_lock.release()
+
+# Convert a JWT 'exp' claim into a naive UTC datetime
+def token_expiry(exp):
+    return datetime.fromtimestamp(exp, tz=timezone.utc).replace(tzinfo=None)
+
+# Shared denylist instance used by create_app and the logout route
+token_denylist = TokenDenylist()
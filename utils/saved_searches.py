@@ -0,0 +1,246 @@
+# Import standard library modules
+import itertools
+import math
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+# Import third-party modules
+from sqlalchemy import insert, literal, select
+
+# Import local modules
+from models.car import Car
+from models.listing import Listing
+from models.makemodelyear import MakeModelYear
+from models.saved_search import SAVED_SEARCH_CRITERIA, SavedSearch, SavedSearchMatch
+from utils.id_cursor import IdCursor
+
+# Equality criteria, combined into the inverted index key (None means "any")
+EQUALITY_CRITERIA = ("make", "model", "condition")
+# Range criteria checked after the price interval lookup
+RANGE_CRITERIA = ("year", "mileage")
+# Maximum ids per IN clause when recording matches
+MATCH_INSERT_CHUNK = 1000
+
+# Static centered interval tree answering "which intervals contain x" in O(log n + k)
+class IntervalTree:
+    def __init__(self, intervals):
+        # intervals is a list of (low, high, item) with inclusive, possibly infinite bounds
+        self._root = self._build(intervals)
+
+    def _build(self, intervals):
+        if not intervals:
+            return None
+        # Split around the median endpoint so each subtree holds at most half the intervals
+        endpoints = sorted(point for low, high, _ in intervals for point in (low, high))
+        center = endpoints[len(endpoints) // 2]
+        left = [interval for interval in intervals if interval[1] < center]
+        right = [interval for interval in intervals if interval[0] > center]
+        overlapping = [interval for interval in intervals if interval[0] <= center <= interval[1]]
+        return (
+            center,
+            sorted(overlapping, key=lambda interval: interval[0]),
+            sorted(overlapping, key=lambda interval: interval[1], reverse=True),
+            self._build(left),
+            self._build(right),
+        )
+
+    def stab(self, x):
+        # Yield the item of every interval containing x
+        node = self._root
+        while node is not None:
+            center, by_low, by_high, left, right = node
+            if x < center:
+                for low, _, item in by_low:
+                    if low > x:
+                        break
+                    yield item
+                node = left
+            elif x > center:
+                for _, high, item in by_high:
+                    if high < x:
+                        break
+                    yield item
+                node = right
+            else:
+                for _, _, item in by_low:
+                    yield item
+                node = None
+
+# Return a criterion value normalised for case-insensitive equality matching
+def normalise(value):
+    return value.lower() if isinstance(value, str) else value
+
+# In-memory index of saved searches for matching one listing without scanning every search
+class SavedSearchIndex:
+    def __init__(self):
+        self._criteria = {}
+        # Inverted index: (make, model, condition) key -> ids of searches with exactly that key
+        self._buckets = defaultdict(set)
+        # Price interval tree per bucket, rebuilt lazily after the bucket changes
+        self._trees = {}
+
+    def __len__(self):
+        return len(self._criteria)
+
+    def add(self, search_id, criteria):
+        key = tuple(normalise(criteria.get(name)) for name in EQUALITY_CRITERIA)
+        self._criteria[search_id] = (key, criteria)
+        self._buckets[key].add(search_id)
+        self._trees.pop(key, None)
+
+    def remove(self, search_id):
+        entry = self._criteria.pop(search_id, None)
+        if entry is None:
+            return
+        key = entry[0]
+        self._buckets[key].discard(search_id)
+        if not self._buckets[key]:
+            del self._buckets[key]
+        self._trees.pop(key, None)
+
+    def _tree(self, key):
+        tree = self._trees.get(key)
+        if tree is None:
+            intervals = []
+            for search_id in self._buckets[key]:
+                criteria = self._criteria[search_id][1]
+                low = criteria.get("price_min")
+                high = criteria.get("price_max")
+                intervals.append((
+                    -math.inf if low is None else low,
+                    math.inf if high is None else high,
+                    search_id
+                ))
+            tree = self._trees[key] = IntervalTree(intervals)
+        return tree
+
+    def match(self, attributes):
+        # Return the ids of every search matched by a listing's make, model, condition, year, price and mileage
+        matches = []
+        # A search's key holds either the listing's value or None, so at most 2^3 buckets can match
+        candidate_keys = itertools.product(*(
+            (normalise(attributes[name]), None) for name in EQUALITY_CRITERIA
+        ))
+        for key in candidate_keys:
+            if key not in self._buckets:
+                continue
+            for search_id in self._tree(key).stab(attributes["price"]):
+                criteria = self._criteria[search_id][1]
+                if all(
+                    (criteria.get(f"{name}_min") is None or criteria[f"{name}_min"] <= attributes[name])
+                    and (criteria.get(f"{name}_max") is None or attributes[name] <= criteria[f"{name}_max"])
+                    for name in RANGE_CRITERIA
+                ):
+                    matches.append(search_id)
+        return matches
+
+# Matches new listings against saved searches on a background thread
+class SavedSearchMatcher:
+    def __init__(self):
+        self.index = SavedSearchIndex()
+        self.reload_seconds = 300
+        self._app = None
+        self._db = None
+        self._queue = None
+        self._thread = None
+        self._cursor = IdCursor()
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app, db, broker):
+        # SAVED_SEARCH_RELOAD_SECONDS bounds how long searches deleted by other processes keep matching
+        self.reload_seconds = float(os.environ.get("SAVED_SEARCH_RELOAD_SECONDS", 300))
+        self._queue = queue.Queue(maxsize=int(os.environ.get("SAVED_SEARCH_QUEUE_SIZE", 10000)))
+        self._app = app
+        self._db = db
+        broker.add_listener(self._on_listing_event)
+
+    def _on_listing_event(self, event, data):
+        # Runs on the request thread after commit, so only hand the listing to the worker
+        if event != "listing_created":
+            return
+        self._start_worker()
+        try:
+            self._queue.put_nowait(data["listing_id"])
+        except queue.Full:
+            self._app.logger.warning("Saved search queue is full; listing %s was not matched.", data["listing_id"])
+
+    def _start_worker(self):
+        # Started on first use so forked worker processes each get their own thread
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="saved-search-matcher", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            listing_id = self._queue.get()
+            try:
+                with self._app.app_context():
+                    self.match_listing(listing_id)
+            except Exception:
+                self._app.logger.exception("Matching listing %s against saved searches failed.", listing_id)
+
+    def refresh(self):
+        # Load searches saved since the last refresh, with a periodic full reload to drop deleted ones
+        now = time.monotonic()
+        reload = self._loaded_at is None or now - self._loaded_at >= self.reload_seconds
+        cursor = IdCursor() if reload else self._cursor
+        statement = select(SavedSearch)
+        if not reload:
+            # Searches not read yet, including lower ids that committed after a higher one was read
+            statement = statement.where(cursor.condition(SavedSearch.saved_search_id))
+        with self._db.engine.connect() as connection:
+            rows = connection.execute(statement).mappings().all()
+        cursor.advance(row["saved_search_id"] for row in rows)
+        with self._lock:
+            if reload:
+                self.index = SavedSearchIndex()
+                self._cursor = cursor
+                self._loaded_at = now
+            for row in rows:
+                self.index.add(row["saved_search_id"], {name: row[name] for name in SAVED_SEARCH_CRITERIA})
+
+    def forget(self, search_id):
+        # Stop matching a deleted search in this process immediately
+        with self._lock:
+            self.index.remove(search_id)
+
+    def match_listing(self, listing_id):
+        # Match one listing and record an alert for each matching search
+        self.refresh()
+        with self._db.engine.begin() as connection:
+            listing = connection.execute(
+                select(
+                    Listing.user_id, Listing.listing_status, Car.price, Car.mileage, Car.condition,
+                    MakeModelYear.make, MakeModelYear.model, MakeModelYear.year
+                )
+                .join(Car, Car.car_id == Listing.car_id)
+                .join(MakeModelYear, MakeModelYear.make_model_year_id == Car.make_model_year_id)
+                .where(Listing.listing_id == listing_id)
+            ).mappings().first()
+            if listing is None or listing["listing_status"] != "available":
+                return []
+
+            with self._lock:
+                search_ids = self.index.match(listing)
+
+            # Recorded with INSERT ... SELECT so searches deleted meanwhile and the seller's own searches are skipped
+            now = datetime.utcnow()
+            for start in range(0, len(search_ids), MATCH_INSERT_CHUNK):
+                connection.execute(insert(SavedSearchMatch).from_select(
+                    ["saved_search_id", "listing_id", "matched_at"],
+                    select(SavedSearch.saved_search_id, literal(listing_id), literal(now))
+                    .where(
+                        SavedSearch.saved_search_id.in_(search_ids[start:start + MATCH_INSERT_CHUNK]),
+                        SavedSearch.user_id != listing["user_id"]
+                    )
+                ))
+            return search_ids
+
+# Shared matcher instance used by create_app and the saved search routes
+saved_search_matcher = SavedSearchMatcher()
@@ -0,0 +1,362 @@
+# Import standard library modules
+import math
+import os
+import threading
+import time
+
+# Import third-party modules
+from sqlalchemy import and_, select
+
+# Import local modules
+from models.car import Car
+from models.change_log import ChangeLog, change_position, changes_after, latest_change_position
+from models.listing import Listing
+from models.makemodelyear import MakeModelYear
+
+# NumPy is optional; without it the similar-cars endpoint reports itself unavailable
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Weight of each numeric feature (price, mileage, year) in the squared distance between two cars
+NUMERIC_WEIGHTS = (4.0, 1.0, 1.0)
+# Distance added when make, model or condition differ
+CATEGORICAL_WEIGHTS = (3.0, 2.0, 0.5)
+# Differences of this size count as one unit of distance (price is compared on a log scale)
+NUMERIC_SCALES = (0.25, 50000.0, 3.0)
+# Maximum ids per IN clause when reloading changed cars
+RELOAD_CHUNK = 1000
+# Rows converted to arrays at a time during a rebuild, so the full result is never held as rows
+REBUILD_CHUNK = 50000
+# Attributes holding the index itself, swapped in together after a rebuild
+INDEX_STATE = ("_size", "_slots", "_listing_cars", "_codes", "_car_ids", "_categorical", "_numeric", "_penalty")
+# Column arrays that queries read outside the lock; they are copied before being changed in place
+INDEX_ARRAYS = ("_car_ids", "_categorical", "_numeric", "_penalty")
+# Maximum (query car x indexed car) distances computed at once, bounding the memory of large batches
+DISTANCE_BLOCK = 4000000
+
+# In-memory feature index of available cars, answering nearest-neighbour queries with NumPy
+class SimilarCarIndex:
+    def __init__(self):
+        self.refresh_seconds = 5
+        self.rebuild_seconds = 3600
+        self._app = None
+        self._db = None
+        # _lock guards the index; _refresh_lock lets only one thread read the database at a time
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._rebuild_thread = None
+        self._built_at = None
+        self._refreshed_at = None
+        # Change log position (xact_id, change_id) the index is up to date with
+        self._position = (0, 0)
+        self._reset()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork_in_child)
+
+    def _reset(self, capacity=1024):
+        # Column-major arrays with one slot per car, so each feature is one contiguous vector
+        self._size = 0
+        self._slots = {}
+        self._listing_cars = {}
+        self._codes = {"make": {}, "model": {}, "condition": {}}
+        if np is None:
+            return
+        self._car_ids = np.zeros(capacity, dtype=np.int64)
+        self._categorical = np.zeros((3, capacity), dtype=np.int32)
+        self._numeric = np.zeros((3, capacity), dtype=np.float32)
+        # 0 for available cars, infinity for slots whose car is no longer available
+        self._penalty = np.full(capacity, np.inf, dtype=np.float32)
+
+    @property
+    def available(self):
+        return np is not None
+
+    def init_app(self, app, db):
+        # SIMILAR_CARS_REFRESH_SECONDS bounds how stale results can be after a car or listing changes
+        self.refresh_seconds = float(os.environ.get("SIMILAR_CARS_REFRESH_SECONDS", 5))
+        self.rebuild_seconds = float(os.environ.get("SIMILAR_CARS_REBUILD_SECONDS", 3600))
+        self._app = app
+        self._db = db
+
+    def _feature_statement(self):
+        # Available cars with every feature the index stores
+        return (
+            select(
+                Car.car_id, Listing.listing_id, Car.price, Car.mileage, Car.condition,
+                MakeModelYear.make, MakeModelYear.model, MakeModelYear.year
+            )
+            .join(Listing, and_(Listing.car_id == Car.car_id, Listing.listing_status == "available"))
+            .join(MakeModelYear, MakeModelYear.make_model_year_id == Car.make_model_year_id)
+        )
+
+    def _code(self, name, value):
+        # Map a categorical value to a small integer code, assigning new codes on first sight
+        codes = self._codes[name]
+        if value not in codes:
+            codes[value] = len(codes) + 1
+        return codes[value]
+
+    def _features(self, row):
+        # Return (categorical codes, numeric features pre-scaled so squared gaps carry their weight)
+        categorical = (
+            self._code("make", row.make.lower()),
+            self._code("model", row.model.lower()),
+            self._code("condition", row.condition),
+        )
+        numeric = tuple(
+            value / scale * weight ** 0.5
+            for value, scale, weight in zip(
+                (math.log(max(row.price, 1.0)), row.mileage, row.year), NUMERIC_SCALES, NUMERIC_WEIGHTS
+            )
+        )
+        return categorical, numeric
+
+    def _grow(self):
+        # Double the capacity of every column array
+        capacity = len(self._car_ids) * 2
+        self._car_ids = np.resize(self._car_ids, capacity)
+        for name, fill in (("_categorical", 0), ("_numeric", 0)):
+            old = getattr(self, name)
+            new = np.full((3, capacity), fill, dtype=old.dtype)
+            new[:, :self._size] = old[:, :self._size]
+            setattr(self, name, new)
+        penalty = np.full(capacity, np.inf, dtype=np.float32)
+        penalty[:self._size] = self._penalty[:self._size]
+        self._penalty = penalty
+
+    def _upsert(self, row):
+        slot = self._slots.get(row.car_id)
+        if slot is None:
+            if self._size == len(self._car_ids):
+                self._grow()
+            slot = self._slots[row.car_id] = self._size
+            self._size += 1
+        self._car_ids[slot] = row.car_id
+        self._categorical[:, slot], self._numeric[:, slot] = self._features(row)
+        self._penalty[slot] = 0
+        self._listing_cars[row.listing_id] = row.car_id
+
+    def _deactivate(self, car_id):
+        slot = self._slots.get(car_id)
+        if slot is not None:
+            self._penalty[slot] = np.inf
+
+    def _rebuild(self, connection):
+        # Load every available car into a new index, e.g. on first use after startup.
+        # The position is read first, so changes made during the load are applied again afterwards.
+        position = latest_change_position(connection)
+        index = SimilarCarIndex.__new__(SimilarCarIndex)
+        index._reset()
+
+        # Convert each chunk of rows to column arrays as it arrives; few rows stay alive at once,
+        # which keeps memory and garbage collection pauses in concurrent requests small
+        chunks = []
+        result = connection.execution_options(yield_per=REBUILD_CHUNK).execute(self._feature_statement())
+        for partition in result.partitions():
+            car_ids, listing_ids, prices, mileages, conditions, makes, models, years = zip(*partition)
+            numeric = np.array((
+                np.log(np.maximum(np.array(prices, dtype=np.float64), 1.0)),
+                np.array(mileages, dtype=np.float64),
+                np.array(years, dtype=np.float64),
+            ))
+            chunks.append((
+                np.array(car_ids, dtype=np.int64),
+                np.array(listing_ids, dtype=np.int64),
+                np.array((
+                    [index._code("make", make.lower()) for make in makes],
+                    [index._code("model", model.lower()) for model in models],
+                    [index._code("condition", condition) for condition in conditions],
+                ), dtype=np.int32),
+                numeric / np.array(NUMERIC_SCALES)[:, None] * np.sqrt(NUMERIC_WEIGHTS)[:, None],
+            ))
+
+        if chunks:
+            car_ids, listing_ids = np.concatenate([chunk[0] for chunk in chunks]), np.concatenate([chunk[1] for chunk in chunks])
+            categorical = np.concatenate([chunk[2] for chunk in chunks], axis=1)
+            numeric = np.concatenate([chunk[3] for chunk in chunks], axis=1)
+            # A car with several available listings has one row per listing; keep its last row
+            _, last = np.unique(car_ids[::-1], return_index=True)
+            keep = np.sort(len(car_ids) - 1 - last)
+            size = len(keep)
+            codes = index._codes
+            index._reset(max(1024, size * 2))
+            index._codes = codes
+            index._size = size
+            index._car_ids[:size] = car_ids[keep]
+            index._categorical[:, :size] = categorical[:, keep]
+            index._numeric[:, :size] = numeric[:, keep]
+            index._penalty[:size] = 0
+            index._slots = dict(zip(car_ids[keep].tolist(), range(size)))
+            index._listing_cars = dict(zip(listing_ids.tolist(), car_ids.tolist()))
+
+        # Built without the lock, so queries keep using the old index until this swap
+        with self._lock:
+            for name in INDEX_STATE:
+                setattr(self, name, getattr(index, name))
+            self._position = position
+        self._built_at = time.monotonic()
+
+    def _apply_changes(self, connection):
+        # Reload only the cars touched by change log entries committed since the last refresh
+        entries = connection.execute(changes_after(
+            select(ChangeLog.xact_id, ChangeLog.change_id, ChangeLog.entity, ChangeLog.entity_id),
+            connection, self._position
+        )).all()
+        if not entries:
+            return
+
+        car_ids = {entry.entity_id for entry in entries if entry.entity == "car"}
+        listing_ids = {entry.entity_id for entry in entries if entry.entity == "listing"}
+        makemodelyear_ids = {entry.entity_id for entry in entries if entry.entity == "makemodelyear"}
+        # A deleted listing can only be traced to its car through the index itself
+        with self._lock:
+            car_ids.update(self._listing_cars.pop(listing_id) for listing_id in listing_ids & self._listing_cars.keys())
+        if listing_ids:
+            car_ids.update(connection.execute(select(Listing.car_id).where(Listing.listing_id.in_(listing_ids))).scalars())
+        if makemodelyear_ids:
+            car_ids.update(connection.execute(
+                select(Car.car_id).where(Car.make_model_year_id.in_(makemodelyear_ids))
+            ).scalars())
+
+        # Load the changed cars first, then apply them under the lock in one step
+        car_ids = list(car_ids)
+        rows = []
+        for start in range(0, len(car_ids), RELOAD_CHUNK):
+            rows += connection.execute(
+                self._feature_statement().where(Car.car_id.in_(car_ids[start:start + RELOAD_CHUNK]))
+            ).all()
+        with self._lock:
+            # Queries may still be reading the current arrays, so the changes go into copies
+            for name in INDEX_ARRAYS:
+                setattr(self, name, getattr(self, name).copy())
+            for row in rows:
+                self._upsert(row)
+            # Cars no longer returned were sold, unlisted or deleted
+            for car_id in set(car_ids) - {row.car_id for row in rows}:
+                self._deactivate(car_id)
+            self._position = change_position(entries[-1])
+
+    def refresh(self):
+        # Build on first use, apply incremental changes, and rebuild periodically in the background
+        now = time.monotonic()
+        if self._refreshed_at is not None and now - self._refreshed_at < self.refresh_seconds:
+            return
+        # While another thread refreshes, keep answering from the current index unless there is none yet
+        if not self._refresh_lock.acquire(blocking=self._built_at is None):
+            return
+        try:
+            if self._refreshed_at is not None and now - self._refreshed_at < self.refresh_seconds:
+                return
+            with self._db.engine.connect() as connection:
+                if self._built_at is None:
+                    self._rebuild(connection)
+                else:
+                    self._apply_changes(connection)
+            if now - self._built_at >= self.rebuild_seconds:
+                self._start_rebuild()
+            self._refreshed_at = now
+        finally:
+            self._refresh_lock.release()
+
+    def _start_rebuild(self):
+        # Periodic rebuilds run on a background thread, so no request waits for one
+        if self._rebuild_thread is None or not self._rebuild_thread.is_alive():
+            self._rebuild_thread = threading.Thread(target=self._rebuild_in_background, name="similar-cars-rebuild", daemon=True)
+            self._rebuild_thread.start()
+
+    def _rebuild_in_background(self):
+        try:
+            with self._refresh_lock, self._app.app_context(), self._db.engine.connect() as connection:
+                self._rebuild(connection)
+        except Exception:
+            self._app.logger.exception("Rebuilding the similar-car index failed.")
+
+    def _after_fork_in_child(self):
+        # A rebuild thread of the parent does not exist in the worker, so neither may its locks
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._rebuild_thread = None
+
+    def query_features(self, car_ids):
+        # Return {car_id: (categorical, numeric)} for query cars, including cars that are not available
+        features = {}
+        missing = []
+        with self._lock:
+            for car_id in car_ids:
+                slot = self._slots.get(car_id)
+                if slot is None:
+                    missing.append(car_id)
+                else:
+                    features[car_id] = (self._categorical[:, slot].copy(), self._numeric[:, slot].copy())
+        if missing:
+            statement = (
+                select(
+                    Car.car_id, Car.price, Car.mileage, Car.condition,
+                    MakeModelYear.make, MakeModelYear.model, MakeModelYear.year
+                )
+                .join(MakeModelYear, MakeModelYear.make_model_year_id == Car.make_model_year_id)
+                .where(Car.car_id.in_(missing))
+            )
+            with self._db.engine.connect() as connection:
+                rows = connection.execute(statement).all()
+            with self._lock:
+                for row in rows:
+                    features[row.car_id] = self._features(row)
+        return features
+
+    def similar(self, car_ids, limit):
+        # Return {car_id: [similar car ids, most similar first]} for a batch of query cars
+        self.refresh()
+        features = self.query_features(car_ids)
+        query_ids = [car_id for car_id in car_ids if car_id in features]
+        # Only references are taken under the lock: rebuilds swap in new arrays and refreshes
+        # change copies, so the arrays held here stay consistent while they are scored
+        with self._lock:
+            size = self._size
+            slot_car_ids = self._car_ids[:size]
+            categorical = self._categorical[:, :size]
+            numeric = self._numeric[:, :size]
+            penalty = self._penalty[:size]
+            own_slots = [self._slots.get(car_id, -1) for car_id in query_ids]
+
+        count = min(limit, size)
+        if count == 0:
+            return {car_id: [] for car_id in query_ids}
+        query_categorical = np.array([features[car_id][0] for car_id in query_ids], dtype=np.int32).reshape(-1, 3)
+        query_numeric = np.array([features[car_id][1] for car_id in query_ids], dtype=np.float32).reshape(-1, 3)
+
+        results = {}
+        block = max(1, DISTANCE_BLOCK // size)
+        for start in range(0, len(query_ids), block):
+            rows = slice(start, start + block)
+            # One (query car x indexed car) matrix: weighted squared numeric gaps plus categorical mismatch penalties
+            distances = np.broadcast_to(penalty, (len(query_ids[rows]), size)).copy()
+            # Scratch buffers shared by the three columns, so no temporary matrix is allocated per step
+            gap = np.empty_like(distances)
+            mismatch = np.empty(distances.shape, dtype=bool)
+            for column in range(3):
+                np.subtract(numeric[column], query_numeric[rows, column, None], out=gap)
+                np.multiply(gap, gap, out=gap)
+                np.add(distances, gap, out=distances)
+                np.not_equal(categorical[column], query_categorical[rows, column, None], out=mismatch)
+                np.multiply(mismatch, np.float32(CATEGORICAL_WEIGHTS[column]), out=gap)
+                np.add(distances, gap, out=distances)
+            # A car is never similar to itself
+            own = np.array(own_slots[rows])
+            indexed = np.flatnonzero(own >= 0)
+            distances[indexed, own[indexed]] = np.inf
+
+            # Partial sort of every row: only the best `count` candidates are ordered
+            nearest = np.argpartition(distances, count - 1, axis=1)[:, :count]
+            nearest_distances = np.take_along_axis(distances, nearest, axis=1)
+            order = np.argsort(nearest_distances, axis=1)
+            nearest = np.take_along_axis(nearest, order, axis=1)
+            finite = np.isfinite(np.take_along_axis(nearest_distances, order, axis=1))
+            for car_id, similar_ids, keep in zip(query_ids[rows], slot_car_ids[nearest].tolist(), finite.tolist()):
+                results[car_id] = [similar_id for similar_id, kept in zip(similar_ids, keep) if kept]
+        return results
+
+# Shared similar-car index used by create_app and the car routes
+similar_cars = SimilarCarIndex()
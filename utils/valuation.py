@@ -0,0 +1,284 @@
+# Import standard library modules
+import math
+import os
+import threading
+import time
+
+# Import third-party modules
+from sqlalchemy import select
+
+# Import local modules
+from models.car import Car
+from models.car_transaction import CarTransaction
+from models.makemodelyear import MakeModelYear
+from utils.id_cursor import IdCursor
+
+# NumPy is optional; without it the valuation endpoint reports itself unavailable
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Regression features: intercept, mileage, year, and condition offsets relative to 'used'
+FEATURE_COUNT = 5
+MILEAGE_SCALE = 100000.0
+YEAR_BASE = 2000.0
+YEAR_SCALE = 10.0
+# Ridge penalty on every coefficient except the intercept, so thin groups stay well-posed
+RIDGE_PENALTY = 1.0
+# Smallest residual spread (in log price) a band may use, so identical sale prices still give a band
+MIN_SIGMA = 0.05
+# Attributes holding the fitted groups, swapped in together after a rebuild
+MODEL_STATE = ("_size", "_slots", "_xtx", "_xty", "_yty", "_count", "_coefficients", "_sigma")
+
+# Return the regression features of one car
+def features(mileage, year, condition):
+    return (
+        1.0,
+        mileage / MILEAGE_SCALE,
+        (year - YEAR_BASE) / YEAR_SCALE,
+        1.0 if condition == "new" else 0.0,
+        1.0 if condition == "certified" else 0.0,
+    )
+
+# Return the feature matrix of many cars, one row per car
+def design_matrix(mileages, years, conditions):
+    conditions = np.array(conditions, dtype=object)
+    return np.column_stack((
+        np.ones(len(conditions)),
+        np.array(mileages, dtype=np.float64) / MILEAGE_SCALE,
+        (np.array(years, dtype=np.float64) - YEAR_BASE) / YEAR_SCALE,
+        conditions == "new",
+        conditions == "certified",
+    ))
+
+# Log-price regression per make/model/year, with make/model as the fallback for thin groups
+# Each group keeps its sufficient statistics (X'X, X'y, y'y, n), so new sales update it without a rescan
+class PriceModel:
+    def __init__(self):
+        self.refresh_seconds = 5
+        self.rebuild_seconds = 3600
+        self.min_samples = 5
+        self.band_z = 1.2816
+        self.outlier_z = 2.5758
+        self._app = None
+        self._db = None
+        # _lock guards the fitted groups; _refresh_lock lets only one thread read the database at a time
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._rebuild_thread = None
+        self._built_at = None
+        self._refreshed_at = None
+        self._cursor = IdCursor()
+        self._reset()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork_in_child)
+
+    def _reset(self, capacity=256):
+        # One slot per group: (make, model, year) and (make, model) keys share the same arrays
+        self._size = 0
+        self._slots = {}
+        if np is None:
+            return
+        self._xtx = np.zeros((capacity, FEATURE_COUNT, FEATURE_COUNT))
+        self._xty = np.zeros((capacity, FEATURE_COUNT))
+        self._yty = np.zeros(capacity)
+        self._count = np.zeros(capacity, dtype=np.int64)
+        # Fitted parameters, refreshed for every group a batch of sales touches
+        self._coefficients = np.zeros((capacity, FEATURE_COUNT))
+        self._sigma = np.zeros(capacity)
+
+    @property
+    def available(self):
+        return np is not None
+
+    def init_app(self, app, db):
+        # VALUATION_REFRESH_SECONDS bounds how long a new sale takes to reach the estimates
+        self.refresh_seconds = float(os.environ.get("VALUATION_REFRESH_SECONDS", 5))
+        self.rebuild_seconds = float(os.environ.get("VALUATION_REBUILD_SECONDS", 3600))
+        self.min_samples = int(os.environ.get("VALUATION_MIN_SAMPLES", 5))
+        # Standard normal quantiles: 1.2816 gives an 80% price band, 2.5758 a 99% outlier band
+        self.band_z = float(os.environ.get("VALUATION_BAND_Z", 1.2816))
+        self.outlier_z = float(os.environ.get("VALUATION_OUTLIER_Z", 2.5758))
+        self._app = app
+        self._db = db
+
+    def _sales_statement(self):
+        # Every sale with the features of the car that was sold
+        return (
+            select(
+                CarTransaction.transaction_id, CarTransaction.amount, Car.mileage, Car.condition,
+                Car.make_model_year_id, MakeModelYear.make, MakeModelYear.model, MakeModelYear.year
+            )
+            .join(Car, Car.car_id == CarTransaction.car_id)
+            .join(MakeModelYear, MakeModelYear.make_model_year_id == Car.make_model_year_id)
+            .order_by(CarTransaction.transaction_id)
+        )
+
+    def _slot(self, key):
+        slot = self._slots.get(key)
+        if slot is None:
+            if self._size == len(self._count):
+                self._grow()
+            slot = self._slots[key] = self._size
+            self._size += 1
+        return slot
+
+    def _grow(self):
+        # Double the capacity of every per-group array
+        capacity = len(self._count) * 2
+        for name in ("_xtx", "_xty", "_yty", "_count", "_coefficients", "_sigma"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, name, new)
+
+    def _accumulate(self, rows):
+        # Add a batch of sales to the statistics of both groups they belong to, then refit those groups
+        _, amounts, mileages, conditions, make_model_year_ids, makes, models, years = zip(*rows)
+
+        # Resolve group slots once per distinct make/model/year rather than once per sale
+        ids, first, inverse = np.unique(make_model_year_ids, return_index=True, return_inverse=True)
+        keys = [(makes[row].lower(), models[row].lower(), years[row]) for row in first]
+        year_slots = np.array([self._slot(key) for key in keys])
+        model_slots = np.array([self._slot(key[:2]) for key in keys])
+        slots = np.concatenate((year_slots[inverse], model_slots[inverse]))
+        x = design_matrix(mileages, years, conditions)
+        x = np.vstack((x, x))
+        y = np.log(np.maximum(np.array(amounts, dtype=np.float64), 1.0))
+        y = np.concatenate((y, y))
+
+        # bincount sums each product per touched group in one pass, without per-row outer products
+        touched, groups = np.unique(slots, return_inverse=True)
+        size = len(touched)
+        for i in range(FEATURE_COUNT):
+            for j in range(i, FEATURE_COUNT):
+                sums = np.bincount(groups, weights=x[:, i] * x[:, j], minlength=size)
+                self._xtx[touched, i, j] += sums
+                if i != j:
+                    self._xtx[touched, j, i] += sums
+            self._xty[touched, i] += np.bincount(groups, weights=x[:, i] * y, minlength=size)
+        self._yty[touched] += np.bincount(groups, weights=y * y, minlength=size)
+        self._count[touched] += np.bincount(groups, minlength=size)
+        self._fit(touched)
+
+    def _fit(self, slots):
+        # Solve the ridge normal equations of every given group in one batched call
+        xtx, xty, yty, count = self._xtx[slots], self._xty[slots], self._yty[slots], self._count[slots]
+        penalty = np.diag([0.0] + [RIDGE_PENALTY] * (FEATURE_COUNT - 1))
+        coefficients = np.linalg.solve(xtx + penalty, xty[..., None])[..., 0]
+
+        # Residual sum of squares from the same statistics: y'y - 2b'X'y + b'X'Xb
+        residual = (
+            yty
+            - 2 * np.einsum("gi,gi->g", coefficients, xty)
+            + np.einsum("gi,gij,gj->g", coefficients, xtx, coefficients)
+        )
+        degrees = np.maximum(count - FEATURE_COUNT, 1)
+        self._coefficients[slots] = coefficients
+        self._sigma[slots] = np.maximum(np.sqrt(np.maximum(residual, 0) / degrees), MIN_SIGMA)
+
+    def _rebuild(self, connection):
+        # Refit every group from all sales, e.g. on first use, and to drop deleted or archived sales
+        rows = connection.execute(self._sales_statement()).all()
+        cursor = IdCursor()
+        cursor.advance(row.transaction_id for row in rows)
+        # Fitted into a new model without the lock, so estimates keep using the old one until the swap
+        model = PriceModel.__new__(PriceModel)
+        model._reset(max(256, len(self._slots) * 2))
+        if rows:
+            model._accumulate(rows)
+        with self._lock:
+            for name in MODEL_STATE:
+                setattr(self, name, getattr(model, name))
+            self._cursor = cursor
+        self._built_at = time.monotonic()
+
+    def _apply_new_sales(self, connection):
+        # Fold in only the sales not read yet, including lower ids that committed after a higher one
+        rows = connection.execute(
+            self._sales_statement().where(self._cursor.condition(CarTransaction.transaction_id))
+        ).all()
+        self._cursor.advance(row.transaction_id for row in rows)
+        if rows:
+            with self._lock:
+                self._accumulate(rows)
+
+    def refresh(self):
+        # Build on first use, apply new sales, and rebuild periodically in the background
+        now = time.monotonic()
+        if self._refreshed_at is not None and now - self._refreshed_at < self.refresh_seconds:
+            return
+        # While another thread refreshes, keep answering from the current model unless there is none yet
+        if not self._refresh_lock.acquire(blocking=self._built_at is None):
+            return
+        try:
+            if self._refreshed_at is not None and now - self._refreshed_at < self.refresh_seconds:
+                return
+            with self._db.engine.connect() as connection:
+                if self._built_at is None:
+                    self._rebuild(connection)
+                else:
+                    self._apply_new_sales(connection)
+            if now - self._built_at >= self.rebuild_seconds:
+                self._start_rebuild()
+            self._refreshed_at = now
+        finally:
+            self._refresh_lock.release()
+
+    def _start_rebuild(self):
+        # Periodic rebuilds run on a background thread, so no request waits for one
+        if self._rebuild_thread is None or not self._rebuild_thread.is_alive():
+            self._rebuild_thread = threading.Thread(target=self._rebuild_in_background, name="valuation-rebuild", daemon=True)
+            self._rebuild_thread.start()
+
+    def _rebuild_in_background(self):
+        try:
+            with self._refresh_lock, self._app.app_context(), self._db.engine.connect() as connection:
+                self._rebuild(connection)
+        except Exception:
+            self._app.logger.exception("Rebuilding the price model failed.")
+
+    def _after_fork_in_child(self):
+        # A rebuild thread of the parent does not exist in the worker, so neither may its locks
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._rebuild_thread = None
+
+    def estimate(self, make, model, year, mileage, condition, z=None):
+        # Return the expected price and a band of z residual deviations, or None without enough sales
+        self.refresh()
+        z = self.band_z if z is None else z
+        x = features(mileage, year, condition)
+        make, model = make.lower(), model.lower()
+        with self._lock:
+            for basis, key in (("make_model_year", (make, model, year)), ("make_model", (make, model))):
+                slot = self._slots.get(key)
+                if slot is None or self._count[slot] < self.min_samples:
+                    continue
+                log_price = sum(c * value for c, value in zip(self._coefficients[slot].tolist(), x))
+                sigma = float(self._sigma[slot])
+                return {
+                    "estimate": round(math.exp(log_price), 2),
+                    "low": round(math.exp(log_price - z * sigma), 2),
+                    "high": round(math.exp(log_price + z * sigma), 2),
+                    "basis": basis,
+                    "sample_size": int(self._count[slot]),
+                }
+        return None
+
+    def check_price(self, make_model_year, mileage, condition, price):
+        # Compare an asking price with the outlier band; None when it cannot be valued
+        if not self.available:
+            return None
+        band = self.estimate(
+            make_model_year.make, make_model_year.model, make_model_year.year,
+            mileage, condition, z=self.outlier_z
+        )
+        if band is None:
+            return None
+        band["outlier"] = not band["low"] <= price <= band["high"]
+        return band
+
+# Shared price model used by create_app and the valuation routes
+price_model = PriceModel()
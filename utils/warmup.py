@@ -0,0 +1,114 @@
+# Import standard library modules
+import os
+import time
+
+# Import third-party modules
+from marshmallow import Schema, fields
+from sqlalchemy.orm import configure_mappers
+
+# Public endpoints requested during warm-up, compiling their SQL and filling their caches
+DEFAULT_WARM_UP_PATHS = "/api/makes,/api/cars/facets,/api/cars,/api/listings"
+
+# Return every Schema subclass defined so far
+def schema_classes(cls=Schema):
+    for subclass in cls.__subclasses__():
+        yield subclass
+        yield from schema_classes(subclass)
+
+# Instantiate the schemas of every Nested field, so their class registry lookups happen now
+def resolve_nested(schema, seen):
+    for field in schema.fields.values():
+        if isinstance(field, fields.List):
+            field = field.inner
+        if isinstance(field, fields.Nested) and id(field) not in seen:
+            seen.add(id(field))
+            resolve_nested(field.schema, seen)
+
+# Runs startup work before workers fork, and resets per-process state in each forked worker
+class Warmup:
+    def __init__(self):
+        self.timings = {}
+        self._app = None
+        self._db = None
+        self._fork_hook_registered = False
+
+    def init_app(self, app, db, indexes=()):
+        # Called at the end of create_app, once every blueprint is registered
+        self._app = app
+        self._db = db
+        if not self._fork_hook_registered and hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork_in_child)
+            self._fork_hook_registered = True
+
+        # WARM_UP=1 runs the warm-up inside create_app, e.g. in a pre-forking server's master process.
+        # Flask CLI commands (db_commands, benchmarks, and `flask run`, which does not fork workers)
+        # also call create_app; Flask marks them with FLASK_RUN_FROM_CLI, and they skip the warm-up.
+        if (
+            os.environ.get("WARM_UP", "").lower() in ("1", "true", "yes")
+            and os.environ.get("FLASK_RUN_FROM_CLI") != "true"
+        ):
+            self.run(indexes)
+
+    def _timed(self, phase, step):
+        started = time.perf_counter()
+        try:
+            step()
+        except Exception:
+            # A failed phase only costs the worker a slower first request
+            self._app.logger.exception("Warm-up phase '%s' failed.", phase)
+        self.timings[phase] = (time.perf_counter() - started) * 1000
+
+    def _configure_mappers(self):
+        # Resolve every relationship now rather than on the first query
+        configure_mappers()
+
+    def _build_schemas(self):
+        seen = set()
+        for schema_class in schema_classes():
+            if schema_class.__module__.startswith("models."):
+                resolve_nested(schema_class(), seen)
+
+    def _request_paths(self):
+        # Exercise real routes so their statements are compiled and their caches filled
+        paths = os.environ.get("WARM_UP_PATHS", DEFAULT_WARM_UP_PATHS)
+        client = self._app.test_client()
+        for path in filter(None, (part.strip() for part in paths.split(","))):
+            response = client.get(path)
+            if response.status_code >= 400:
+                self._app.logger.warning("Warm-up request to %s returned %s.", path, response.status_code)
+
+    def _refresh_index(self, index):
+        with self._app.app_context():
+            index.refresh()
+
+    def _dispose_engines(self):
+        # Close the connections opened by warm-up so no socket is shared with forked workers
+        with self._app.app_context():
+            for engine in self._db.engines.values():
+                engine.dispose()
+
+    def run(self, indexes=()):
+        # Run each warm-up phase, recording how long it took in milliseconds
+        self._timed("mappers", self._configure_mappers)
+        self._timed("schemas", self._build_schemas)
+        self._timed("requests", self._request_paths)
+        for name, index in indexes:
+            # In-memory indexes are built once here and shared copy-on-write by every worker
+            if index.available:
+                self._timed(name, lambda: self._refresh_index(index))
+        self._timed("dispose", self._dispose_engines)
+        self._app.logger.info(
+            "Warm-up finished: %s.",
+            ", ".join(f"{phase} {ms:.1f} ms" for phase, ms in self.timings.items())
+        )
+
+    def _after_fork_in_child(self):
+        # Pooled connections belong to the parent; the worker opens its own on first use
+        if self._app is None:
+            return
+        with self._app.app_context():
+            for engine in self._db.engines.values():
+                engine.dispose(close=False)
+
+# Shared warm-up instance used by create_app
+warmup = Warmup()